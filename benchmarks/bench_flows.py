@@ -0,0 +1,40 @@
+"""
+Regression benchmarks of the flow simulation for pytest-benchmark, using the workloads of `benchmarks.flows`. Runs are
+stored in ``benchmarks/.baselines``, and a run fails if the mean time of any benchmark regresses by more than 20% over
+the latest stored run on the same machine::
+
+    make bench-baseline  # store a new baseline
+    make bench           # compare against the latest baseline
+
+The number of simpy events and rebalances of each benchmark are stored as extra info.
+"""
+import pytest
+
+from benchmarks.flows import create_topology, simulate
+from ether.core import FlowControl
+
+
+@pytest.mark.parametrize('scenario,flow_type,batching,concurrency', [
+    ('urban', 'Flow', False, 300),
+    ('urban', 'Flow', True, 300),
+    ('urban', 'UninterruptingFlow', False, 300),
+    ('urban', 'FlowScheduler', False, 300),
+    ('iiot', 'Flow', False, 300),
+    ('iiot', 'FlowScheduler', False, 300),
+    ('lan', 'Flow', False, 300),
+    ('lan', 'FlowScheduler', False, 300),
+])
+def test_flows(benchmark, scenario, flow_type, batching, concurrency):
+    def setup():
+        return (create_topology(scenario, 0),), dict()
+
+    def target(topology):
+        return simulate(topology, flow_type, batching, concurrency, 0)
+
+    env = benchmark.pedantic(target, setup=setup, rounds=5)
+
+    rebalances = FlowControl.of(env).rebalances
+    if env.scheduler is not None:
+        rebalances += env.scheduler.rebalances
+    benchmark.extra_info['events'] = env.events
+    benchmark.extra_info['rebalances'] = rebalances
@@ -0,0 +1,217 @@
+"""
+Benchmarks of the flow simulation. Each benchmark materializes a scenario topology, starts a number of flows between
+random node pairs within a short time window (so that most of them are active concurrently), and runs the simulation
+until all flows have completed. All random choices are seeded, and no network access is required.
+
+Run with (see `benchmarks.bench_flows` for the regression benchmarks)::
+
+    python -m benchmarks.flows
+    python -m benchmarks.flows --scenario urban --flow-type Flow --concurrency 10 100 1000 --json results.json
+
+For each run, the following metrics are reported: the number of processed simpy events and events per wall-clock
+second, the number of rebalances, the wall-clock time per simulated second, and the peak memory allocated during the
+simulation (measured in a separate run with tracemalloc, which can be skipped with --no-memory).
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import NamedTuple, List, Callable, Dict
+
+import numpy as np
+import simpy
+import srds
+
+from ether.core import Flow, UninterruptingFlow, FlowControl, Route, Node, Link, Connection
+from ether.scenarios.industrialiot import IndustrialIoTScenario
+from ether.scenarios.urbansensing import UrbanSensingScenario
+from ether.scheduler import FlowScheduler
+from ether.topology import Topology
+
+
+class SharedLinkScenario:
+    """
+    Hosts that are connected through one shared link (e.g., a LAN), so that every arrival and completion changes the
+    rate of all active flows. Rebalances are cheap, and delivering the changes to the flows dominates.
+    """
+
+    def __init__(self, num_hosts: int = 50) -> None:
+        self.num_hosts = num_hosts
+
+    def materialize(self, topology: Topology):
+        shared = Link(1000, tags={'type': 'shared'})
+        for i in range(self.num_hosts):
+            host = Node('host_%d' % i)
+            access = Link(100, tags={'type': 'access'})
+            topology.add_connection(Connection(host, access))
+            topology.add_connection(Connection(access, shared))
+
+
+scenarios: Dict[str, Callable[[], object]] = {
+    'urban': lambda: UrbanSensingScenario(num_cells=10),
+    'iiot': lambda: IndustrialIoTScenario(num_premises=5),
+    'lan': lambda: SharedLinkScenario(),
+}
+
+
+def start_scheduler(env: 'CountingEnvironment'):
+    env.scheduler = FlowScheduler(env)
+    return env.scheduler.transfer
+
+
+flow_types: Dict[str, Callable[['CountingEnvironment'], Callable[[int, Route], simpy.Event]]] = {
+    'Flow': lambda env: lambda size, route: Flow(env, size, route).start(),
+    'UninterruptingFlow': lambda env: lambda size, route: UninterruptingFlow(env, size, route).start(),
+    'FlowScheduler': start_scheduler,
+}
+
+
+class CountingEnvironment(simpy.Environment):
+    """
+    A simpy environment that counts the number of processed events.
+    """
+
+    def __init__(self, initial_time=0):
+        super().__init__(initial_time)
+        self.events = 0
+        self.last_completion = 0.
+        self.scheduler = None
+
+    def on_completion(self, _):
+        self.last_completion = self.now
+
+    def step(self):
+        self.events += 1
+        super().step()
+
+
+class Result(NamedTuple):
+    scenario: str
+    flow_type: str
+    batching: bool
+    concurrency: int
+    events: int
+    rebalances: int
+    wall_time: float
+    sim_time: float
+    peak_memory: int  # bytes, -1 if not measured
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.wall_time if self.wall_time else 0
+
+    @property
+    def wall_per_sim_second(self) -> float:
+        return self.wall_time / self.sim_time if self.sim_time else 0
+
+
+def create_topology(scenario: str, seed: int) -> Topology:
+    srds.seed(seed)
+    topology = Topology()
+    scenarios[scenario]().materialize(topology)
+    return topology
+
+
+def simulate(topology: Topology, flow_type: str, batching: bool, concurrency: int, seed: int,
+             window: float = 1.) -> CountingEnvironment:
+    """
+    Starts the given number of flows between random node pairs at uniformly distributed times within the window, and
+    runs the simulation until all flows have completed. Interrupted flows leave their outdated timeouts in the event
+    queue, so the simulated time is measured until the last flow has completed rather than until the queue is empty.
+    """
+    rnd = random.Random(seed)
+    np.random.seed(seed)
+
+    nodes = topology.get_nodes()
+    pairs = [tuple(rnd.sample(nodes, 2)) for _ in range(concurrency)]
+    routes = [topology.route(source, destination) for source, destination in pairs]
+    sizes = np.random.lognormal(np.log(2 * 10 ** 6), 1, size=concurrency).astype(int) + 1
+    starts = np.sort(np.random.uniform(0, window, size=concurrency))
+
+    env = CountingEnvironment()
+    FlowControl(env, batching=batching)
+    start_transfer = flow_types[flow_type](env)
+
+    def driver():
+        for route, size, start in zip(routes, sizes, starts):
+            if start > env.now:
+                yield env.timeout(start - env.now)
+            start_transfer(int(size), route).callbacks.append(env.on_completion)
+
+    env.process(driver())
+    env.run()
+    return env
+
+
+def run(scenario: str, flow_type: str, batching: bool, concurrency: int, seed: int = 0, memory=True) -> Result:
+    topology = create_topology(scenario, seed)
+
+    then = time.perf_counter()
+    env = simulate(topology, flow_type, batching, concurrency, seed)
+    wall_time = time.perf_counter() - then
+
+    peak_memory = -1
+    if memory:
+        topology = create_topology(scenario, seed)
+        tracemalloc.start()
+        try:
+            simulate(topology, flow_type, batching, concurrency, seed)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    rebalances = FlowControl.of(env).rebalances
+    if env.scheduler is not None:
+        rebalances += env.scheduler.rebalances
+
+    return Result(scenario, flow_type, batching, concurrency, env.events, rebalances, wall_time, env.last_completion,
+                  peak_memory)
+
+
+def print_results(results: List[Result]):
+    header = '%-6s %-18s %-5s %7s %9s %12s %10s %9s %9s %12s %10s' % (
+        'scen', 'flow type', 'batch', 'flows', 'events', 'events/s', 'rebalance', 'wall [s]', 'sim [s]', 'wall/sim',
+        'peak [MB]')
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        peak_memory = '%.2f' % (r.peak_memory / 1024 / 1024) if r.peak_memory >= 0 else 'n/a'
+        print('%-6s %-18s %-5s %7d %9d %12.0f %10d %9.3f %9.2f %12.4f %10s' % (
+            r.scenario, r.flow_type, r.batching, r.concurrency, r.events, r.events_per_second, r.rebalances,
+            r.wall_time, r.sim_time, r.wall_per_sim_second, peak_memory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the ether flow simulation')
+    parser.add_argument('--scenario', nargs='+', choices=list(scenarios.keys()), default=list(scenarios.keys()))
+    parser.add_argument('--flow-type', nargs='+', choices=list(flow_types.keys()), default=list(flow_types.keys()))
+    parser.add_argument('--batching', nargs='+', choices=['off', 'on'], default=['off', 'on'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring peak memory')
+    parser.add_argument('--json', help='write results to the given file')
+    args = parser.parse_args()
+
+    results = list()
+    for scenario in args.scenario:
+        for flow_type in args.flow_type:
+            for batching in args.batching:
+                if batching == 'on' and flow_type != 'Flow':
+                    continue  # only Flow processes use FlowControl batching
+                for concurrency in args.concurrency:
+                    result = run(scenario, flow_type, batching == 'on', concurrency, args.seed, not args.no_memory)
+                    results.append(result)
+                    print_results([result])
+
+    print()
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump([dict(r._asdict(), events_per_second=r.events_per_second,
+                            wall_per_sim_second=r.wall_per_sim_second) for r in results], fd, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 import inspect
 import itertools
-from collections import defaultdict, Iterable
-from typing import Callable, List, Union
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Callable, List, Union, Optional
 
 from srds import RandomSampler, ConstantSampler, IntegerTruncationSampler, ParameterizedDistribution
 
@@ -99,6 +100,9 @@ class Broker(Host):
 
 
 class LANCell(Cell):
+    # set during materialization if the backhaul is an UpDownLink
+    uplink: Optional[Link] = None
+    downlink: Optional[Link] = None
 
     def __init__(self, nodes, backhaul=None) -> None:
         super().__init__(nodes=nodes, backhaul=backhaul)
@@ -118,6 +122,8 @@ class LANCell(Cell):
             if isinstance(self.backhaul, UpDownLink):
                 uplink = Link(self.backhaul.bw_up, tags={'type': 'uplink', 'name': 'up_%s' % self.name})
                 downlink = Link(self.backhaul.bw_down, tags={'type': 'downlink', 'name': 'down_%s' % self.name})
+                self.uplink = uplink
+                self.downlink = downlink
 
                 topology.add_connection(Connection(self.switch, uplink, latency_dist=self.backhaul.latency_dist),
                                         directed=True)
@@ -132,6 +138,9 @@ class LANCell(Cell):
 
 
 class SharedLinkCell(Cell):
+    # set during materialization if the backhaul is an UpDownLink
+    uplink: Optional[Link] = None
+    downlink: Optional[Link] = None
 
     def __init__(self, nodes, shared_bandwidth=300, backhaul=None) -> None:
         super().__init__(nodes=nodes, backhaul=backhaul)
@@ -152,6 +161,8 @@ class SharedLinkCell(Cell):
             if isinstance(self.backhaul, UpDownLink):
                 uplink = Link(self.backhaul.bw_up, tags={'type': 'uplink', 'name': 'up_%s' % self.name})
                 downlink = Link(self.backhaul.bw_down, tags={'type': 'downlink', 'name': 'down_%s' % self.name})
+                self.uplink = uplink
+                self.downlink = downlink
 
                 topology.add_connection(Connection(self.link, uplink, latency_dist=self.backhaul.latency_dist), True)
                 topology.add_connection(Connection(downlink, self.link), True)
@@ -0,0 +1,248 @@
+"""
+Compute contention on nodes. A `Task` is the compute counterpart of a `Flow`: it executes an amount of work on a
+`Node`, and all tasks on a node share the node's `cpu_millis` under processor sharing. Each task also reserves memory
+on the node while it runs. For example, offloading a computation from a device to a server::
+
+    def offload(env, topology, device, server):
+        yield Flow(env, input_size, topology.route(device, server)).start()
+        yield Task(env, work=0.5, node=server, memory=512 * 1024 ** 2).start()
+        yield Flow(env, output_size, topology.route(server, device)).start()
+"""
+import heapq
+import logging
+import weakref
+from collections import deque
+from typing import Dict, List, Tuple, Optional, MutableMapping, Deque
+
+import simpy
+
+from ether.core import Node
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    __slots__ = ('env', 'work', 'node', 'memory', 'process')
+
+    work: float  # cpu seconds, i.e., seconds of one fully used core (1000 cpu millis)
+    node: Node
+    memory: int  # bytes
+
+    process: simpy.Process
+
+    def __init__(self, env: simpy.Environment, work: float, node: Node, memory: int = 0) -> None:
+        super().__init__()
+        self.env = env
+        self.work = work
+        self.node = node
+        self.memory = memory
+
+    def start(self):
+        self.process = self.env.process(self.run())
+        return self.process
+
+    def run(self):
+        """
+        Executes the task. Interrupting the process cancels the task.
+        """
+        processor = Processor.of(self.env, self.node)
+        event = processor.submit(self)
+        try:
+            yield event
+        except simpy.Interrupt:
+            logger.debug('%-5.2f task on %s cancelled', self.env.now, self.node.name)
+            processor.cancel(self)
+
+
+class Processor:
+    """
+    Executes the tasks of one node in one simulation environment under processor sharing: the node's ``cpu_millis``
+    are shared equally among all running tasks, where each task can use at most ``task_millis`` (by default one core).
+
+    Since all running tasks progress at the same rate, the processor keeps a virtual time, i.e., the work each task
+    has received since the processor was created. A task that starts at virtual time ``v`` completes when the virtual
+    time reaches ``v + work``, which does not change when other tasks arrive or leave. Completions are therefore kept
+    in a heap of virtual finish times, and each arrival or completion only updates the rate at which the virtual time
+    advances and reschedules a single timer.
+
+    A task is admitted once the memory it reserves is available, tasks waiting for memory are admitted in FIFO order.
+    Tasks that reserve more memory than the node has are rejected with a ValueError.
+    """
+    node: Node
+    task_millis: int
+
+    # statistics
+    completed: int
+
+    def __init__(self, env: simpy.Environment, node: Node, task_millis: int = 1000) -> None:
+        """
+        Creates the processor of a node in an environment. Use `Processor.of` to get the existing processor of a node.
+
+        :param env: the simulation environment
+        :param node: the node
+        :param task_millis: the maximum cpu millis a single task can use
+        :raises ValueError: if the node already has a processor in the environment
+        """
+        super().__init__()
+        if node in _processors.get(env, ()):
+            raise ValueError('node %s already has a processor in this environment' % node)
+        self._env = weakref.ref(env)  # the registry holds the processor until the environment is released
+        self.node = node
+        self.task_millis = task_millis
+        self.completed = 0
+
+        self.memory_used = 0
+        self._queue: Deque[Tuple[Task, simpy.Event]] = deque()  # tasks waiting for memory
+
+        self._running: Dict[Task, simpy.Event] = dict()
+        self._finish: List[Tuple[float, int, Task]] = list()  # (virtual finish time, sequence, task)
+        self._sequence = 0
+        self._vtime = 0.  # cpu seconds received by each running task
+        self._updated = env.now
+        self._rate = 0.  # cpu seconds per second each running task receives
+
+        self._timer: Optional[simpy.Event] = None
+
+        _processors.setdefault(env, dict())[node] = self
+
+    @property
+    def env(self) -> simpy.Environment:
+        return self._env()
+
+    @staticmethod
+    def of(env: simpy.Environment, node: Node) -> 'Processor':
+        """
+        Returns the processor of the given node in the given environment, and creates one if none exists.
+        """
+        try:
+            return _processors[env][node]
+        except KeyError:
+            return Processor(env, node)
+
+    @property
+    def running(self) -> int:
+        """
+        The number of running tasks.
+        """
+        return len(self._running)
+
+    @property
+    def waiting(self) -> int:
+        """
+        The number of tasks waiting for memory.
+        """
+        return len(self._queue)
+
+    @property
+    def utilization(self) -> float:
+        """
+        The fraction of the node's cpu millis that are currently used.
+        """
+        return self._rate * 1000 * len(self._running) / self.node.capacity.cpu_millis
+
+    def submit(self, task: Task) -> simpy.Event:
+        """
+        Submits a task for execution.
+
+        :param task: the task
+        :return: an event that is triggered when the task has completed
+        """
+        if task.memory > self.node.capacity.memory:
+            raise ValueError('task requires %d bytes of memory, but %s has %d' % (
+                task.memory, self.node, self.node.capacity.memory))
+
+        event = self.env.event()
+        if self._queue or self.memory_used + task.memory > self.node.capacity.memory:
+            self._queue.append((task, event))
+            return event
+
+        self._advance()
+        self._admit(task, event)
+        self._reschedule()
+        return event
+
+    def cancel(self, task: Task):
+        """
+        Removes a running or waiting task without completing it.
+        """
+        for i, (waiting, _) in enumerate(self._queue):
+            if waiting is task:
+                del self._queue[i]
+                # tasks queued behind the cancelled one may fit into the available memory now
+                self._advance()
+                self._admit_waiting()
+                self._reschedule()
+                return
+
+        if task not in self._running:
+            return
+
+        self._advance()
+        del self._running[task]
+        self._finish = [entry for entry in self._finish if entry[2] is not task]
+        heapq.heapify(self._finish)
+        self.memory_used -= task.memory
+        self._admit_waiting()
+        self._reschedule()
+
+    def remaining(self, task: Task) -> float:
+        """
+        Returns the remaining work of a running task in cpu seconds.
+        """
+        for finish, _, t in self._finish:
+            if t is task:
+                return max(finish - self._vtime - self._rate * (self.env.now - self._updated), 0)
+        raise KeyError(task)
+
+    def _admit(self, task: Task, event: simpy.Event):
+        self.memory_used += task.memory
+        self._running[task] = event
+        self._sequence += 1
+        heapq.heappush(self._finish, (self._vtime + task.work, self._sequence, task))
+
+    def _admit_waiting(self):
+        queue = self._queue
+        while queue and self.memory_used + queue[0][0].memory <= self.node.capacity.memory:
+            self._admit(*queue.popleft())
+
+    def _advance(self):
+        now = self.env.now
+        self._vtime += self._rate * (now - self._updated)
+        self._updated = now
+
+    def _reschedule(self):
+        n = len(self._running)
+        self._rate = min(self.task_millis, self.node.capacity.cpu_millis / n) / 1000 if n else 0.
+
+        if not self._finish:
+            self._timer = None
+            return
+
+        delay = max(self._finish[0][0] - self._vtime, 0) / self._rate
+        self._timer = timer = self.env.timeout(delay)
+        timer.callbacks.append(self._wakeup)
+
+    def _wakeup(self, event: simpy.Event):
+        if event is not self._timer:
+            return  # a timer that was superseded by a later arrival or departure
+
+        self._advance()
+
+        completed = list()
+        heap = self._finish
+        eps = 1e-9 * max(self._vtime, 1)
+        while heap and heap[0][0] <= self._vtime + eps:
+            _, _, task = heapq.heappop(heap)
+            completed.append((task, self._running.pop(task)))
+            self.memory_used -= task.memory
+
+        self._admit_waiting()
+        self._reschedule()
+
+        self.completed += len(completed)
+        for task, done in completed:
+            logger.debug('%-5.2f task on %s completed', self.env.now, self.node.name)
+            done.succeed(task)
+
+
+_processors: MutableMapping[simpy.Environment, Dict[Node, Processor]] = weakref.WeakKeyDictionary()
@@ -1,11 +1,20 @@
 import abc
+import bisect
+import heapq
+import itertools
 import logging
-from typing import List, Dict, NamedTuple, Union, AnyStr, Optional
+import weakref
+import zlib
+from collections.abc import MutableMapping
+from typing import List, Dict, NamedTuple, Union, AnyStr, Optional, Tuple, Set, Callable, Iterable, Iterator
 
 import numpy as np
 import simpy
 from srds import ParameterizedDistribution
 
+from ether.qos import stats as latency_stats
+from ether.qos.sampling import default_sampler
+
 logger = logging.getLogger(__name__)
 
 TransparentLink = AnyStr
@@ -21,6 +30,12 @@ links (like switches).
 """
 
 
+goodput_magic_number = 0.97
+"""
+Rough estimate of the fraction of the allocated bandwidth that is available as goodput (~ TCP overhead).
+"""
+
+
 class Connection(NamedTuple):
     """
     A connection is an edge in the topology. It represents physical network connections (like a cable, or wireless
@@ -35,19 +50,28 @@ class Connection(NamedTuple):
 
     def get_latency(self) -> float:
         if self.latency_dist:
-            return self.latency_dist.sample()
+            return default_sampler.sample(self.latency_dist)
         return self.latency
 
     def get_mode_latency(self) -> float:
         if self.latency_dist:
-            dist = self.latency_dist
             # we assume that latency_dist is a log norm distribution
-            return np.exp(np.log(dist.scale) - dist.args[0] ** 2) + dist.loc
+            return latency_stats.mode(self.latency_dist)
         return self.latency
 
     def get_mean_latency(self) -> float:
         if self.latency_dist:
-            return self.latency_dist.mean()
+            return latency_stats.mean(self.latency_dist)
+        return self.latency
+
+    def get_latency_statistic(self, stat: str) -> float:
+        """
+        Returns a statistic of the latency distribution, see `ether.qos.stats`.
+
+        :param stat: the name of the statistic, e.g., ``mode``, ``mean``, or ``p95``
+        """
+        if self.latency_dist:
+            return latency_stats.statistic(self.latency_dist, stat)
         return self.latency
 
 
@@ -103,11 +127,13 @@ class Node:
 
 
 class Route:
+    __slots__ = ('source', 'destination', 'path', 'hops', 'rtt')
+
     source: Node
     destination: Node
     path: List
     hops: List['Link']
-    rtt: float = 0  # round-trip latency in milliseconds
+    rtt: float  # round-trip latency in milliseconds
 
     def __init__(self, source: Node, destination: Node, path: list, rtt: float = 0) -> None:
         super().__init__()
@@ -123,12 +149,95 @@ class Route:
     def __copy__(self):
         return Route(self.source, self.destination, self.path, self.rtt)
 
+    def view(self, rtt: float) -> 'Route':
+        """
+        Returns a lightweight copy of this route with the given rtt, which shares the path and hops of this route.
+        """
+        route = Route.__new__(Route)
+        route.source = self.source
+        route.destination = self.destination
+        route.path = self.path
+        route.hops = self.hops
+        route.rtt = rtt
+        return route
+
+
+class EcmpRoute(Route):
+    """
+    A set of equal-cost routes between two nodes. It behaves like its first route, but a `Flow` created with it selects
+    one of the routes when it starts sending, i.e., after the connection has been established. Two selection policies
+    are available:
+
+    * ``hash``: a route chosen by hashing the flow identity (source, destination, and flow id) onto the routes, so a
+      flow always maps to the same route, while different flows spread uniformly across them
+    * ``least-loaded``: the route on which the flow would get the largest fair share of its bottleneck link
+    """
+    __slots__ = ('routes', 'policy')
+
+    policies = ('hash', 'least-loaded')
+
+    routes: List[Route]
+    policy: str
+
+    def __init__(self, routes: List[Route], policy: str = 'hash') -> None:
+        if not routes:
+            raise ValueError('need at least one route')
+        if policy not in self.policies:
+            raise ValueError('unknown policy %s, use one of %s' % (policy, self.policies))
+        first = routes[0]
+        super().__init__(first.source, first.destination, first.path, first.rtt)
+        self.routes = routes
+        self.policy = policy
+
+    def __copy__(self):
+        return EcmpRoute(self.routes, self.policy)
+
+    def select(self, env: Optional[simpy.Environment] = None, flow_id: int = None) -> Route:
+        """
+        Selects the route of a new flow in the given environment. If the environment has a `NetworkState`, the route
+        is bound to it.
+
+        :param env: the environment the flow runs in
+        :param flow_id: the id of the flow, hashed by the ``hash`` policy. Defaults to the next flow id of the flow
+                        control of the environment, i.e., flows are numbered in the order they select their routes.
+        :return: the selected route
+        """
+        state = _network_states.get(env) if env is not None else None
+        routes = self.routes if state is None else [state.bind(route) for route in self.routes]
+
+        if len(routes) == 1:
+            return routes[0]
+
+        if self.policy == 'hash':
+            if flow_id is None:
+                flow_id = next(FlowControl.of(env).flow_ids) if env is not None else 0
+            return routes[self.flow_hash(flow_id) % len(routes)]
+
+        best, best_share = None, -1
+        for route in routes:
+            share = min((hop.bandwidth / (hop.num_flows + 1) for hop in route.hops), default=float('inf'))
+            if share > best_share:
+                best, best_share = route, share
+        return best
+
+    def flow_hash(self, flow_id: int) -> int:
+        """
+        Returns a hash of the flow identity that is stable across processes (unlike ``hash`` of strings).
+        """
+        return zlib.crc32(('%s|%s|%d' % (self.source, self.destination, flow_id)).encode())
+
 
 class Flow:
+    __slots__ = ('env', 'size', 'route', 'sent', 'goodput', 'resumed', 'process')
+
     sent: int
     size: int
     route: Route
 
+    # the goodput (bytes/sec) the flow is currently sending at, and the time since when it does
+    goodput: float
+    resumed: float
+
     process: simpy.Process
 
     def __init__(self, env: simpy.Environment, size: int, route: Route) -> None:
@@ -136,7 +245,13 @@ class Flow:
         self.env = env
         self.size = size  # size in bytes
         self.route = route
+        if env is not None and _network_states and not isinstance(route, EcmpRoute):
+            state = _network_states.get(env)
+            if state is not None:
+                self.route = state.bind(route)
         self.sent = 0
+        self.goodput = 0
+        self.resumed = 0
 
     def start(self):
         self.process = self.env.process(self.run())
@@ -161,18 +276,28 @@ class Flow:
         if connection_time > 0:
             yield env.timeout(connection_time)
 
-        add_and_rebalance(self)
-        goodput = self.get_goodput_bps()
+        if isinstance(route, EcmpRoute):
+            self.route = route = route.select(env)
+            hops = route.hops
 
-        if goodput <= 0:
-            raise ValueError
-        # calculate the simulation time
-        bytes_remaining = self.size
-        transmission_time = bytes_remaining / goodput  # remaining seconds
+        control = FlowControl.of(env)
+        epoch = control.add(self)
 
         try:
+            if epoch is not None:
+                yield epoch
+            goodput = self.get_goodput_bps()
+
+            if goodput <= 0:
+                raise ValueError
+            # calculate the simulation time
+            bytes_remaining = self.size
+            transmission_time = bytes_remaining / goodput  # remaining seconds
+
             while True:
                 started = env.now
+                self.goodput = goodput
+                self.resumed = started
 
                 try:
                     logger.debug('%-5.2f sending %s -[%d]-> {%s} at %d bytes/sec',
@@ -196,7 +321,10 @@ class Flow:
             logger.debug('%-5.2f sending %s -[%d]-> {%s} completed in %.2fs',
                          env.now, source.name, size, sink.name, env.now - timer)
         finally:
-            remove_and_rebalance(self)
+            control.remove(self)
+
+        if control.completion_listeners:
+            control.complete(self, timer)
 
     def establish(self):
         env = self.env
@@ -212,24 +340,151 @@ class Flow:
                 connection_time = connection_time - (env.now - started)
 
 
+class LinkAllocation(MutableMapping):
+    """
+    Maps flows to the bandwidth allocated to them on a link. Besides the mapping, the allocated values are kept in a
+    sorted list with lazily maintained running prefix sums, so the number and sum of allocations below a threshold can
+    be found with a binary search rather than a scan over all flows.
+    """
+    __slots__ = ('_flows', '_values', '_sums')
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._flows: Dict[Flow, float] = dict()
+        self._values: List[float] = list()
+        self._sums: List[float] = list()  # _sums[i] = sum(_values[:i + 1]), may be shorter than _values
+
+    def __getitem__(self, flow: Flow) -> float:
+        return self._flows[flow]
+
+    def __setitem__(self, flow: Flow, value: float):
+        if flow in self._flows:
+            self._remove_value(self._flows[flow])
+
+        self._flows[flow] = value
+        i = bisect.bisect_right(self._values, value)
+        self._values.insert(i, value)
+        del self._sums[i:]
+
+    def __delitem__(self, flow: Flow):
+        value = self._flows.pop(flow)
+        self._remove_value(value)
+
+    def __contains__(self, flow) -> bool:
+        return flow in self._flows
+
+    def __iter__(self):
+        return iter(self._flows)
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def get(self, flow, default=None):
+        return self._flows.get(flow, default)
+
+    def _remove_value(self, value: float):
+        i = bisect.bisect_left(self._values, value)
+        del self._values[i]
+        del self._sums[i:]
+
+    def _prefix_sum(self, n: int) -> float:
+        """
+        Returns the sum of the n smallest allocations.
+        """
+        if n == 0:
+            return 0
+        sums = self._sums
+        if len(sums) < n:
+            start = len(sums)
+            initial = sums[-1] if sums else 0
+            sums.extend(itertools.accumulate(itertools.chain((initial,), self._values[start:n])))
+            del sums[start]  # remove the initial value
+        return sums[n - 1]
+
+    @property
+    def total(self) -> float:
+        """
+        The sum of all allocations.
+        """
+        return self._prefix_sum(len(self._values))
+
+    @property
+    def largest(self) -> float:
+        """
+        The largest allocation, or 0 if there are no allocations.
+        """
+        return self._values[-1] if self._values else 0
+
+    def below(self, threshold: float) -> Tuple[int, float]:
+        """
+        Returns the number and the sum of allocations that are strictly smaller than the given threshold.
+        """
+        n = bisect.bisect_left(self._values, threshold)
+        return n, self._prefix_sum(n)
+
+    def __repr__(self):
+        return repr(self._flows)
+
+
 class Link:
+    __slots__ = ('tags', 'allocation', '_bandwidth', '_num_flows', '_max_allocatable', '_table', '_id')
+
     bandwidth: int  # MBit/s
     tags: dict
 
     # calculated by rebalance
-    allocation: Dict[Flow, float]
+    allocation: LinkAllocation
     num_flows: int
     max_allocatable: float
 
     def __init__(self, bandwidth: int = 100, tags=None) -> None:
         super().__init__()
+        self._table: Optional['LinkTable'] = None
+        self._id = -1
+
         self.bandwidth = bandwidth
         self.tags = tags or dict()
 
-        self.allocation = dict()
+        self.allocation = LinkAllocation()
         self.num_flows = 0
         self.max_allocatable = bandwidth
 
+    @property
+    def bandwidth(self) -> int:
+        if self._table is None:
+            return self._bandwidth
+        value = float(self._table.bandwidth[self._id])
+        return int(value) if value.is_integer() else value
+
+    @bandwidth.setter
+    def bandwidth(self, value: int):
+        if self._table is None:
+            self._bandwidth = value
+        else:
+            self._table.bandwidth[self._id] = value
+
+    @property
+    def num_flows(self) -> int:
+        return self._num_flows if self._table is None else int(self._table.num_flows[self._id])
+
+    @num_flows.setter
+    def num_flows(self, value: int):
+        if self._table is None:
+            self._num_flows = value
+        else:
+            self._table.num_flows[self._id] = value
+
+    @property
+    def max_allocatable(self) -> float:
+        return self._max_allocatable if self._table is None else float(self._table.max_allocatable[self._id])
+
+    @max_allocatable.setter
+    def max_allocatable(self, value: float):
+        if self._table is None:
+            self._max_allocatable = value
+        else:
+            self._table.max_allocatable[self._id] = value
+
     def recalculate_max_allocatable(self):
         num_flows = self.num_flows
         bandwidth = self.bandwidth
@@ -242,11 +497,11 @@ class Link:
         fair_per_flow = bandwidth / num_flows
 
         # flows that require less than the fair value may keep it
-        reserved = {k: v for k, v in self.allocation.items() if v < fair_per_flow}
-        allocatable = bandwidth - sum(reserved.values())
+        reserved_flows, reserved = self.allocation.below(fair_per_flow)
+        allocatable = bandwidth - reserved
 
         # these are the flows competing for the remaining bandwidth
-        competing_flows = num_flows - len(reserved)
+        competing_flows = num_flows - reserved_flows
         if competing_flows:
             allocatable_per_flow = allocatable / competing_flows
         else:
@@ -266,7 +521,6 @@ class Link:
 
         allocated = self.allocation[flow]
         practical_bw = allocated * 125000
-        goodput_magic_number = 0.97  # rough estimate of goodput (~ TCP overhead)
 
         return practical_bw * goodput_magic_number
 
@@ -277,54 +531,545 @@ class Link:
         return self.__str__()
 
 
-def remove_and_rebalance(flow: Flow):
-    # first, collect all affected flows and links
-    affected_flows, affected_links = collect_subnet(flow)
-    affected_flows.remove(flow)
+class LinkState(Link):
+    """
+    The state of a link in one simulation, see `NetworkState`. It behaves like the link it belongs to, but keeps its own
+    allocation and number of flows. The bandwidth is copied from the link when the state is created.
+    """
+    __slots__ = ('link',)
+
+    link: Link
+
+    def __init__(self, link: Link) -> None:
+        super().__init__(link.bandwidth, link.tags)
+        self.link = link
+
+    def __str__(self):
+        return 'LinkState(%s)' % self.link
+
+
+class LinkTable:
+    """
+    Array-backed storage for the state of many links. Each link added to the table gets a dense id, and its
+    ``bandwidth``, ``num_flows``, and ``max_allocatable`` attributes are then read from and written to NumPy arrays at
+    that index. This allows link state to be analyzed with vectorized operations. A link can only be stored in one
+    table. The arrays grow geometrically, only the first ``len(table)`` entries are in use.
+    """
+    __slots__ = ('links', 'bandwidth', 'num_flows', 'max_allocatable')
+
+    links: List[Link]
+    bandwidth: np.ndarray
+    num_flows: np.ndarray
+    max_allocatable: np.ndarray
+
+    def __init__(self, capacity: int = 64) -> None:
+        super().__init__()
+        self.links = list()
+        self.bandwidth = np.zeros(capacity, dtype=float)
+        self.num_flows = np.zeros(capacity, dtype=np.int64)
+        self.max_allocatable = np.zeros(capacity, dtype=float)
+
+    def __len__(self):
+        return len(self.links)
+
+    def __contains__(self, link: Link) -> bool:
+        return link._table is self
+
+    def add(self, link: Link) -> int:
+        """
+        Moves the state of the given link into the table.
+
+        :param link: the link to add
+        :return: the id of the link in the table
+        """
+        if link._table is self:
+            return link._id
+        if link._table is not None:
+            raise ValueError('%s is already stored in a different link table' % link)
+
+        i = len(self.links)
+        if i == len(self.bandwidth):
+            self._grow(2 * i)
+
+        self.bandwidth[i] = link.bandwidth
+        self.num_flows[i] = link.num_flows
+        self.max_allocatable[i] = link.max_allocatable
+        self.links.append(link)
+
+        link._table = self
+        link._id = i
+        return i
+
+    def index(self, link: Link) -> int:
+        """
+        Returns the id of the given link in the table.
+        """
+        if link._table is not self:
+            raise KeyError(link)
+        return link._id
+
+    def fair_share(self) -> np.ndarray:
+        """
+        Returns the bandwidth each flow would get on each link if it were shared equally among its flows.
+        """
+        n = len(self.links)
+        return self.bandwidth[:n] / np.maximum(self.num_flows[:n], 1)
+
+    def _grow(self, capacity: int):
+        for attr in ('bandwidth', 'num_flows', 'max_allocatable'):
+            arr = getattr(self, attr)
+            grown = np.zeros(capacity, dtype=arr.dtype)
+            grown[:len(arr)] = arr
+            setattr(self, attr, grown)
+
+
+class Propagation(NamedTuple):
+    """
+    Describes how far a change of the flow allocation (a flow arriving or departing) propagated through the network.
+    """
+    flows: int  # number of flows whose fair share was recalculated
+    links: int  # number of links that were marked dirty
+    rounds: int  # number of times the dirty region had to be expanded (plus one)
+    changed: int  # number of flows whose allocation has changed
+
+
+class FlowControl:
+    """
+    Controls how flows in a simulation environment are added to and removed from the network. By default, every flow
+    arrival or departure rebalances the network immediately. In batching mode, all arrivals and departures that happen
+    at the same simulation time are collected and resolved by a single rebalance in a zero-delay event (the epoch).
+    Each running flow is therefore interrupted at most once per epoch, and arriving flows wait for the epoch to get
+    their allocation.
+
+    Interrupts can be suppressed for flows whose allocation changed only slightly: a flow is not interrupted if the
+    difference between its new allocation and the bandwidth it is currently sending at is within ``atol + rtol *
+    current`` MBit/s, or, if ``eta_tolerance`` is set, if its projected finish time moves by at most ``eta_tolerance``
+    seconds. Link allocations are always exact, a flow that was not interrupted picks up its exact allocation the next
+    time it is interrupted.
+
+    Flows whose links carry no other flow take a fast path: they get the bandwidth of their bottleneck link without a
+    rebalance (and without waiting for an epoch).
+
+    Listeners are called with the links whose allocation may have changed after each rebalance. Completion listeners
+    are called with each flow that has sent all its data, and the time the flow was started.
+
+    Use ``FlowControl(env, batching=True)`` to enable batching for an environment, and ``FlowControl.of(env)`` to get
+    the flow control of an environment.
+    """
+    batching: bool
+    rtol: float
+    atol: float
+    eta_tolerance: Optional[float]
+    listeners: List[Callable[[Iterable[Link]], None]]
+    completion_listeners: List[Callable[['Flow', float], None]]
+    flow_ids: Iterator[int]
+
+    # statistics
+    rebalances: int
+    fast_paths: int
+    interrupts: int
+    interrupts_avoided: int
+
+    def __init__(self, env: simpy.Environment, batching: bool = False, rtol: float = 0, atol: float = 0,
+                 eta_tolerance: float = None) -> None:
+        super().__init__()
+        self._env = weakref.ref(env)  # the registry holds the control until the environment is released
+        self.batching = batching
+        self.rtol = rtol
+        self.atol = atol
+        self.eta_tolerance = eta_tolerance
+        self.listeners = list()
+        self.completion_listeners = list()
+        self.flow_ids = itertools.count()
+
+        self.rebalances = 0
+        self.fast_paths = 0
+        self.interrupts = 0
+        self.interrupts_avoided = 0
+
+        self._epoch: Optional[simpy.Event] = None
+        self._arrivals: List[Flow] = list()
+        self._links: Set[Link] = set()
+
+        _flow_controls[env] = self
+
+    @property
+    def env(self) -> simpy.Environment:
+        return self._env()
+
+    @staticmethod
+    def of(env: simpy.Environment) -> 'FlowControl':
+        """
+        Returns the flow control of the given environment, and creates a default one if none exists.
+        """
+        try:
+            return _flow_controls[env]
+        except KeyError:
+            return FlowControl(env)
+
+    def add(self, flow: Flow) -> Optional[simpy.Event]:
+        """
+        Adds the flow to the links of its route and rebalances the network.
+
+        :param flow: the flow to add
+        :return: None if the flow has its allocation, or the epoch event the flow has to wait for in batching mode
+        """
+        if add_uncontended(flow):
+            self.fast_paths += 1
+            if self.listeners:
+                self.notify(flow.route.hops)
+            return None
+
+        for link in flow.route.hops:
+            link.num_flows += 1
+
+        if not self.batching:
+            self._rebalance((flow,), flow.route.hops)
+            return None
+
+        self._arrivals.append(flow)
+        self._links.update(flow.route.hops)
+        return self._schedule()
+
+    def remove(self, flow: Flow):
+        """
+        Removes the flow from the links of its route and rebalances the network.
+
+        :param flow: the flow to remove
+        """
+        hops = flow.route.hops
+        if flow not in hops[0].allocation:
+            # the flow was removed (e.g., interrupted) while waiting for the epoch
+            self._arrivals.remove(flow)
+            for link in hops:
+                link.num_flows -= 1
+            self._links.update(hops)
+            self._schedule()
+            return
+
+        if remove_uncontended(flow):
+            self.fast_paths += 1
+            if self.listeners:
+                self.notify(flow.route.hops)
+            return
+
+        for link in flow.route.hops:
+            link.num_flows -= 1
+            del link.allocation[flow]
+
+        if not self.batching:
+            self._rebalance((), flow.route.hops)
+            return
+
+        self._links.update(flow.route.hops)
+        self._schedule()
+
+    def _schedule(self) -> simpy.Event:
+        if self._epoch is None:
+            self._epoch = self.env.timeout(0)
+            self._epoch.callbacks.append(self._on_epoch)
+        return self._epoch
+
+    def _on_epoch(self, _):
+        arrivals, links = self._arrivals, self._links
+        self._epoch = None
+        self._arrivals = list()
+        self._links = set()
+
+        self._rebalance(arrivals, links)
+
+    def _rebalance(self, arrivals, links):
+        self.rebalances += 1
+        allocation, propagation = propagate(arrivals, links)
+
+        for flow in arrivals:
+            allocation.pop(flow, None)
+
+        for flow, bw in allocation.items():
+            if not flow.process.is_alive:
+                continue
+            if not self._exceeds_tolerance(flow, bw):
+                self.interrupts_avoided += 1
+                continue
+            self.interrupts += 1
+            flow.process.interrupt(bw)
+
+        logger.debug('%-5.2f rebalancing %d arrivals propagated to %s', self.env.now, len(arrivals), propagation)
+
+        if self.listeners:
+            links = set(links)
+            for flow in allocation:
+                links.update(flow.route.hops)
+            for flow in arrivals:
+                links.update(flow.route.hops)
+            self.notify(links)
+
+    def notify(self, links: Iterable[Link]):
+        """
+        Notifies all listeners that the allocation of the given links has changed.
+        """
+        for listener in self.listeners:
+            listener(links)
+
+    def complete(self, flow: Flow, started: float):
+        """
+        Notifies all completion listeners that the given flow, which was started at the given time, has completed.
+        """
+        for listener in self.completion_listeners:
+            listener(flow, started)
+
+    def _exceeds_tolerance(self, flow: Flow, bw: float) -> bool:
+        goodput = flow.goodput
+        if not goodput:
+            return True
+
+        new_goodput = bw * 125000 * goodput_magic_number
+        if abs(new_goodput - goodput) <= self.atol * 125000 * goodput_magic_number + self.rtol * goodput:
+            return False
+
+        if self.eta_tolerance is not None and new_goodput > 0:
+            remaining = flow.size - flow.sent - goodput * (self.env.now - flow.resumed)
+            if abs(remaining / new_goodput - remaining / goodput) <= self.eta_tolerance:
+                return False
+
+        return True
+
+
+_flow_controls: MutableMapping[simpy.Environment, FlowControl] = weakref.WeakKeyDictionary()
+
+
+class NetworkState:
+    """
+    Holds the mutable state of links (allocations, number of flows) of the simulation in one environment, so that
+    several simulations can share one read-only topology, e.g., in threads, or in processes that inherit the topology
+    from their parent. Without a network state, flows keep their state on the `Link` objects of the topology.
+
+    Create the network state before creating flows in the environment::
+
+        state = NetworkState(env)
+        Flow(env, size, topology.route(a, b)).start()  # allocates bandwidth on state[link] rather than on link
+
+    Flows created in the environment get a copy of their route whose hops are the `LinkState` objects of this network
+    state. Link state is created lazily the first time a link is used.
+    """
+    links: Dict[Link, LinkState]
+
+    def __init__(self, env: simpy.Environment) -> None:
+        super().__init__()
+        self._env = weakref.ref(env)  # the registry holds the state until the environment is released
+        self.links = dict()
+        self._routes: Dict[int, Tuple[list, list]] = dict()  # id of a path -> (path, bound path)
+
+        _network_states[env] = self
+
+    @property
+    def env(self) -> simpy.Environment:
+        return self._env()
+
+    @staticmethod
+    def of(env: simpy.Environment) -> Optional['NetworkState']:
+        """
+        Returns the network state of the given environment, or None if flows use the state of the links themselves.
+        """
+        return _network_states.get(env)
+
+    def __getitem__(self, link: Link) -> LinkState:
+        state = self.links.get(link)
+        if state is None:
+            if isinstance(link, LinkState):
+                if self.links.get(link.link) is not link:
+                    raise ValueError('%s belongs to a different network state' % link)
+                return link
+            state = LinkState(link)
+            self.links[link] = state
+        return state
+
+    def bind(self, route: Route) -> Route:
+        """
+        Returns a copy of the route whose hops are the link states of this network state.
+        """
+        path = route.path
+        entry = self._routes.get(id(path))
+        if entry is None or entry[0] is not path:
+            bound = [self[hop] if isinstance(hop, Link) else hop for hop in path]
+            entry = (path, bound)
+            self._routes[id(path)] = entry
+            self._routes[id(bound)] = (bound, bound)
+        return Route(route.source, route.destination, entry[1], route.rtt)
+
+
+_network_states: MutableMapping[simpy.Environment, NetworkState] = weakref.WeakKeyDictionary()
+
+
+def remove_and_rebalance(flow: Flow) -> Propagation:
+    if remove_uncontended(flow):
+        return Propagation(0, len(flow.route.hops), 0, 0)
 
     for link in flow.route.hops:
         link.num_flows -= 1
         del link.allocation[flow]
-        link.recalculate_max_allocatable()
 
-    rebalance(flow, affected_flows, affected_links)
+    allocation, propagation = propagate((), flow.route.hops)
+    interrupt(flow, allocation)
 
+    logger.debug('removing %s propagated to %s', flow.route, propagation)
+    return propagation
 
-def add_and_rebalance(flow: Flow):
-    # first, collect all affected flows and links
-    affected_flows, affected_links = collect_subnet(flow)
+
+def add_and_rebalance(flow: Flow) -> Propagation:
+    if add_uncontended(flow):
+        return Propagation(1, len(flow.route.hops), 0, 1)
 
     for link in flow.route.hops:
         link.num_flows += 1
+
+    allocation, propagation = propagate((flow,), flow.route.hops)
+    interrupt(flow, allocation)
+
+    logger.debug('adding %s propagated to %s', flow.route, propagation)
+    return propagation
+
+
+def add_uncontended(flow: Flow) -> bool:
+    """
+    Fast path for adding a flow whose links carry no other flow. The flow simply gets the bandwidth of its bottleneck
+    link. Once another flow arrives on any of the links, the flow is rebalanced like any other.
+
+    :param flow: the flow to add
+    :return: True if the flow was added, False if any of its links is contended
+    """
+    hops = flow.route.hops
+    for link in hops:
+        if link.num_flows:
+            return False
+
+    bandwidth = min([link.bandwidth for link in hops])
+    for link in hops:
+        link.num_flows = 1
+        link.allocation[flow] = bandwidth
         link.recalculate_max_allocatable()
 
-    rebalance(flow, affected_flows, affected_links)
+    return True
+
+
+def remove_uncontended(flow: Flow) -> bool:
+    """
+    Fast path for removing a flow that is the only flow on all of its links.
+
+    :param flow: the flow to remove
+    :return: True if the flow was removed, False if any of its links carries other flows
+    """
+    hops = flow.route.hops
+    for link in hops:
+        if link.num_flows != 1:
+            return False
+
+    for link in hops:
+        link.num_flows = 0
+        del link.allocation[flow]
+        link.recalculate_max_allocatable()
+
+    return True
 
 
 def rebalance(triggering_flow, affected_flows, affected_links):
-    # holds all allocations that have changed (some may be unaffected)
-    allocation: Dict[Flow, float] = dict()
+    """
+    Calculates a max-min fair allocation for the given flows using progressive filling, updates the allocation of
+    each link, and interrupts all running flows (except the triggering flow) whose allocation has changed.
 
-    while affected_flows:
-        bottlenecks = {flow: min([link.max_allocatable for link in flow.route.hops]) for flow in affected_flows}
-        flow: Flow = min(bottlenecks, key=lambda k: bottlenecks[k])
-        request = bottlenecks[flow]
+    :param triggering_flow: the flow that caused the rebalance (it is not interrupted)
+    :param affected_flows: the flows to allocate bandwidth to
+    :param affected_links: the links traversed by the affected flows
+    :return: a dictionary holding the new bandwidth of all flows whose allocation has changed
+    """
+    allocation = allocate(fill(affected_flows))
 
-        changed = False
+    for link in affected_links:
+        link.recalculate_max_allocatable()
 
-        for link in flow.route.hops:
-            if link.allocation.get(flow) == request:
+    interrupt(triggering_flow, allocation)
+    return allocation
+
+
+def propagate(flows, links) -> Tuple[Dict[Flow, float], Propagation]:
+    """
+    Incrementally rebalances the network after the given flows were added to, or removed from, the given links. Rather
+    than collecting the entire connected subnet, the fair shares are only recalculated for a dirty region of links,
+    starting with the given ones. Flows in the region are allocated against the bandwidth reserved by flows outside of
+    it. Whenever a flow's allocation changes, or a flow is held back by a link on which some outside flow has a larger
+    share, that link is marked dirty and the region is expanded. Assuming the allocation outside the region was max-min
+    fair before the change, it still is once the region stops growing.
+
+    :param flows: flows that need an allocation but are not yet registered with their links (i.e., new flows)
+    :param links: the links where the change happened
+    :return: a tuple of the changed allocations, and a description of how far the change propagated
+    """
+    dirty = set(links)
+    affected = set(flows)
+    for link in dirty:
+        affected.update(link.allocation)
+
+    rounds = 0
+    while True:
+        rounds += 1
+        shares, bottlenecks = _fill(affected)
+
+        expand = set()
+        for flow, share in shares.items():
+            # a flow has the same allocation on all of its links
+            current = flow.route.hops[0].allocation.get(flow)
+
+            if current is None or not _isclose(current, share):
+                expand.update(link for link in flow.route.hops if link not in dirty)
                 continue
-            changed = True
+
+            bottleneck = bottlenecks[flow]
+            if bottleneck not in dirty:
+                largest = bottleneck.allocation.largest
+                if largest > share and not _isclose(largest, share):
+                    expand.add(bottleneck)
+
+        if not expand:
+            break
+
+        dirty.update(expand)
+        for link in expand:
+            affected.update(link.allocation)
+
+    allocation = allocate(shares)
+
+    for link in dirty:
+        link.recalculate_max_allocatable()
+
+    return allocation, Propagation(len(affected), len(dirty), rounds, len(allocation))
+
+
+def allocate(shares: Dict[Flow, float]) -> Dict[Flow, float]:
+    """
+    Updates the link allocations of the given flows.
+
+    :param shares: the new bandwidth of each flow
+    :return: a dictionary holding the new bandwidth of all flows whose allocation has changed
+    """
+    allocation: Dict[Flow, float] = dict()
+
+    for flow, request in shares.items():
+        # a flow has the same allocation on all of its links
+        current = flow.route.hops[0].allocation.get(flow)
+        if current is not None and _isclose(current, request):
+            continue
+
+        for link in flow.route.hops:
             link.allocation[flow] = request
-            link.recalculate_max_allocatable()
+        allocation[flow] = request
 
-        if changed:
-            allocation[flow] = request
+    return allocation
 
-        del bottlenecks[flow]
-        affected_flows.remove(flow)
 
+def interrupt(triggering_flow: Flow, allocation: Dict[Flow, float]):
+    """
+    Interrupts the processes of all flows with a changed allocation, except the one of the triggering flow.
+    """
     for flow, bw in allocation.items():
         if flow is triggering_flow:
             continue
@@ -332,13 +1077,84 @@ def rebalance(triggering_flow, affected_flows, affected_links):
             continue
         flow.process.interrupt(bw)
 
-    # logger.info(' >> new allocation:')
-    # for link in affected_links:
-    #     logger.info(' - %s (%.2f)', link, link.bandwidth)
-    #     for flow, bw in link.allocation.items():
-    #         logger.info('   - %8.2f %s', bw, flow.route)
 
-    return allocation
+def _isclose(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b), 1)
+
+
+def fill(flows) -> Dict[Flow, float]:
+    """
+    Progressive filling algorithm that calculates the max-min fair share of each given flow. Links are kept in a
+    priority queue ordered by their current fair share (the remaining capacity divided by the number of flows that are
+    not yet frozen). The link with the smallest fair share is the bottleneck of all its unfrozen flows, which are then
+    frozen at that share. Only the links traversed by those flows need to be updated, which makes the algorithm
+    O((F + L) log L) for F flow hops and L links.
+
+    Bandwidth allocated on a link to flows that are not part of the given flows is treated as reserved.
+
+    :param flows: the flows to allocate bandwidth to
+    :return: a dictionary mapping each flow to its fair share
+    """
+    return _fill(flows)[0]
+
+
+def _fill(flows) -> Tuple[Dict[Flow, float], Dict[Flow, Link]]:
+    remaining: Dict[Link, float] = dict()
+    unfrozen: Dict[Link, int] = dict()
+    members: Dict[Link, List[Flow]] = dict()
+
+    for flow in flows:
+        for link in flow.route.hops:
+            if link not in members:
+                members[link] = list()
+                unfrozen[link] = 0
+            members[link].append(flow)
+            unfrozen[link] += 1
+
+    for link, link_flows in members.items():
+        allocation = link.allocation
+        own = [allocation[flow] for flow in link_flows if flow in allocation]
+        if len(own) == len(allocation):
+            remaining[link] = link.bandwidth
+        else:
+            remaining[link] = link.bandwidth - (allocation.total - sum(own))
+
+    # heap entries are (fair share, version, link), entries with an outdated version are skipped
+    version = itertools.count()
+    latest: Dict[Link, int] = dict()
+    heap = list()
+    for link, n in unfrozen.items():
+        latest[link] = v = next(version)
+        heap.append((max(remaining[link], 0) / n, v, link))
+    heapq.heapify(heap)
+
+    shares: Dict[Flow, float] = dict()
+    bottlenecks: Dict[Flow, Link] = dict()
+
+    while heap:
+        share, v, bottleneck = heapq.heappop(heap)
+        if latest[bottleneck] != v:
+            continue
+
+        for flow in members[bottleneck]:
+            if flow in shares:
+                continue
+            shares[flow] = share
+            bottlenecks[flow] = bottleneck
+
+            for link in flow.route.hops:
+                if link is bottleneck:
+                    continue
+                remaining[link] -= share
+                unfrozen[link] -= 1
+
+                latest[link] = v = next(version)
+                if unfrozen[link]:
+                    heapq.heappush(heap, (max(remaining[link], 0) / unfrozen[link], v, link))
+
+        unfrozen[bottleneck] = 0
+
+    return shares, bottlenecks
 
 
 def remove_without_rebalance(flow: Flow):
@@ -358,6 +1174,8 @@ def add_without_rebalance(flow: Flow):
 
 # Thanks, @jjnp for this implementation
 class UninterruptingFlow(Flow):
+    __slots__ = ()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -377,7 +1195,12 @@ class UninterruptingFlow(Flow):
         if connection_time > 0:
             yield env.timeout(connection_time)
 
+        if isinstance(route, EcmpRoute):
+            self.route = route = route.select(env)
+            hops = route.hops
+
         add_without_rebalance(self)
+        FlowControl.of(env).notify(hops)
         goodput = self.get_goodput_bps()
 
         if goodput <= 0:
@@ -389,6 +1212,8 @@ class UninterruptingFlow(Flow):
         try:
             while True:
                 started = env.now
+                self.goodput = goodput
+                self.resumed = started
 
                 try:
                     logger.debug('%-5.2f sending %s -[%d]-> {%s} at %d bytes/sec',
@@ -413,6 +1238,11 @@ class UninterruptingFlow(Flow):
                          env.now, source.name, size, sink.name, env.now - timer)
         finally:
             remove_without_rebalance(self)
+            FlowControl.of(env).notify(hops)
+
+        control = FlowControl.of(env)
+        if control.completion_listeners:
+            control.complete(self, timer)
 
 
 def collect_subnet(flow: Flow):
@@ -0,0 +1,501 @@
+"""
+Offline fluid model of bulk data transfers. Instead of running one simpy `Flow` process per transfer, the completion
+times of a fixed batch of transfers are calculated directly: between two events (a transfer starting or completing),
+every transfer sends at its max-min fair rate. The rates follow the same goodput model as `Link.get_goodput_bps`.
+
+`water_fill` calculates the rates of a set of transfers from scratch. `simulate` instead keeps the transfers grouped by
+their bottleneck link. All members of a group send at the same rate, so a group tracks the bytes each member has sent
+in a single virtual clock, and a change of its rate does not touch the members. An event only re-fills the groups whose
+links it touches (and the groups that turn out to be affected by that), and only the transfers that change their
+bottleneck move between groups.
+"""
+import heapq
+from collections import Counter
+from typing import Iterable, Tuple, Union, Dict, List, Optional, Set
+
+import numpy as np
+
+from ether.core import Node, Link, Route, goodput_magic_number
+from ether.topology import Topology
+
+Transfer = Union[Tuple[Node, Node, int], Tuple[Node, Node, int, float]]
+"""
+A transfer of a number of bytes from a source to a destination node, optionally with a start time (default 0).
+"""
+
+
+class Incidence:
+    """
+    Sparse incidence structure between transfers and links, stored as flat arrays with one entry per hop.
+    """
+    links: List[Link]
+    bandwidth: np.ndarray  # MBit/s per link
+    flow: np.ndarray  # transfer index of each entry
+    link: np.ndarray  # link index of each entry
+
+    def __init__(self, routes: List[Route]) -> None:
+        super().__init__()
+        index: Dict[Link, int] = dict()
+        flows = list()
+        links = list()
+
+        for i, route in enumerate(routes):
+            if not route.hops:
+                raise ValueError('no hops in route from %s to %s' % (route.source, route.destination))
+            for hop in route.hops:
+                if hop not in index:
+                    index[hop] = len(index)
+                flows.append(i)
+                links.append(index[hop])
+
+        self.links = list(index.keys())
+        self.bandwidth = np.array([link.bandwidth for link in self.links], dtype=float)
+        self.flow = np.array(flows, dtype=np.int64)
+        self.link = np.array(links, dtype=np.int64)
+
+
+def water_fill(incidence: Incidence, active: np.ndarray) -> np.ndarray:
+    """
+    Calculates the max-min fair bandwidth (in MBit/s) of each active transfer.
+
+    :param incidence: the transfer/link incidence structure
+    :param active: a boolean mask of the active transfers
+    :return: an array holding the bandwidth of each transfer (0 for inactive ones)
+    """
+    rate = np.zeros(len(active))
+
+    entries = active[incidence.flow]
+    flow = incidence.flow[entries]
+    link = incidence.link[entries]
+    remaining = incidence.bandwidth.copy()
+    unfrozen = active.copy()
+
+    while len(flow):
+        counts = np.bincount(link, minlength=len(remaining))
+        used = counts > 0
+        share = np.full(len(remaining), np.inf)
+        share[used] = np.maximum(remaining[used], 0) / counts[used]
+        level = share.min()
+
+        # freeze all transfers that traverse a link at the lowest level
+        bottlenecks = share <= level + 1e-12 * max(level, 1)
+        frozen = np.unique(flow[bottlenecks[link]])
+        rate[frozen] = level
+        unfrozen[frozen] = False
+
+        entries = unfrozen[flow]
+        remaining -= np.bincount(link[~entries], minlength=len(remaining)) * level
+        flow = flow[entries]
+        link = link[entries]
+
+    return rate
+
+
+def completion_times(topology: Topology, transfers: Iterable[Transfer], connection_setup=True) -> np.ndarray:
+    """
+    Calculates the times at which each of the given transfers would complete in a flow simulation where all transfers
+    are started at their start time. Routes are resolved once per node pair using the mode of the latency
+    distributions.
+
+    :param topology: the topology to resolve routes in
+    :param transfers: (source, destination, size) or (source, destination, size, start) tuples, size in bytes
+    :param connection_setup: whether to delay each transfer by the estimated connection establish time like `Flow`
+    :return: an array holding the completion time of each transfer
+    """
+    routes: Dict[Tuple[Node, Node], Route] = dict()
+    transfer_routes = list()
+    sizes = list()
+    starts = list()
+
+    for transfer in transfers:
+        source, destination, size = transfer[:3]
+        k = (source, destination)
+        if k not in routes:
+            routes[k] = topology.route(source, destination, use_mode=True)
+        route = routes[k]
+
+        start = transfer[3] if len(transfer) > 3 else 0
+        if connection_setup:
+            start += (route.rtt * 1.5) / 1000  # rough estimate of TCP connection establish time
+
+        transfer_routes.append(route)
+        sizes.append(size)
+        starts.append(start)
+
+    return simulate(Incidence(transfer_routes), np.array(sizes, dtype=float), np.array(starts, dtype=float))
+
+
+def simulate(incidence: Incidence, sizes: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Runs the fluid model over the given transfers.
+
+    :param incidence: the transfer/link incidence structure
+    :param sizes: the size of each transfer in bytes
+    :param starts: the start time of each transfer
+    :return: an array holding the completion time of each transfer
+    """
+    return _Simulation(incidence, sizes, starts).run()
+
+
+def _isclose(a: float, b: float) -> bool:
+    return abs(a - b) <= 1e-9 * max(abs(a), abs(b), 1)
+
+
+class _Group:
+    """
+    The active transfers whose bottleneck is one link. All members send at the same rate, so instead of the remaining
+    bytes of each member, the group keeps a virtual clock of the bytes each member has sent, and a member completes when
+    the clock reaches its key.
+    """
+    __slots__ = ('link', 'level', 'rate', 'vtime', 'updated', 'members', 'cross', 'count', 'heap', 'version', '_arrays')
+
+    def __init__(self, link: Optional[int], now: float) -> None:
+        self.link = link
+        self.level = 0.  # MBit/s per member
+        self.rate = 0.  # goodput in bytes/s per member
+        self.vtime = 0.
+        self.updated = now
+        self.members: Set[int] = set()
+        self.cross: Dict[int, Set[int]] = dict()  # link -> members that traverse the link
+        self.count: Dict[int, int] = dict()  # link -> number of hops of members over the link
+        self.heap: List[Tuple[float, int]] = list()  # (key, member), may contain stale entries
+        self.version = 0
+        self._arrays = None
+
+    def settle(self, now: float):
+        self.vtime += self.rate * (now - self.updated)
+        self.updated = now
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the links traversed by the members and the number of hops over each link as arrays.
+        """
+        if self._arrays is None:
+            n = len(self.count)
+            self._arrays = (np.fromiter(self.count.keys(), np.int64, n), np.fromiter(self.count.values(), float, n))
+        return self._arrays
+
+
+class _Atom:
+    """
+    The part of a group that is still unfrozen while re-filling, without modifying the group itself.
+    """
+    __slots__ = ('group', 'removed', 'count', 'size', 'positions')
+
+    def __init__(self, group: _Group) -> None:
+        self.group = group
+        self.removed: Set[int] = set()
+        self.count = group.count  # copied once transfers are split off
+        self.size = len(group.members)
+        self.positions = None  # of the links of the group in the links of the region
+
+    def traversing(self, link: int) -> Set[int]:
+        members = self.group.cross.get(link, set())
+        return members - self.removed if self.removed else members
+
+
+class _Simulation:
+    """
+    Event loop of the fluid model. Each event (transfers starting or completing) re-fills the affected groups.
+    """
+
+    def __init__(self, incidence: Incidence, sizes: np.ndarray, starts: np.ndarray) -> None:
+        super().__init__()
+        n = len(sizes)
+        self.sizes = sizes
+        self.starts = starts
+        self.capacity = incidence.bandwidth
+
+        # hops of each transfer as (link, number of traversals) pairs
+        order = np.argsort(incidence.flow, kind='stable')
+        links = incidence.link[order].tolist()
+        bounds = np.searchsorted(incidence.flow[order], np.arange(n + 1)).tolist()
+        self.hops = [tuple(Counter(links[bounds[i]:bounds[i + 1]]).items()) for i in range(n)]
+
+        self.group_of: List[Optional[_Group]] = [None] * n
+        self.key = [0.] * n
+        self.finished = np.full(n, np.nan)
+
+        self.groups: Dict[int, _Group] = dict()  # bottleneck link -> group
+        self.groups_on: Dict[int, Set[_Group]] = {link: set() for link in range(len(self.capacity))}
+        self.bottleneck = np.zeros(len(self.capacity), dtype=bool)  # whether a link is the bottleneck of a group
+        self.load = np.zeros(len(self.capacity))  # MBit/s allocated to the groups on each link
+        self.events: List[Tuple[float, int, _Group]] = list()  # (next completion, version, group)
+        self.versions = 0
+        self.now = 0.
+
+    def run(self) -> np.ndarray:
+        n = len(self.sizes)
+        arrivals = np.argsort(self.starts, kind='stable').tolist()
+        starts = self.starts.tolist()
+        next_arrival = 0
+
+        while True:
+            completion = self._next_completion()
+            arrival = starts[arrivals[next_arrival]] if next_arrival < n else np.inf
+            if completion == np.inf and arrival == np.inf:
+                break
+
+            then = self.now
+            self.now = max(self.now, min(completion, arrival))
+            tolerance = (self.now - then) * 1e-9
+            region: Dict[_Group, None] = dict()  # used as an ordered set
+
+            # remove all transfers that complete now
+            while completion <= self.now + tolerance:
+                _, _, group = heapq.heappop(self.events)
+                group.settle(self.now)
+                region[group] = None
+                heap = group.heap
+                while heap:
+                    key, i = heap[0]
+                    if self.group_of[i] is group and self.key[i] == key:
+                        if group.updated + (key - group.vtime) / group.rate > self.now + tolerance:
+                            break
+                        self._leave(group, i)
+                        self.finished[i] = self.now
+                        for link, traversals in self.hops[i]:
+                            self.load[link] -= traversals * group.level
+                            if link in self.groups:
+                                region[self.groups[link]] = None
+                    heapq.heappop(heap)
+                completion = self._next_completion()
+
+            # gather all transfers that start now in a pending group
+            if next_arrival < n and starts[arrivals[next_arrival]] <= self.now:
+                pending = _Group(None, self.now)
+                while next_arrival < n and starts[arrivals[next_arrival]] <= self.now:
+                    i = arrivals[next_arrival]
+                    next_arrival += 1
+                    self._join(pending, i, float(self.sizes[i]))
+                    for link, _ in self.hops[i]:
+                        if link in self.groups:
+                            region[self.groups[link]] = None
+                region[pending] = None
+
+            self._rebalance(region)
+
+        return self.finished
+
+    def _next_completion(self) -> float:
+        events = self.events
+        while events:
+            _, version, group = events[0]
+            if group.version == version and self.groups.get(group.link) is group:
+                return events[0][0]
+            heapq.heappop(events)
+        return np.inf
+
+    def _schedule(self, group: _Group):
+        heap = group.heap
+        while heap and not (self.group_of[heap[0][1]] is group and self.key[heap[0][1]] == heap[0][0]):
+            heapq.heappop(heap)
+
+        self.versions += 1
+        group.version = self.versions
+        if heap:
+            time = group.updated + (heap[0][0] - group.vtime) / group.rate
+            heapq.heappush(self.events, (time, self.versions, group))
+
+    def _join(self, group: _Group, i: int, key: float):
+        group.members.add(i)
+        group._arrays = None
+        for link, n in self.hops[i]:
+            members = group.cross.get(link)
+            if members is None:
+                group.cross[link] = {i}
+                group.count[link] = n
+                self.groups_on[link].add(group)
+            else:
+                members.add(i)
+                group.count[link] += n
+        self.group_of[i] = group
+        self.key[i] = key
+        heapq.heappush(group.heap, (key, i))
+
+    def _leave(self, group: _Group, i: int):
+        group.members.discard(i)
+        group._arrays = None
+        for link, n in self.hops[i]:
+            members = group.cross[link]
+            members.discard(i)
+            if members:
+                group.count[link] -= n
+            else:
+                del group.cross[link]
+                del group.count[link]
+                self.groups_on[link].discard(group)
+        self.group_of[i] = None
+
+    def _move(self, source: _Group, target: _Group, i: int):
+        remaining = self.key[i] - source.vtime
+        self._leave(source, i)
+        self._join(target, i, target.vtime + remaining)
+
+    def _rebalance(self, region: Dict[_Group, None]):
+        """
+        Re-fills the groups in the region. Like `propagate`, the transfers of all other groups keep their rates, and
+        the region grows until the result is consistent with them.
+        """
+        while True:
+            pieces, expand, available = self._fill(region)
+            if not expand:
+                break
+            region.update(dict.fromkeys(expand))
+
+        self._commit(region, pieces, available)
+
+    def _fill(self, region: Dict[_Group, None]):
+        atoms = [_Atom(group) for group in region if group.members]
+        if not atoms:
+            return list(), set(), (np.empty(0, dtype=np.int64), np.empty(0))
+
+        arrays = [atom.group.arrays() for atom in atoms]
+        if len(atoms) == 1:
+            # the links of a group are unique already
+            links, counts = arrays[0]
+            order = np.argsort(links)
+            inverse = np.empty_like(order)
+            inverse[order] = np.arange(len(order))
+            links, unfrozen = links[order], counts[order]
+            available = self.capacity[links] - self.load[links] + unfrozen * atoms[0].group.level
+        else:
+            lengths = [len(links) for links, _ in arrays]
+            counts = np.concatenate([counts for _, counts in arrays])
+            levels = np.repeat(np.array([atom.group.level for atom in atoms]), lengths)
+            links, inverse = np.unique(np.concatenate([links for links, _ in arrays]), return_inverse=True)
+            available = self.capacity[links] - self.load[links] + np.bincount(inverse, counts * levels, len(links))
+            unfrozen = np.bincount(inverse, counts, len(links))
+
+        start = 0
+        for atom, (hops, _) in zip(atoms, arrays):
+            atom.positions = inverse[start:start + len(hops)]
+            start += len(hops)
+
+        # pieces of groups that froze at a bottleneck: (atom, transfers or None for the rest of the atom, link, level)
+        pieces = list()
+        expand: Set[_Group] = set()
+        share = np.empty(len(links))
+        left = len(atoms)
+
+        while left:
+            share.fill(np.inf)
+            np.divide(np.maximum(available, 0), unfrozen, out=share, where=unfrozen > 0)
+            k = int(share.argmin())
+            level = float(share[k])
+            bottleneck = int(links[k])
+
+            for atom in atoms:
+                if not atom.size or not atom.count.get(bottleneck):
+                    continue
+
+                members = atom.traversing(bottleneck)
+                if len(members) == atom.size:
+                    atom.size = 0
+                    left -= 1
+                    if atom.count is atom.group.count:
+                        hops, traversals = atom.group.arrays()
+                        positions = atom.positions
+                    else:
+                        hops = np.fromiter(atom.count.keys(), np.int64, len(atom.count))
+                        traversals = np.fromiter(atom.count.values(), float, len(atom.count))
+                        positions = np.searchsorted(links, hops)
+                    pieces.append((atom, None, bottleneck, level))
+                else:
+                    members = list(members)
+                    split = Counter()
+                    for i in members:
+                        for link, n in self.hops[i]:
+                            split[link] += n
+                    if atom.count is atom.group.count:
+                        atom.count = dict(atom.count)
+                    for link, n in split.items():
+                        atom.count[link] -= n
+                    atom.removed.update(members)
+                    atom.size -= len(members)
+                    hops = np.fromiter(split.keys(), np.int64, len(split))
+                    traversals = np.fromiter(split.values(), float, len(split))
+                    positions = np.searchsorted(links, hops)
+                    pieces.append((atom, members, bottleneck, level))
+
+                available[positions] -= traversals * level
+                unfrozen[positions] -= traversals
+
+                # a changed rate changes the share of the groups whose bottleneck the transfers traverse
+                if atom.group.link is None or not _isclose(level, atom.group.level):
+                    for link in hops[self.bottleneck[hops]].tolist():
+                        other = self.groups[link]
+                        if other not in region:
+                            expand.add(other)
+
+            # transfers of other groups must not get a larger share of the bottleneck than the frozen ones
+            other = self.groups.get(bottleneck)
+            if other is not None and other not in region and not _isclose(other.level, level):
+                expand.add(other)
+            for other in self.groups_on[bottleneck]:
+                if other not in region and other.level > level and not _isclose(other.level, level):
+                    expand.add(other)
+
+        return pieces, expand, (links, available)
+
+    def _commit(self, region: Dict[_Group, None], pieces: list, available: Tuple[np.ndarray, np.ndarray]):
+        now = self.now
+        for group in region:
+            group.settle(now)
+            if group.link is not None and self.groups.get(group.link) is group:
+                del self.groups[group.link]
+                self.bottleneck[group.link] = False
+
+        targets: Dict[int, _Group] = dict()
+        levels: Dict[int, float] = dict()
+
+        def target(link: int) -> _Group:
+            group = targets.get(link)
+            if group is None:
+                # an unchanged group at the same level
+                group = self.groups.pop(link, None)
+                if group is None:
+                    group = _Group(link, now)
+                else:
+                    group.settle(now)
+                targets[link] = group
+            return group
+
+        # first split off the transfers that moved to another bottleneck, then move the rest of each group as a whole
+        for atom, members, link, level in pieces:
+            levels[link] = level
+            if members is not None:
+                group = target(link)
+                for i in members:
+                    self._move(atom.group, group, i)
+
+        for atom, members, link, level in pieces:
+            if members is not None:
+                continue
+            group = atom.group
+            other = targets.get(link)
+            if other is None and link in self.groups:
+                other = target(link)
+            if other is None:
+                group.link = link
+                targets[link] = group
+                continue
+
+            if len(group.members) > len(other.members):
+                group, other = other, group
+            for i in list(group.members):
+                self._move(group, other, i)
+            other.link = link
+            targets[link] = other
+
+        for link, group in targets.items():
+            group.level = levels[link]
+            group.rate = group.level * 125000 * goodput_magic_number
+            if group.rate <= 0:
+                raise ValueError('transfer without bandwidth')
+            self.groups[link] = group
+            self.bottleneck[link] = True
+            self._schedule(group)
+
+        links, available = available
+        self.load[links] = self.capacity[links] - available
@@ -0,0 +1,83 @@
+"""
+Memoized statistics of latency distributions. Statistics like the mode, mean, or quantiles of a distribution are
+computed once per distribution object and then looked up, which makes them as cheap as constant latencies when
+resolving routes. Distributions are assumed not to change their parameters after the first lookup.
+
+Statistics are named:
+
+* ``mode``: the mode (assuming a log-normal distribution, like those in `ether.qos.latency`)
+* ``mean``: the mean
+* ``p<q>``: the q-th percentile, e.g., ``p50``, ``p95``, ``p99``, or ``p99.9``
+"""
+import math
+from typing import Dict, Tuple
+
+from srds import ParameterizedDistribution
+
+_cache: Dict[int, Tuple[ParameterizedDistribution, Dict[str, float]]] = dict()
+
+
+def statistic(dist: ParameterizedDistribution, stat: str) -> float:
+    """
+    Returns the given statistic of the distribution.
+
+    :param dist: the distribution
+    :param stat: the name of the statistic (``mode``, ``mean``, or ``p<q>``)
+    :return: the value of the statistic
+    """
+    entry = _cache.get(id(dist))
+    if entry is None or entry[0] is not dist:
+        entry = _cache[id(dist)] = (dist, dict())
+
+    values = entry[1]
+    value = values.get(stat)
+    if value is None:
+        value = values[stat] = _compute(dist, stat)
+    return value
+
+
+def mode(dist: ParameterizedDistribution) -> float:
+    return statistic(dist, 'mode')
+
+
+def mean(dist: ParameterizedDistribution) -> float:
+    return statistic(dist, 'mean')
+
+
+def quantile(dist: ParameterizedDistribution, q: float) -> float:
+    """
+    Returns the q-quantile (0 < q < 1) of the distribution.
+    """
+    return statistic(dist, 'p%g' % (q * 100))
+
+
+def clear():
+    """
+    Clears all cached statistics, e.g., after changing the parameters of a distribution.
+    """
+    _cache.clear()
+
+
+def _compute(dist: ParameterizedDistribution, stat: str) -> float:
+    if stat == 'mode':
+        loc = dist.loc or 0
+        scale = dist.scale if dist.scale is not None else 1
+        return float(math.exp(math.log(scale) - dist.args[0] ** 2) + loc)
+
+    if stat == 'mean':
+        return float(dist.mean())
+
+    if stat.startswith('p'):
+        try:
+            q = float(stat[1:]) / 100
+        except ValueError:
+            q = -1
+        if 0 < q < 1:
+            kwargs = dict()
+            if dist.loc is not None:
+                kwargs['loc'] = dist.loc
+            if dist.scale is not None:
+                kwargs['scale'] = dist.scale
+            return float(dist.dist.ppf(q, *dist.args, **kwargs))
+
+    raise ValueError('unknown statistic %s, use mode, mean, or p<q> with 0 < q < 100' % stat)
@@ -0,0 +1,201 @@
+"""
+Replay of recorded transfer traces. A trace is a sequence of (timestamp, source, destination, bytes) records, where
+source and destination are node names. Traces are read in chunks from CSV, NumPy, or Parquet files, and a single
+driver process injects the transfers into the simulation as simulated time advances, so memory stays bounded
+regardless of the length of the trace::
+
+    replay = TraceReplay(topology, 'transfers.csv')
+    replay.run(env)
+    env.run()
+"""
+import logging
+import os
+from typing import NamedTuple, Iterator, Iterable, Mapping, Union, Tuple, Dict, Optional, List
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from ether.core import Node, Route, Flow
+from ether.topology import Topology
+from ether.workload import StartTransfer
+
+logger = logging.getLogger(__name__)
+
+Columns = Tuple[str, str, str, str]
+
+default_columns: Columns = ('timestamp', 'src', 'dst', 'bytes')
+
+
+class TraceChunk(NamedTuple):
+    """
+    A chunk of trace records as arrays.
+    """
+    times: np.ndarray
+    sources: np.ndarray  # node names
+    destinations: np.ndarray  # node names
+    sizes: np.ndarray
+
+    def __len__(self):
+        return len(self.times)
+
+
+def _to_chunk(columns: Columns, data) -> TraceChunk:
+    timestamp, src, dst, size = columns
+    return TraceChunk(np.asarray(data[timestamp], dtype=float), np.asarray(data[src]), np.asarray(data[dst]),
+                      np.asarray(data[size], dtype=np.int64))
+
+
+def read_csv(path: str, chunk_size: int = 65536, columns: Columns = default_columns) -> Iterator[TraceChunk]:
+    """
+    Reads a CSV trace with a header row in chunks.
+    """
+    timestamp, src, dst, size = columns
+    dtype = {src: str, dst: str}
+    for df in pd.read_csv(path, usecols=list(columns), dtype=dtype, chunksize=chunk_size):
+        yield _to_chunk(columns, df)
+
+
+def read_numpy(path: str, chunk_size: int = 65536, columns: Columns = default_columns) -> Iterator[TraceChunk]:
+    """
+    Reads a ``.npy`` file holding a structured array with the given fields. The file is memory-mapped, so only the
+    current chunk is loaded.
+    """
+    data = np.load(path, mmap_mode='r')
+    for i in range(0, len(data), chunk_size):
+        yield _to_chunk(columns, data[i:i + chunk_size])
+
+
+def read_parquet(path: str, chunk_size: int = 65536, columns: Columns = default_columns) -> Iterator[TraceChunk]:
+    """
+    Reads a Parquet trace in record batches. Requires pyarrow.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('reading parquet traces requires pyarrow') from e
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(columns)):
+        yield _to_chunk(columns, batch.to_pandas())
+
+
+readers = {
+    '.csv': read_csv,
+    '.npy': read_numpy,
+    '.parquet': read_parquet,
+}
+
+
+def read_trace(path: str, chunk_size: int = 65536, columns: Columns = default_columns) -> Iterator[TraceChunk]:
+    """
+    Reads a trace in chunks, selecting the reader by the file extension (one of ``readers``).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in readers:
+        raise ValueError('unknown trace format %s, use one of %s' % (ext, list(readers.keys())))
+    return readers[ext](path, chunk_size, columns)
+
+
+class TraceReplay:
+    """
+    Replays a trace of transfers in a topology. Timestamps are taken relative to the first record of the trace, and
+    multiplied by ``time_scale`` to convert them to seconds. Records are expected to be sorted by timestamp, records
+    that lie in the past of the simulation are started immediately. Records whose nodes are not in the name index, or
+    whose source and destination are the same node, are skipped.
+    """
+
+    def __init__(self, topology: Topology, trace: Union[str, Iterable[TraceChunk]],
+                 name_index: Mapping[str, Node] = None, columns: Columns = default_columns, chunk_size: int = 65536,
+                 time_scale: float = 1., use_mode: bool = True) -> None:
+        """
+        :param topology: the topology to resolve routes in
+        :param trace: the path of a trace file, or an iterable of trace chunks
+        :param name_index: maps node names to nodes, defaults to the names of all nodes in the topology
+        :param columns: the names of the (timestamp, source, destination, bytes) columns
+        :param chunk_size: the number of records read at once
+        :param time_scale: the duration of one timestamp unit in seconds
+        :param use_mode: whether routes use the mode of the latency distributions, or an rtt sampled once per pair
+        """
+        super().__init__()
+        self.topology = topology
+        self.trace = trace
+        self.name_index = name_index if name_index is not None else {n.name: n for n in topology.get_nodes()}
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.time_scale = time_scale
+        self.use_mode = use_mode
+
+        self._routes: Dict[Tuple[Node, Node], Route] = dict()
+
+        # statistics
+        self.started = 0
+        self.skipped = 0
+
+    def chunks(self) -> Iterator[TraceChunk]:
+        if isinstance(self.trace, str):
+            return read_trace(self.trace, self.chunk_size, self.columns)
+        return iter(self.trace)
+
+    def route(self, source: Node, destination: Node) -> Route:
+        """
+        Returns the route between the given nodes, resolving it on first use.
+        """
+        k = (source, destination)
+        route = self._routes.get(k)
+        if route is None:
+            route = self.topology.route(source, destination, use_mode=self.use_mode)
+            self._routes[k] = route
+        return route
+
+    def run(self, env: simpy.Environment, start: StartTransfer = None) -> simpy.Process:
+        """
+        Starts a driver process that replays the trace from the current simulation time.
+
+        :param env: the simulation environment
+        :param start: starts a transfer, defaults to starting a `Flow` process
+        :return: the driver process
+        """
+        if start is None:
+            def start(size, route):
+                return Flow(env, size, route).start()
+
+        return env.process(self._drive(env, start))
+
+    def _drive(self, env: simpy.Environment, start: StartTransfer):
+        origin: Optional[float] = None
+        offset = env.now
+        route = self.route
+
+        for chunk in self.chunks():
+            if not len(chunk):
+                continue
+            if origin is None:
+                origin = float(chunk.times[0])
+
+            times = (chunk.times - origin) * self.time_scale + offset
+            sources = self._lookup(chunk.sources)
+            destinations = self._lookup(chunk.destinations)
+
+            for t, source, destination, size in zip(times.tolist(), sources, destinations, chunk.sizes.tolist()):
+                if source is None or destination is None or source is destination:
+                    self.skipped += 1
+                    continue
+                if t > env.now:
+                    yield env.timeout(t - env.now)
+                start(size, route(source, destination))
+                self.started += 1
+
+        if self.skipped:
+            logger.warning('skipped %d trace records with unknown or identical nodes', self.skipped)
+
+    def _lookup(self, names: np.ndarray) -> List[Optional[Node]]:
+        """
+        Maps an array of names to a list of nodes (None for unknown names), looking up each distinct name once.
+        """
+        if names.dtype.kind == 'S':
+            names = np.char.decode(names)
+
+        unique, inverse = np.unique(names, return_inverse=True)
+        nodes = np.empty(len(unique), dtype=object)
+        nodes[:] = [self.name_index.get(name) for name in unique.tolist()]
+        return nodes[inverse].tolist()
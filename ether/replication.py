@@ -0,0 +1,161 @@
+"""
+Monte Carlo replication of experiments. Latencies are sampled from distributions, and scenarios like `GeoCell` draw
+their structure randomly, so results of a single simulation run are noisy. `replicate` runs an experiment on a freshly
+materialized scenario once per seed, distributed over a process pool, and collects the returned metrics in a data
+frame::
+
+    def experiment(topology: Topology, seed: int) -> Dict[str, float]:
+        ...
+        return {'latency': ...}
+
+    results = replicate(UrbanSensingScenario, experiment, seeds=range(50))
+    summarize(results.metrics)
+
+Scenario factories and experiments are sent to worker processes, so they need to be picklable (e.g., module-level
+functions or classes).
+"""
+import logging
+import os
+import random
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Mapping, Iterable, Dict, NamedTuple, List
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from ether.qos import sampling
+from ether.topology import Topology, Template
+
+logger = logging.getLogger(__name__)
+
+Experiment = Callable[[Topology, int], Mapping[str, float]]
+
+
+class Replications(NamedTuple):
+    metrics: pd.DataFrame  # one row per successful replica, indexed by seed
+    errors: Dict[int, str]  # seed -> error of replicas that failed on every attempt
+
+
+def seed_all(seed: int):
+    """
+    Seeds the random number generators used by ether and srds (Python's ``random`` and NumPy's global random state)
+    and the default latency sampler with independent streams derived from the given seed.
+    """
+    python_seed, numpy_seed, sampler_seed = np.random.SeedSequence(seed).generate_state(3)
+    random.seed(int(python_seed))
+    np.random.seed(int(numpy_seed))
+    sampling.seed(int(sampler_seed))
+
+
+def run_replica(scenario: Callable[[], Template], experiment: Experiment, seed: int) -> Mapping[str, float]:
+    """
+    Runs a single replica: seeds all random number generators, materializes the scenario into a new topology, and
+    runs the experiment on it.
+
+    :param scenario: creates the scenario to materialize
+    :param experiment: the experiment, called with the topology and the seed
+    :param seed: the seed of the replica
+    :return: the metrics returned by the experiment
+    """
+    seed_all(seed)
+    topology = Topology()
+    scenario().materialize(topology)
+    return experiment(topology, seed)
+
+
+def _run_isolated(scenario: Callable[[], Template], experiment: Experiment, seed: int) -> Mapping[str, float]:
+    # runs the replica in a process of its own, so that a crash of the process is attributed to this replica
+    with ProcessPoolExecutor(1) as executor:
+        return executor.submit(run_replica, scenario, experiment, seed).result()
+
+
+def replicate(scenario: Callable[[], Template], experiment: Experiment, seeds: Iterable[int], processes: int = None,
+              retries: int = 1) -> Replications:
+    """
+    Runs one replica of the experiment per seed across a process pool.
+
+    :param scenario: creates the scenario to materialize, e.g., ``UrbanSensingScenario`` or a ``functools.partial``
+    :param experiment: the experiment, called with the topology and the seed, returning a mapping of metrics
+    :param seeds: the seeds of the replicas
+    :param processes: the number of worker processes, defaults to the number of cores. 0 runs all replicas in the
+                      current process.
+    :param retries: how often a failed replica is retried (with the same seed)
+    :return: the metrics of all successful replicas, and the errors of failed replicas
+    """
+    seeds = list(seeds)
+    if len(set(seeds)) != len(seeds):
+        raise ValueError('seeds must be unique')
+
+    results: Dict[int, Mapping[str, float]] = dict()
+    errors: Dict[int, str] = dict()
+    attempts = {seed: 0 for seed in seeds}
+
+    todo = seeds
+    isolated: List[int] = list()
+    while todo or isolated:
+        failed: List[int] = list()
+        crashed: List[int] = list()
+
+        def fail(s: int, error: BaseException):
+            attempts[s] += 1
+            logger.warning('replica with seed %d failed (attempt %d): %r', s, attempts[s], error)
+            if attempts[s] <= retries:
+                failed.append(s)
+            else:
+                errors[s] = repr(error)
+
+        def collect(futures: Dict[Future, int], crashes: List[int] = None):
+            # crashes collects the replicas of a broken shared pool, without it a crash is charged to the replica
+            for future in as_completed(futures):
+                s = futures[future]
+                try:
+                    results[s] = future.result()
+                except BrokenProcessPool as e:
+                    if crashes is None:
+                        fail(s, e)
+                    else:
+                        crashes.append(s)
+                except Exception as e:
+                    fail(s, e)
+
+        if processes == 0:
+            for seed in todo:
+                try:
+                    results[seed] = run_replica(scenario, experiment, seed)
+                except Exception as e:
+                    fail(seed, e)
+        else:
+            # a crashed worker breaks the pool and fails all pending replicas, so the crash cannot be attributed to a
+            # seed. these replicas are not charged an attempt, but rerun in parallel, each in a process of its own.
+            workers = processes or os.cpu_count()
+            if todo:
+                with ProcessPoolExecutor(workers) as executor:
+                    collect({executor.submit(run_replica, scenario, experiment, seed): seed for seed in todo}, crashed)
+            if isolated:
+                with ThreadPoolExecutor(workers) as executor:
+                    collect({executor.submit(_run_isolated, scenario, experiment, seed): seed for seed in isolated})
+
+        todo, isolated = failed, crashed
+
+    metrics = pd.DataFrame.from_dict({seed: dict(results[seed]) for seed in seeds if seed in results}, orient='index')
+    metrics.index.name = 'seed'
+    return Replications(metrics, errors)
+
+
+def summarize(metrics: pd.DataFrame, confidence: float = 0.95) -> pd.DataFrame:
+    """
+    Summarizes the metrics of replicas with their mean, standard deviation, and the half-width of the confidence
+    interval of the mean (using Student's t-distribution).
+
+    :param metrics: the metrics of replicas, one column per metric
+    :param confidence: the confidence level
+    :return: a data frame with one row per metric
+    """
+    n = metrics.count()
+    mean = metrics.mean()
+    std = metrics.std()
+    t = stats.t.ppf((1 + confidence) / 2, np.maximum(n - 1, 1))
+    ci = t * std / np.sqrt(n)
+    return pd.DataFrame({'count': n, 'mean': mean, 'std': std, 'ci': ci})
@@ -0,0 +1,172 @@
+"""
+Hierarchical route resolution. Topologies built from cells are nearly trees: nodes hang off switches or shared links,
+which hang off backhaul nodes like ``internet_chix``, which are connected by a small internet backbone. Searching the
+entire graph for every route is therefore wasteful.
+
+A `HierarchicalRouter` decomposes the graph into its biconnected components (blocks), e.g., a single connection of a
+node to its switch, the cycle formed by the uplink and downlink of a cell and its backhaul, or the internet backbone.
+Blocks are joined at gateways (cut vertices), which form the block-cut tree of the graph. Every path between two nodes
+passes through the gateways on the block-cut tree path between them, and never leaves a block between two of them.
+The shortest path is therefore composed of the shortest paths within the blocks along the tree path, which are found
+by searching the (small) blocks only, and are cached per block and gateway.
+"""
+from typing import Dict, List, Tuple, Optional, Callable
+
+import networkx as nx
+
+Weight = Optional[Callable[[object, object, dict], float]]
+
+
+class HierarchicalRouter:
+    """
+    Resolves shortest paths in a graph by composing the shortest paths within the blocks along the block-cut tree path
+    between source and destination. The router is built once for a graph, and does not reflect later changes.
+    """
+
+    def __init__(self, graph: nx.DiGraph, weight: Weight = None) -> None:
+        """
+        :param graph: the graph
+        :param weight: the weight function of edges (see networkx's dijkstra), or None to count hops
+        """
+        super().__init__()
+        self.graph = graph
+        self.weight = weight
+
+        self._edges: List[List[Tuple]] = list()  # block -> undirected edges
+        self._block_of: Dict[object, int] = dict()  # node -> the block containing the node that is closest to the root
+        self._up: List[Optional[object]] = list()  # block -> the gateway to the parent block, None for root blocks
+        self._depth: List[int] = list()  # block -> depth in the block-cut tree
+
+        self._graphs: Dict[int, nx.DiGraph] = dict()
+        self._trees: Dict[Tuple[int, object], Dict[object, list]] = dict()  # (block, source) -> predecessors
+
+        self._build()
+
+    @property
+    def blocks(self) -> int:
+        return len(self._edges)
+
+    def path(self, source, destination) -> list:
+        """
+        Returns the shortest path from source to destination.
+
+        :raises nx.NodeNotFound: if source or destination are not in the graph
+        :raises nx.NetworkXNoPath: if there is no path from source to destination
+        """
+        for node in (source, destination):
+            if node not in self.graph:
+                raise nx.NodeNotFound('node %s not in graph' % (node,))
+
+        if source == destination:
+            return [source]
+
+        bs, bd = self._block_of.get(source), self._block_of.get(destination)
+        if bs is None or bd is None:
+            raise nx.NetworkXNoPath('no path from %s to %s' % (source, destination))
+
+        # climb the block-cut tree from both ends until the walks meet in the same block
+        head: List = list()  # the path from source up to u, excluding u
+        tail: List[list] = list()  # segments of the path from v down to destination, excluding v
+        u, v = source, destination
+        while bs != bd:
+            if self._depth[bs] >= self._depth[bd]:
+                gateway = self._up[bs]
+                if gateway is None:
+                    raise nx.NetworkXNoPath('no path from %s to %s' % (source, destination))
+                head.extend(self._block_path(bs, u, gateway)[:-1])
+                u, bs = gateway, self._block_of[gateway]
+            else:
+                gateway = self._up[bd]
+                if gateway is None:
+                    raise nx.NetworkXNoPath('no path from %s to %s' % (source, destination))
+                tail.append(self._block_path(bd, gateway, v)[1:])
+                v, bd = gateway, self._block_of[gateway]
+
+        head.extend(self._block_path(bs, u, v))
+        for segment in reversed(tail):
+            head.extend(segment)
+        return head
+
+    def _block_path(self, block: int, source, destination) -> list:
+        if source == destination:
+            return [source]
+
+        edges = self._edges[block]
+        if len(edges) == 1:
+            # a bridge, e.g., the connection of a node to its switch
+            if self.graph.has_edge(source, destination):
+                return [source, destination]
+            raise nx.NetworkXNoPath('no path from %s to %s' % (source, destination))
+
+        tree = self._trees.get((block, source))
+        if tree is None:
+            graph = self._graphs.get(block)
+            if graph is None:
+                graph = self._graphs[block] = self._block_graph(edges)
+
+            if self.weight is None:
+                tree = nx.predecessor(graph, source)
+            else:
+                tree, _ = nx.dijkstra_predecessor_and_distance(graph, source, weight=self.weight)
+            self._trees[(block, source)] = tree
+
+        if destination not in tree:
+            raise nx.NetworkXNoPath('no path from %s to %s' % (source, destination))
+
+        path = [destination]
+        while path[-1] != source:
+            path.append(tree[path[-1]][0])
+        path.reverse()
+        return path
+
+    def _block_graph(self, edges: List[Tuple]) -> nx.DiGraph:
+        adj = self.graph.adj
+        graph = nx.DiGraph()
+        for u, v in edges:
+            if v in adj[u]:
+                graph.add_edge(u, v, **adj[u][v])
+            if u in adj[v]:
+                graph.add_edge(v, u, **adj[v][u])
+        return graph
+
+    def _build(self):
+        undirected = self.graph.to_undirected(as_view=True)
+
+        members: List[set] = list()
+        blocks_of: Dict[object, List[int]] = dict()  # node -> all blocks containing the node
+        for edges in nx.biconnected_component_edges(undirected):
+            block = len(self._edges)
+            self._edges.append(edges)
+            nodes = {node for edge in edges for node in edge}
+            members.append(nodes)
+            for node in nodes:
+                blocks_of.setdefault(node, list()).append(block)
+
+        n = len(members)
+        self._up = [None] * n
+        self._depth = [0] * n
+        visited = [False] * n
+
+        # root the block-cut tree of each connected component at its largest block, i.e., the backbone
+        for root in sorted(range(n), key=lambda b: len(members[b]), reverse=True):
+            if visited[root]:
+                continue
+            visited[root] = True
+            for node in members[root]:
+                self._block_of[node] = root
+
+            stack = [root]
+            while stack:
+                block = stack.pop()
+                for gateway in members[block]:
+                    if gateway == self._up[block]:
+                        continue
+                    for child in blocks_of[gateway]:
+                        if visited[child]:
+                            continue
+                        visited[child] = True
+                        self._up[child] = gateway
+                        self._depth[child] = self._depth[block] + 1
+                        for node in members[child]:
+                            self._block_of.setdefault(node, child)
+                        stack.append(child)
@@ -0,0 +1,326 @@
+"""
+A single-process engine for flow simulations. Rather than running one simpy process per `Flow` and delivering
+bandwidth changes as interrupts, the `FlowScheduler` owns all active transfers. It keeps their remaining bytes, rates,
+and projected completion times in arrays. It only wakes up at the next completion or arrival, at which point all
+changes of that instant are resolved with a single rebalance.
+"""
+import heapq
+import logging
+from typing import List, Dict, Optional, Set, Tuple
+
+import numpy as np
+import simpy
+
+from ether.core import Flow, Route, EcmpRoute, FlowControl, Link, goodput_magic_number, propagate, interrupt, \
+    add_uncontended, remove_uncontended, add_without_rebalance, remove_without_rebalance
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledProcess:
+    """
+    Stands in for the simpy process of a flow that is managed by a `FlowScheduler`. If the flow's allocation is
+    changed by a rebalance outside the scheduler (e.g., by a `Flow` process sharing the same links), the interrupt is
+    forwarded to the scheduler.
+    """
+    __slots__ = ('scheduler', 'flow')
+
+    def __init__(self, scheduler: 'FlowScheduler', flow: Flow) -> None:
+        self.scheduler = scheduler
+        self.flow = flow
+
+    @property
+    def is_alive(self) -> bool:
+        return self.flow in self.scheduler._slots
+
+    def interrupt(self, cause=None):
+        self.scheduler._on_interrupt(self.flow)
+
+
+class FlowScheduler:
+    """
+    Simulates data transfers in a single engine. Use `transfer` to start a transfer, which returns an event that is
+    triggered (with the `Flow` as value) once the transfer has completed::
+
+        scheduler = FlowScheduler(env)
+
+        def client():
+            yield scheduler.transfer(size, topology.route(a, b))
+
+    Two policies are available:
+
+    * ``fair``: like `Flow`, bandwidth is reallocated max-min fairly whenever a transfer starts or completes
+    * ``uninterrupting``: like `UninterruptingFlow`, a transfer keeps the bandwidth it got when it started
+    """
+    policies = ('fair', 'uninterrupting')
+
+    env: simpy.Environment
+    policy: str
+
+    # statistics
+    wakeups: int
+    rebalances: int
+
+    def __init__(self, env: simpy.Environment, policy: str = 'fair', capacity: int = 1024) -> None:
+        super().__init__()
+        if policy not in self.policies:
+            raise ValueError('unknown policy %s, use one of %s' % (policy, self.policies))
+
+        self.env = env
+        self.policy = policy
+        self.wakeups = 0
+        self.rebalances = 0
+
+        # transfer state, indexed by slot
+        self.remaining = np.zeros(capacity)  # bytes remaining at the time of the last update
+        self.rate = np.zeros(capacity)  # bytes per second
+        self.updated = np.zeros(capacity)  # time of the last update
+        self.finish = np.full(capacity, np.inf)  # projected completion time, inf for free slots
+        self._flows: List[Optional[Flow]] = [None] * capacity
+        self._events: List[Optional[simpy.Event]] = [None] * capacity
+        self._free: List[int] = list(reversed(range(capacity)))
+        self._slots: Dict[Flow, int] = dict()
+
+        self._arrivals: List[Tuple[float, int, Flow]] = list()  # (start time, sequence, flow)
+        self._pending: Dict[Flow, simpy.Event] = dict()  # completion events of transfers that have not yet arrived
+        self._started: Dict[Flow, float] = dict()  # time each transfer was started
+        self._sequence = 0
+        self._interrupted: Set[Flow] = set()
+
+        self._timer: Optional[simpy.Event] = None
+        self._timer_at = float('inf')
+
+    def __len__(self):
+        """
+        Returns the number of active transfers.
+        """
+        return len(self._slots)
+
+    def transfer(self, size: int, route: Route) -> simpy.Event:
+        """
+        Starts a transfer of the given number of bytes along the route. Like `Flow`, the transfer starts sending after
+        the estimated connection establish time.
+
+        :param size: the size in bytes
+        :param route: the route
+        :return: an event that is triggered when the transfer has completed
+        """
+        if not route.hops:
+            raise ValueError('no hops in route from %s to %s' % (route.source, route.destination))
+
+        flow = Flow(self.env, size, route)
+        flow.process = ScheduledProcess(self, flow)
+
+        event = self.env.event()
+        self._sequence += 1
+        connection_time = ((route.rtt * 1.5) / 1000)  # rough estimate of TCP connection establish time
+        heapq.heappush(self._arrivals, (self.env.now + connection_time, self._sequence, flow))
+        self._pending[flow] = event
+        self._started[flow] = self.env.now
+
+        self._schedule(self.env.now + connection_time)
+        return event
+
+    def _on_interrupt(self, flow: Flow):
+        self._interrupted.add(flow)
+        self._schedule(self.env.now)
+
+    def _schedule(self, at: float):
+        if at >= self._timer_at:
+            return
+        self._timer_at = at
+        self._timer = timer = self.env.timeout(at - self.env.now)
+        timer.callbacks.append(self._wakeup)
+
+    def _wakeup(self, event: simpy.Event):
+        if event is not self._timer:
+            return  # a timer that was superseded by an earlier one
+        self._timer = None
+        self._timer_at = float('inf')
+        self.wakeups += 1
+
+        now = self.env.now
+        completed = self._pop_completions(now)
+        arrivals = self._pop_arrivals(now)
+
+        if self.policy == 'fair':
+            self._rebalance(completed, arrivals)
+        else:
+            for flow in completed:
+                remove_without_rebalance(flow)
+            for flow in arrivals:
+                self._select_route(flow)
+                add_without_rebalance(flow)
+            self._admit(arrivals)
+
+            # transfers keep the bandwidth they got when they started, unless a rebalance outside the scheduler
+            # changed their allocation
+            self._update_rates(self._take_interrupted(completed) + arrivals)
+            self._notify(completed, arrivals, ())
+
+        control = FlowControl.of(self.env)
+        for flow in completed:
+            slot = self._slots.pop(flow)
+            event = self._events[slot]
+            self._flows[slot] = None
+            self._events[slot] = None
+            self._free.append(slot)
+            flow.sent = flow.size
+            started = self._started.pop(flow)
+            if control.completion_listeners:
+                control.complete(flow, started)
+            event.succeed(flow)
+
+        self._schedule_next()
+
+    def _pop_completions(self, now: float) -> List[Flow]:
+        finish = self.finish
+        # transfers with less than a millibyte left complete as well, to tolerate rounding errors of the timer
+        done = (finish <= now) | ((finish < np.inf) & (self.remaining - self.rate * (now - self.updated) <= 1e-3))
+        slots = np.flatnonzero(done)
+        if not len(slots):
+            return list()
+
+        slots = slots[np.argsort(finish[slots], kind='stable')]
+        finish[slots] = np.inf
+        return [self._flows[slot] for slot in slots.tolist()]
+
+    def _pop_arrivals(self, now: float) -> List[Flow]:
+        arrivals = list()
+        heap = self._arrivals
+        while heap and heap[0][0] <= now:
+            arrivals.append(heapq.heappop(heap)[2])
+        return arrivals
+
+    def _rebalance(self, completed: List[Flow], arrivals: List[Flow]):
+        links: Set[Link] = set()
+        changed = self._take_interrupted(completed)
+
+        for flow in completed:
+            if remove_uncontended(flow):
+                continue
+            for link in flow.route.hops:
+                link.num_flows -= 1
+                del link.allocation[flow]
+            links.update(flow.route.hops)
+
+        contended = list()
+        for flow in arrivals:
+            self._select_route(flow)
+            if add_uncontended(flow):
+                changed.append(flow)
+                continue
+            for link in flow.route.hops:
+                link.num_flows += 1
+            links.update(flow.route.hops)
+            contended.append(flow)
+
+        allocation = dict()
+        if links:
+            self.rebalances += 1
+            allocation, propagation = propagate(contended, links)
+            logger.debug('%-5.2f rebalancing %d arrivals and %d completions propagated to %s', self.env.now,
+                         len(arrivals), len(completed), propagation)
+
+        self._admit(arrivals)
+
+        # flows managed by the scheduler are updated directly, others are interrupted as usual
+        foreign = dict()
+        for flow, bw in allocation.items():
+            if flow in self._slots:
+                changed.append(flow)
+            else:
+                foreign[flow] = bw
+        interrupt(None, foreign)
+
+        self._update_rates(changed)
+        self._notify(completed, arrivals, allocation)
+
+    def _take_interrupted(self, completed: List[Flow]) -> List[Flow]:
+        """
+        Returns the transfers whose allocation was changed by a rebalance outside the scheduler, except for the
+        completed ones.
+        """
+        if not self._interrupted:
+            return list()
+        for flow in completed:
+            self._interrupted.discard(flow)
+        interrupted = list(self._interrupted)
+        self._interrupted.clear()
+        return interrupted
+
+    def _select_route(self, flow: Flow):
+        if isinstance(flow.route, EcmpRoute):
+            flow.route = flow.route.select(self.env)
+
+    def _admit(self, arrivals: List[Flow]):
+        """
+        Assigns slots to the given transfers. Their rates are set by the following `_update_rates`.
+        """
+        now = self.env.now
+        for flow in arrivals:
+            if not self._free:
+                self._grow(2 * len(self._flows))
+            slot = self._free.pop()
+            self._slots[flow] = slot
+            self._flows[slot] = flow
+            self._events[slot] = self._pending.pop(flow)
+            self.remaining[slot] = flow.size
+            self.rate[slot] = 0
+            self.updated[slot] = now
+
+    def _update_rates(self, flows: List[Flow]):
+        """
+        Brings the remaining bytes of the given active transfers up to date, and sets their rates according to their
+        current allocation. Transfers may be given more than once.
+        """
+        if not flows:
+            return
+
+        now = self.env.now
+        slots = self._slots
+        idx = np.fromiter([slots[flow] for flow in flows], np.int64, len(flows))
+        allocated = np.fromiter([flow.route.hops[0].allocation[flow] for flow in flows], float, len(flows))
+
+        rate = allocated * (125000 * goodput_magic_number)
+        if np.any(rate <= 0):
+            raise ValueError
+
+        remaining = np.maximum(self.remaining[idx] - self.rate[idx] * (now - self.updated[idx]), 0)
+        self.remaining[idx] = remaining
+        self.rate[idx] = rate
+        self.updated[idx] = now
+        self.finish[idx] = now + remaining / rate
+
+        for flow, r, g in zip(flows, remaining.tolist(), rate.tolist()):
+            flow.sent = flow.size - r
+            flow.goodput = g
+            flow.resumed = now
+
+    def _notify(self, completed, arrivals, allocation):
+        control = FlowControl.of(self.env)
+        if not control.listeners:
+            return
+        links = set()
+        for flows in (completed, arrivals, allocation):
+            for flow in flows:
+                links.update(flow.route.hops)
+        control.notify(links)
+
+    def _schedule_next(self):
+        at = self.finish.min() if self._slots else float('inf')
+        if self._arrivals:
+            at = min(at, self._arrivals[0][0])
+        if at < float('inf'):
+            self._schedule(max(float(at), self.env.now))
+
+    def _grow(self, capacity: int):
+        n = len(self._flows)
+        for attr, fill in (('remaining', 0), ('rate', 0), ('updated', 0), ('finish', np.inf)):
+            arr = getattr(self, attr)
+            grown = np.full(capacity, fill, dtype=arr.dtype)
+            grown[:n] = arr
+            setattr(self, attr, grown)
+        self._flows.extend([None] * (capacity - n))
+        self._events.extend([None] * (capacity - n))
+        self._free.extend(reversed(range(n, capacity)))
@@ -0,0 +1,263 @@
+"""
+Streaming statistics of flow completions. A `FlowStats` collector is attached to the `FlowControl` of an environment
+and summarizes the completion time, goodput, and slowdown of every completed flow, grouped by route class. Each summary
+keeps the count, mean, and variance (Welford's algorithm), and a quantile sketch with bounded relative error, so memory
+is constant regardless of the number of flows. Summaries of parallel runs can be merged::
+
+    stats = FlowStats().attach(env)
+    env.run()
+    stats.summaries['internet']['completion_time'].quantile(0.99)
+"""
+import math
+from typing import Dict, Callable, Optional, List, Tuple
+
+import pandas as pd
+import simpy
+
+from ether.core import Flow, Route, FlowControl, goodput_magic_number
+
+metrics = ('completion_time', 'goodput', 'slowdown')
+
+
+class Moments:
+    """
+    Running count, mean, variance, minimum, and maximum of a series of values.
+    """
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def merge(self, other: 'Moments'):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    """
+    A quantile sketch in the style of DDSketch: positive values are counted in logarithmically sized buckets, so that
+    every quantile estimate is within a relative error of ``alpha`` of a true value. If the number of buckets exceeds
+    ``max_buckets``, the lowest buckets are collapsed, which only affects the accuracy of the lowest quantiles.
+    Sketches with the same ``alpha`` can be merged.
+    """
+    __slots__ = ('alpha', 'max_buckets', 'count', 'zeros', 'buckets', '_log_gamma')
+
+    def __init__(self, alpha: float = 0.01, max_buckets: int = 2048) -> None:
+        super().__init__()
+        if not 0 < alpha < 1:
+            raise ValueError('alpha must be in (0, 1), was %s' % alpha)
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self.count = 0
+        self.zeros = 0  # values <= 0
+        self.buckets: Dict[int, int] = dict()
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+
+    def add(self, x: float, count: int = 1):
+        self.count += count
+        if x <= 0:
+            self.zeros += count
+            return
+
+        i = math.ceil(math.log(x) / self._log_gamma)
+        self.buckets[i] = self.buckets.get(i, 0) + count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: 'QuantileSketch'):
+        if other.alpha != self.alpha:
+            raise ValueError('cannot merge sketches with different accuracy (%s, %s)' % (self.alpha, other.alpha))
+        self.count += other.count
+        self.zeros += other.zeros
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns an estimate of the q-quantile (0 <= q <= 1), or NaN if the sketch is empty.
+        """
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zeros:
+            return 0.
+
+        seen = self.zeros
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                return 2 * math.exp(i * self._log_gamma) / (1 + math.exp(self._log_gamma))
+
+        return 2 * math.exp(max(self.buckets) * self._log_gamma) / (1 + math.exp(self._log_gamma))
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        self.buckets[target] += sum(self.buckets.pop(i) for i in keys[:excess])
+
+
+class Summary:
+    """
+    Moments and a quantile sketch of one metric.
+    """
+    __slots__ = ('moments', 'sketch')
+
+    def __init__(self, alpha: float = 0.01) -> None:
+        super().__init__()
+        self.moments = Moments()
+        self.sketch = QuantileSketch(alpha)
+
+    @property
+    def count(self) -> int:
+        return self.moments.count
+
+    def add(self, x: float):
+        self.moments.add(x)
+        self.sketch.add(x)
+
+    def merge(self, other: 'Summary'):
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q: float) -> float:
+        return self.sketch.quantile(q)
+
+
+def route_class(route: Route) -> str:
+    """
+    Classifies a route by the parts of the topology it traverses: ``cloudlet`` if it reaches a cloudlet, ``internet``
+    if it otherwise passes an internet node, ``intra-cell`` if it does not leave the cell (i.e., uses no up- or
+    downlink), and ``inter-cell`` otherwise. Cloudlets are checked first, since they are typically attached to the
+    internet themselves.
+    """
+    names = [hop for hop in route.path if isinstance(hop, str)]
+    if any(name.startswith('switch_cloudlet') for name in names):
+        return 'cloudlet'
+    if any(name.startswith('internet') for name in names):
+        return 'internet'
+    if not any(link.tags.get('type') in ('uplink', 'downlink') for link in route.hops):
+        return 'intra-cell'
+    return 'inter-cell'
+
+
+class FlowStats:
+    """
+    Summarizes flow completions by route class. The following metrics are recorded for each flow:
+
+    * ``completion_time``: seconds from starting the flow until it has sent all data
+    * ``goodput``: bytes per second over the completion time
+    * ``slowdown``: the completion time divided by the completion time of the flow if it had the bottleneck link of
+      its route to itself
+
+    Collectors hold no reference to the environment, so they can be pickled and merged across processes.
+    """
+
+    def __init__(self, classifier: Callable[[Route], str] = route_class, alpha: float = 0.01) -> None:
+        """
+        :param classifier: maps a route to its class
+        :param alpha: the relative accuracy of quantile sketches
+        """
+        super().__init__()
+        self.classifier = classifier
+        self.alpha = alpha
+        self.summaries: Dict[str, Dict[str, Summary]] = dict()
+        self._classes: Dict[Tuple, Tuple[str, float]] = dict()  # (class, bottleneck) per route
+
+    def attach(self, env: simpy.Environment) -> 'FlowStats':
+        """
+        Records all flows of the given environment that complete from now on.
+
+        :return: self for chaining
+        """
+        FlowControl.of(env).completion_listeners.append(self.record)
+        return self
+
+    def detach(self, env: simpy.Environment):
+        FlowControl.of(env).completion_listeners.remove(self.record)
+
+    def record(self, flow: Flow, started: float):
+        route = flow.route
+        completion_time = flow.env.now - started
+        if completion_time <= 0:
+            return
+
+        cls, bottleneck = self._classify(route)
+
+        ideal = (route.rtt * 1.5) / 1000 + flow.size / (bottleneck * 125000 * goodput_magic_number)
+
+        summaries = self.summaries.get(cls)
+        if summaries is None:
+            summaries = {metric: Summary(self.alpha) for metric in metrics}
+            self.summaries[cls] = summaries
+
+        summaries['completion_time'].add(completion_time)
+        summaries['goodput'].add(flow.size / completion_time)
+        summaries['slowdown'].add(completion_time / ideal)
+
+    def merge(self, other: 'FlowStats'):
+        for cls, summaries in other.summaries.items():
+            if cls not in self.summaries:
+                self.summaries[cls] = {metric: Summary(self.alpha) for metric in metrics}
+            for metric, summary in summaries.items():
+                self.summaries[cls][metric].merge(summary)
+
+    def to_frame(self, quantiles: List[float] = (0.5, 0.9, 0.99)) -> pd.DataFrame:
+        """
+        Returns a data frame with one row per route class and metric, holding count, mean, std, min, max, and the
+        given quantiles.
+        """
+        rows = list()
+        for cls, summaries in sorted(self.summaries.items()):
+            for metric in metrics:
+                m = summaries[metric].moments
+                row = dict(route_class=cls, metric=metric, count=m.count, mean=m.mean, std=m.std, min=m.min, max=m.max)
+                for q in quantiles:
+                    row['p%g' % (q * 100)] = summaries[metric].quantile(q)
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def _classify(self, route: Route) -> Tuple[str, float]:
+        k = (route.source, route.destination, tuple(route.hops))
+        result: Optional[Tuple[str, float]] = self._classes.get(k)
+        if result is None:
+            result = (self.classifier(route), min(link.bandwidth for link in route.hops))
+            self._classes[k] = result
+        return result
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_classes'] = dict()
+        return state
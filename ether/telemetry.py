@@ -0,0 +1,165 @@
+"""
+Telemetry of link utilization over simulated time. A `LinkTelemetry` recorder attaches to the `FlowControl` of a simpy
+environment, and records the allocated bandwidth and number of flows of each link whenever they may have changed.
+Samples are kept in fixed-size ring buffers, so memory usage is bounded regardless of the simulation length.
+"""
+from typing import Dict, Callable, Iterable, Optional, Tuple
+
+import numpy as np
+import simpy
+
+from ether.core import Link, LinkState, FlowControl
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of (time, allocated MBit/s, number of flows) samples that overwrites the oldest sample when full.
+    """
+    __slots__ = ('data', 'size', '_next')
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__()
+        self.data = np.zeros((capacity, 3))
+        self.size = 0
+        self._next = 0
+
+    def append(self, time: float, allocated: float, num_flows: int):
+        self.data[self._next] = (time, allocated, num_flows)
+        self._next = (self._next + 1) % len(self.data)
+        if self.size < len(self.data):
+            self.size += 1
+
+    def replace(self, time: float, allocated: float, num_flows: int):
+        """
+        Replaces the most recent sample.
+        """
+        self.data[self._next - 1] = (time, allocated, num_flows)
+
+    @property
+    def last_time(self) -> Optional[float]:
+        return self.data[self._next - 1, 0] if self.size else None
+
+    def to_array(self) -> np.ndarray:
+        """
+        Returns the samples in chronological order as an array with shape (n, 3).
+        """
+        if self.size < len(self.data):
+            return self.data[:self.size].copy()
+        return np.roll(self.data, -self._next, axis=0)
+
+
+class LinkTelemetry:
+    """
+    Records link utilization of a simulation. Each recorded link gets a ring buffer of ``capacity`` samples. If a
+    ``resolution`` is given, samples are downsampled into time buckets of that many seconds, where each bucket holds the
+    last state of the link within the bucket. If the environment has a `NetworkState`, samples of link states are
+    recorded under the topology link they belong to.
+
+    Example::
+
+        telemetry = LinkTelemetry(env, link_filter=lambda link: link.tags.get('type') in ('uplink', 'downlink'))
+        env.run()
+        t, utilization = telemetry.utilization(cell.uplink)
+    """
+
+    def __init__(self, env: simpy.Environment, capacity: int = 4096, resolution: float = None,
+                 link_filter: Callable[[Link], bool] = None) -> None:
+        """
+        Creates a new recorder and attaches it to the flow control of the given environment.
+
+        :param env: the simulation environment
+        :param capacity: the maximum number of samples kept per link
+        :param resolution: the size of time buckets in seconds, or None to keep every sample
+        :param link_filter: a predicate to select the links to record, records all links if None
+        """
+        super().__init__()
+        self.env = env
+        self.capacity = capacity
+        self.resolution = resolution
+        self.link_filter = link_filter
+
+        self._buffers: Dict[Link, Optional[RingBuffer]] = dict()
+        FlowControl.of(env).listeners.append(self.record)
+
+    def detach(self):
+        """
+        Stops recording.
+        """
+        FlowControl.of(self.env).listeners.remove(self.record)
+
+    @property
+    def links(self) -> Iterable[Link]:
+        """
+        The links that have been recorded.
+        """
+        return [link for link, buffer in self._buffers.items() if buffer is not None]
+
+    def record(self, links: Iterable[Link]):
+        now = self.env.now
+        resolution = self.resolution
+        buffers = self._buffers
+
+        for link in links:
+            key = link.link if isinstance(link, LinkState) else link  # record by topology link
+            try:
+                buffer = buffers[key]
+            except KeyError:
+                buffer = self._create_buffer(key)
+
+            if buffer is None:
+                continue
+
+            last = buffer.last_time
+            if last is not None and (last == now or (resolution and last // resolution == now // resolution)):
+                buffer.replace(now, link.allocation.total, link.num_flows)
+            else:
+                buffer.append(now, link.allocation.total, link.num_flows)
+
+    def _create_buffer(self, link: Link) -> Optional[RingBuffer]:
+        if self.link_filter is not None and not self.link_filter(link):
+            buffer = None
+        else:
+            buffer = RingBuffer(self.capacity)
+        self._buffers[link] = buffer
+        return buffer
+
+    def series(self, link: Link) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the recorded samples of the given link.
+
+        :param link: the link
+        :return: a tuple of arrays (time, allocated bandwidth in MBit/s, number of flows)
+        """
+        buffer = self._buffers.get(link)
+        if buffer is None:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+
+        data = buffer.to_array()
+        return data[:, 0], data[:, 1], data[:, 2]
+
+    def utilization(self, link: Link) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the utilization of the given link, i.e., the fraction of its bandwidth that is allocated.
+
+        :param link: the link
+        :return: a tuple of arrays (time, utilization)
+        """
+        t, allocated, _ = self.series(link)
+        return t, allocated / link.bandwidth
+
+    def mean_utilization(self, link: Link, until: float = None) -> float:
+        """
+        Returns the time-weighted mean utilization of the given link between the first recorded sample and ``until``
+        (defaults to the current simulation time).
+        """
+        t, utilization = self.utilization(link)
+        if len(t) == 0:
+            return 0
+
+        until = self.env.now if until is None else until
+        durations = np.diff(np.append(t, max(until, t[-1])))
+        total = durations.sum()
+        if total <= 0:
+            return float(utilization[-1])
+
+        return float((utilization * durations).sum() / total)
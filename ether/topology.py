@@ -1,12 +1,18 @@
 import abc
+import itertools
 import logging
+from collections import OrderedDict
 from copy import copy
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Optional, List, Iterable, NamedTuple, Sequence
 
 import networkx as nx
+import numpy as np
+from srds import ParameterizedDistribution
 
-from ether.core import Node, Link, Connection, Route, NetworkNode
+from ether.core import Node, Link, Connection, Route, EcmpRoute, NetworkNode, LinkTable
 from ether.inet.graph import load_latest
+from ether.qos.sampling import default_sampler
+from ether.routing import HierarchicalRouter
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +26,105 @@ class Template(abc.ABC):
         ...
 
 
+class CompiledRoute:
+    """
+    A cached route compiled for fast latency sampling. The one-way latency of the route is the sum of a constant (the
+    constant latencies along the path) and one sample of each distribution in ``dists`` (one per hop with a latency
+    distribution). ``counts`` holds the number of hops per distinct distribution.
+    """
+    __slots__ = ('route', 'hops', 'constant', 'dists', 'counts')
+
+    route: Route  # the route with the mode rtt
+    hops: Tuple[Link, ...]
+    constant: float
+    dists: Tuple[ParameterizedDistribution, ...]
+    counts: Tuple[Tuple[ParameterizedDistribution, int], ...]
+
+    def __init__(self, route: Route, constant: float, dists: Tuple[ParameterizedDistribution, ...]) -> None:
+        self.route = route
+        self.hops = tuple(route.hops)
+        self.constant = constant
+        self.dists = dists
+
+        counts: Dict[int, List] = dict()
+        for dist in dists:
+            counts.setdefault(id(dist), [dist, 0])[1] += 1
+        self.counts = tuple((dist, count) for dist, count in counts.values())
+
+
+class LatencyMatrix(NamedTuple):
+    rtt: np.ndarray  # (sources, targets) round-trip latencies in milliseconds, inf if the target is unreachable
+    sources: Dict[NetworkNode, int]  # source -> row
+    targets: Dict[NetworkNode, int]  # target -> column
+
+    def get(self, source, target) -> float:
+        return float(self.rtt[self.sources[source], self.targets[target]])
+
+
 class Topology(nx.DiGraph):
 
-    def __init__(self, incoming_graph_data=None, **attr):
+    link_table: Optional[LinkTable]
+    routing: Optional[str]
+    hierarchical: bool
+
+    def __init__(self, incoming_graph_data=None, link_table=False, routing: str = None, hierarchical: bool = False,
+                 tree_cache_size: int = 256, **attr):
+        """
+        Creates a new topology.
+
+        :param incoming_graph_data: passed to networkx
+        :param link_table: whether to store the state of all links added to the topology in a `LinkTable`
+        :param routing: None to route along the paths with the fewest hops, or a latency statistic (e.g., ``mode`` or
+                         ``mean``, see `ether.qos.stats`) to route along the paths with the lowest latency
+        :param hierarchical: whether to resolve paths with a `HierarchicalRouter`, which only searches the blocks of
+                             the topology along the path (e.g., a cell and the internet backbone), rather than the
+                             entire graph. The router is built on the first route lookup, and rebuilt after edges
+                             are added. Call `clear_routes` to discard cached routes after changing the topology.
+        :param tree_cache_size: the number of shortest-path trees kept for the most recently used sources. Paths are
+                                resolved from the tree of their source, which is calculated once and reused for every
+                                destination while it is cached.
+        :param attr: passed to networkx
+        """
+        self.link_table = LinkTable() if link_table else None
+        self.routing = routing
+        self.hierarchical = hierarchical
+        self._router: Optional[HierarchicalRouter] = None
         super().__init__(incoming_graph_data, **attr)
+        self.tree_cache_size = tree_cache_size
+        # source -> shortest-path predecessors, in the order the sources were used last
+        self._trees: OrderedDict[NetworkNode, Dict[NetworkNode, list]] = OrderedDict()
         self._route_cache: Dict[Tuple[NetworkNode, NetworkNode], Route] = dict()
+        self._ecmp_cache: Dict[Tuple[NetworkNode, NetworkNode], List[Route]] = dict()
+        self._stat_route_cache: Dict[Tuple[NetworkNode, NetworkNode, str], Route] = dict()
+        self._compiled_routes: Dict[Tuple[NetworkNode, NetworkNode], CompiledRoute] = dict()
+
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        self._add_to_link_table((node_for_adding,))
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        nodes_for_adding = list(nodes_for_adding)
+        super().add_nodes_from(nodes_for_adding, **attr)
+        # items are either nodes or (node, attribute dict) tuples
+        self._add_to_link_table(n[0] if isinstance(n, tuple) else n for n in nodes_for_adding)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+        self._router = None  # the blocks of the router change with the edges
+        self._add_to_link_table((u_of_edge, v_of_edge))
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        ebunch_to_add = list(ebunch_to_add)
+        super().add_edges_from(ebunch_to_add, **attr)
+        self._router = None
+        self._add_to_link_table(node for edge in ebunch_to_add for node in edge[:2])
+
+    def _add_to_link_table(self, nodes: Iterable):
+        if self.link_table is None:
+            return
+        for node in nodes:
+            if isinstance(node, Link) and node not in self.link_table:
+                self.link_table.add(node)
 
     def conn(self, *args, **kwargs):
         return self.add_connection(*args, **kwargs)
@@ -37,35 +137,296 @@ class Topology(nx.DiGraph):
         if directed is False:
             self.add_edge(connection.target, connection.source, directed=directed, connection=connection)
 
+    def set_routing(self, routing: Optional[str]):
+        """
+        Changes the routing mode (see the constructor) and clears all cached routes.
+        """
+        self.routing = routing
+        self.clear_routes()
+
+    def clear_routes(self):
+        """
+        Clears all cached paths and routes, e.g., after changing the topology.
+        """
+        self._router = None
+        self._trees.clear()
+        self._route_cache.clear()
+        self._ecmp_cache.clear()
+        self._stat_route_cache.clear()
+        self._compiled_routes.clear()
+
     def path(self, source, destination):
-        return nx.shortest_path(self, source, destination)
+        if self.hierarchical:
+            if self._router is None:
+                self._router = HierarchicalRouter(self, self.edge_latency if self.routing is not None else None)
+            return self._router.path(source, destination)
+
+        # the shortest-path tree of the source is calculated once and used for every destination
+        return self._tree_path(self._tree(source), source, destination)
+
+    def _tree(self, source) -> Dict[NetworkNode, list]:
+        """
+        Returns the shortest-path tree of a source, i.e., the predecessors of every node reachable from it. The trees of
+        the ``tree_cache_size`` most recently used sources are cached.
+        """
+        trees = self._trees
+        tree = trees.get(source)
+        if tree is not None:
+            trees.move_to_end(source)
+            return tree
+
+        if self.routing is None:
+            tree = nx.predecessor(self, source)
+        else:
+            tree, _ = nx.dijkstra_predecessor_and_distance(self, source, weight=self.edge_latency)
+
+        trees[source] = tree
+        while len(trees) > self.tree_cache_size:
+            trees.popitem(last=False)
+        return tree
+
+    @staticmethod
+    def _tree_path(tree: Dict[NetworkNode, list], source, destination) -> list:
+        if destination not in tree:
+            raise nx.NetworkXNoPath('no path from %s to %s' % (source, destination))
+
+        path = [destination]
+        while path[-1] != source:
+            path.append(tree[path[-1]][0])
+        path.reverse()
+        return path
+
+    def edge_latency(self, u, v, edge_data: dict) -> float:
+        """
+        The weight of an edge in latency-weighted routing: the latency statistic given by ``routing`` of the edge's
+        connection, or its constant latency. A small constant is added per edge, so that the path with the fewest
+        hops is used among paths with the same latency.
+        """
+        connection = edge_data.get('connection')
+        if isinstance(connection, Connection):
+            return connection.get_latency_statistic(self.routing) + 1e-9
+        return edge_data.get('latency', 0) + 1e-9
+
+    def paths(self, source, destination, max_paths: int = 16) -> List[list]:
+        """
+        Returns the shortest paths (by number of hops, or by latency depending on ``routing``) from source to
+        destination, i.e., the paths used for equal-cost multipath routing.
+
+        :param source: the starting point of the paths
+        :param destination: the destination point of the paths
+        :param max_paths: the maximum number of paths
+        :return: a list of paths
+        """
+        weight = self.edge_latency if self.routing is not None else None
+        return list(itertools.islice(nx.all_shortest_paths(self, source, destination, weight=weight), max_paths))
 
     def latency(self, source: Node, destination: Node, use_coordinates=False) -> float:
         if use_coordinates:
             return source.distance_to(destination)
         return self.route(source, destination).rtt / 2
 
-    def route(self, source, destination, use_mode: bool = False) -> Route:
+    def route(self, source, destination, use_mode: bool = False, ecmp: str = None, stat: str = None) -> Route:
         """
         Returns the route from source to destination.
         :param source: the starting point of the route
         :param destination: the destination point of the route
         :param use_mode: whether to use the mode of the latency distributions along the path or a sample
+        :param ecmp: if set, returns an `EcmpRoute` over all equal-cost paths that selects the route of each flow
+                     with the given policy (``hash`` or ``least-loaded``)
+        :param stat: if set, the rtt is the sum of the given statistic of the latency distributions along the path
+                     (e.g., ``mean`` or ``p95``, see `ether.qos.stats`) rather than a sample. Note that the sum of
+                     per-hop quantiles is an upper bound of the quantile of the path latency.
         :return:
         """
         k = (source, destination)
 
+        if not use_mode and stat is None and ecmp is None:
+            # sample the rtt from the compiled route, and return a view that shares the path of the cached route
+            compiled = self._compiled_routes.get(k)
+            if compiled is None:
+                compiled = self._compile_route(source, destination)
+
+            latency = compiled.constant
+            sample = default_sampler.sample
+            for dist in compiled.dists:
+                latency += sample(dist)
+            return compiled.route.view(latency * 2)
+
+        if use_mode and stat is None:
+            stat = 'mode'
+
+        if ecmp is not None:
+            if k not in self._ecmp_cache:
+                self._ecmp_cache[k] = [self._create_route(source, destination, path)
+                                       for path in self.paths(source, destination)]
+            routes = self._ecmp_cache[k]
+            if stat != 'mode':
+                routes = [copy(route) for route in routes]
+                for route in routes:
+                    self._update_rtt(route, stat=stat)
+            return EcmpRoute(routes, ecmp)
+
         if k not in self._route_cache:
             self._route_cache[k] = self._resolve_route(source, destination)
 
-        if not use_mode:
-            route = copy(self._route_cache[k])
-            self._update_rtt(route)
-        else:
-            route = self._route_cache[k]
+        if stat == 'mode':
+            return self._route_cache[k]
 
+        sk = (source, destination, stat)
+        route = self._stat_route_cache.get(sk)
+        if route is None:
+            route = copy(self._route_cache[k])
+            self._update_rtt(route, stat=stat)
+            self._stat_route_cache[sk] = route
         return route
 
+    def rtt_samples(self, source, destination, n: int) -> np.ndarray:
+        """
+        Draws samples of the round-trip latency between source and destination, drawing the samples of all hops with
+        the same latency distribution at once.
+
+        :param source: the starting point of the route
+        :param destination: the destination point of the route
+        :param n: the number of samples
+        :return: an array of n rtt samples in milliseconds
+        """
+        return self.rtt_samples_many([(source, destination)], n)[0]
+
+    def rtt_samples_many(self, pairs: Iterable[Tuple[NetworkNode, NetworkNode]], n: int) -> np.ndarray:
+        """
+        Draws samples of the round-trip latency between each of the given (source, destination) pairs, drawing the
+        samples of all hops of all routes with the same latency distribution at once.
+
+        :param pairs: the (source, destination) pairs
+        :param n: the number of samples per pair
+        :return: an array with shape (len(pairs), n) holding the rtt samples in milliseconds
+        """
+        profiles = [self._compile_route(source, destination) for source, destination in pairs]
+        latency = np.repeat(np.array([profile.constant for profile in profiles], dtype=float)[:, None], n, axis=1)
+
+        # the pairs and number of hops that use each distribution
+        usage: Dict[int, Tuple[ParameterizedDistribution, List[int], List[int]]] = dict()
+        for i, profile in enumerate(profiles):
+            for dist, count in profile.counts:
+                entry = usage.get(id(dist))
+                if entry is None:
+                    entry = usage[id(dist)] = (dist, list(), list())
+                entry[1].append(i)
+                entry[2].append(count)
+
+        for dist, rows, counts in usage.values():
+            samples = default_sampler.samples(dist, sum(counts) * n).reshape(sum(counts), n)
+            offsets = np.cumsum([0] + counts[:-1])
+            latency[rows] += np.add.reduceat(samples, offsets, axis=0)
+
+        return latency * 2
+
+    def routes(self, pairs: Iterable[Tuple[NetworkNode, NetworkNode]], stat: str = 'mode') -> List[Route]:
+        """
+        Returns the routes between each of the given (source, destination) pairs. The pairs are grouped by source, and
+        the paths of each group are resolved from one shortest-path tree of the source (like `path`), or by the router
+        if ``hierarchical`` is set.
+
+        :param pairs: the (source, destination) pairs
+        :param stat: the latency statistic used for the rtt of the routes (see `route`), or None to sample the rtt
+        :return: a list of routes
+        """
+        pairs = list(pairs)
+
+        if not self.hierarchical:
+            destinations: Dict[NetworkNode, List[NetworkNode]] = dict()
+            for source, destination in pairs:
+                if (source, destination) not in self._route_cache:
+                    destinations.setdefault(source, list()).append(destination)
+
+            for source, group in destinations.items():
+                tree = self._tree(source)
+                for destination in group:
+                    k = (source, destination)
+                    if k not in self._route_cache:
+                        path = self._tree_path(tree, source, destination)
+                        self._route_cache[k] = self._create_route(source, destination, path)
+
+        return [self.route(source, destination, stat=stat) for source, destination in pairs]
+
+    def latency_matrix(self, sources: Sequence[NetworkNode] = None, targets: Sequence[NetworkNode] = None,
+                       stat: str = 'mode') -> LatencyMatrix:
+        """
+        Calculates the round-trip latency of the routes between all sources and targets, e.g.::
+
+            matrix = topology.latency_matrix(clients, brokers)
+            matrix.rtt[matrix.sources[client]].argmin()  # column of the closest broker
+
+        Rather than resolving each route, the latencies of all nodes are accumulated along the shortest-path tree of
+        each source, with the trees of all sources processed at once. If ``hierarchical`` is set, the paths are
+        resolved by the router instead.
+
+        :param sources: the sources (rows), defaults to all nodes of the topology (see `get_nodes`)
+        :param targets: the targets (columns), defaults to the sources
+        :param stat: the latency statistic of the latency distributions along the paths (see `ether.qos.stats`)
+        :return: the rtt matrix and the rows and columns of the sources and targets
+        """
+        sources = list(self.get_nodes() if sources is None else sources)
+        targets = sources if targets is None else list(targets)
+        weights: Dict[Tuple[NetworkNode, NetworkNode], float] = dict()
+
+        def weight(u, v) -> float:
+            w = weights.get((u, v))
+            if w is None:
+                w = weights[(u, v)] = self._edge_statistic(u, v, stat)
+            return w
+
+        if self.hierarchical:
+            rtt = np.full((len(sources), len(targets)), np.inf)
+            for row, source in enumerate(sources):
+                for column, target in enumerate(targets):
+                    try:
+                        path = self.path(source, target)
+                    except nx.NetworkXNoPath:
+                        continue
+                    rtt[row, column] = 2 * sum(weight(u, v) for u, v in zip(path, path[1:]))
+            return LatencyMatrix(rtt, {s: i for i, s in enumerate(sources)}, {t: i for i, t in enumerate(targets)})
+
+        # the tree of each source as arrays of the (indexed) nodes reachable from it, their parents, and the latency of
+        # the edges to their parents. only reachable nodes and the targets are indexed.
+        index: Dict[NetworkNode, int] = dict()
+        trees = list()
+        for source in sources:
+            children, parent_of_children, latencies = list(), list(), list()
+            for node, predecessors in self._tree(source).items():
+                i = index.setdefault(node, len(index))
+                if not predecessors:
+                    continue
+                parent = predecessors[0]
+                children.append(i)
+                parent_of_children.append(index.setdefault(parent, len(index)))
+                latencies.append(weight(parent, node))
+            trees.append((index[source], children, parent_of_children, latencies))
+        for target in targets:
+            index.setdefault(target, len(index))
+        n = len(index)
+
+        # each row holds the shortest-path tree of a source: the parent and the latency of the edge to the parent of
+        # every node. the source and unreachable nodes are their own parents, with latency 0 and inf respectively.
+        parents = np.tile(np.arange(n), (len(sources), 1))
+        latency = np.full((len(sources), n), np.inf)
+        for row, (source, children, parent_of_children, latencies) in enumerate(trees):
+            parents[row, children] = parent_of_children
+            latency[row, children] = latencies
+            latency[row, source] = 0
+
+        # pointer jumping: after k iterations, each node holds the latency to its 2^k-th ancestor, so all nodes hold the
+        # latency to the source after log2(depth) iterations
+        while True:
+            grandparents = np.take_along_axis(parents, parents, axis=1)
+            if np.array_equal(grandparents, parents):
+                break
+            latency += np.take_along_axis(latency, parents, axis=1)
+            parents = grandparents
+
+        rtt = latency[:, [index[target] for target in targets]] * 2
+        return LatencyMatrix(rtt, {s: i for i, s in enumerate(sources)}, {t: i for i, t in enumerate(targets)})
+
     def get_nodes(self):
         return [n for n in self.nodes if isinstance(n, Node)]
 
@@ -83,20 +444,60 @@ class Topology(nx.DiGraph):
         load_latest(self, source)
 
     def _resolve_route(self, source, destination) -> Route:
-        path = self.path(source, destination)
+        return self._create_route(source, destination, self.path(source, destination))
+
+    def _create_route(self, source, destination, path) -> Route:
         route = Route(source, destination, path=path)
-        self._update_rtt(route, use_mode=True)
+        self._update_rtt(route, stat='mode')
         return route
 
-    def _update_rtt(self, route: Route, use_mode: bool = False):
+    def _compile_route(self, source, destination) -> CompiledRoute:
+        k = (source, destination)
+        compiled = self._compiled_routes.get(k)
+        if compiled is not None:
+            return compiled
+
+        if k not in self._route_cache:
+            self._route_cache[k] = self._resolve_route(source, destination)
+        route = self._route_cache[k]
+        path = route.path
+
+        constant = 0.
+        dists = list()
+        for i in range(len(path) - 1):
+            edge_data = self.get_edge_data(path[i], path[i + 1])
+            connection = edge_data.get('connection')
+            if isinstance(connection, Connection):
+                if connection.latency_dist:
+                    dists.append(connection.latency_dist)
+                else:
+                    constant += connection.latency
+            elif 'latency' in edge_data:
+                constant += edge_data['latency']
+
+        compiled = CompiledRoute(route, constant, tuple(dists))
+        self._compiled_routes[k] = compiled
+        return compiled
+
+    def _edge_statistic(self, u, v, stat: str) -> float:
+        edge_data = self.get_edge_data(u, v)
+        connection = edge_data.get('connection')
+        if isinstance(connection, Connection):
+            return connection.get_latency_statistic(stat)
+        return edge_data.get('latency', 0)
+
+    def _update_rtt(self, route: Route, use_mode: bool = False, stat: str = None):
+        if use_mode and stat is None:
+            stat = 'mode'
+
         latency: float = 0
         for i in range(len(route.path)-1):
             edge_data = self.get_edge_data(route.path[i], route.path[i + 1])
             if 'connection' in edge_data and isinstance(edge_data['connection'], Connection):
                 # the edge has a connection object attached
-                # use either get_latency() or get_mode_latency() respectively to calculate latency
+                # use either get_latency() or the statistic of the latency distribution respectively
                 connection: Connection = edge_data['connection']
-                latency += connection.get_mode_latency() if use_mode else connection.get_latency()
+                latency += connection.get_latency() if stat is None else connection.get_latency_statistic(stat)
             elif 'latency' in edge_data:
                 # the edge has a constant latency attached (i.e., in case of inet datasets)
                 latency += edge_data['latency']
@@ -0,0 +1,260 @@
+"""
+Generators of bulk traffic workloads. A `Workload` draws arrival times, transfer sizes, and source/destination pairs
+as NumPy arrays in chunks, resolves the route of each distinct node pair once, and starts the transfers from a single
+driver process::
+
+    workload = Workload(topology, clients, servers, Poisson(rate=50), sizes=srds.ParameterizedDistribution.lognorm(...))
+    workload.run(env, limit=10 ** 6)
+    env.run()
+"""
+import abc
+from typing import Iterable, Union, Optional, Callable, Dict, Tuple, Iterator, NamedTuple, List
+
+import numpy as np
+import simpy
+from srds import RandomSampler
+
+from ether.core import Node, Route, Flow
+from ether.topology import Topology
+
+StartTransfer = Callable[[int, Route], simpy.Event]
+"""
+Starts a transfer of a number of bytes along a route, e.g., ``lambda size, route: Flow(env, size, route).start()``
+or ``FlowScheduler(env).transfer``.
+"""
+
+
+class ArrivalProcess(abc.ABC):
+    """
+    Draws the inter-arrival times of transfers.
+    """
+
+    @abc.abstractmethod
+    def draw(self, n: int, offset: int, random: np.random.RandomState) -> np.ndarray:
+        """
+        Draws the gaps before the next ``n`` arrivals.
+
+        :param n: the number of gaps to draw
+        :param offset: the number of arrivals drawn before
+        :param random: the random state to draw from
+        :return: an array of ``n`` inter-arrival times in seconds
+        """
+        ...
+
+
+class Poisson(ArrivalProcess):
+    """
+    Arrivals with exponentially distributed inter-arrival times.
+    """
+
+    def __init__(self, rate: float) -> None:
+        """
+        :param rate: the mean number of arrivals per second
+        """
+        super().__init__()
+        if rate <= 0:
+            raise ValueError('rate must be positive, was %s' % rate)
+        self.rate = rate
+
+    def draw(self, n: int, offset: int, random: np.random.RandomState) -> np.ndarray:
+        return random.exponential(1 / self.rate, size=n)
+
+
+class Periodic(ArrivalProcess):
+    """
+    Arrivals at a fixed interval, optionally with uniformly distributed jitter of up to ``jitter`` seconds.
+    """
+
+    def __init__(self, interval: float, jitter: float = 0) -> None:
+        super().__init__()
+        if interval <= 0 or jitter < 0:
+            raise ValueError('interval must be positive and jitter must not be negative')
+        self.interval = interval
+        self.jitter = jitter
+
+    def draw(self, n: int, offset: int, random: np.random.RandomState) -> np.ndarray:
+        gaps = np.full(n, float(self.interval))
+        if self.jitter:
+            gaps = np.maximum(gaps + random.uniform(-self.jitter, self.jitter, size=n), 0)
+        return gaps
+
+
+class Bursty(ArrivalProcess):
+    """
+    Arrivals in bursts of ``size`` transfers. Bursts arrive as a Poisson process with the given rate, and the
+    transfers within a burst are ``spacing`` seconds apart.
+    """
+
+    def __init__(self, rate: float, size: int, spacing: float = 0) -> None:
+        """
+        :param rate: the mean number of bursts per second
+        :param size: the number of transfers per burst
+        :param spacing: the time between two transfers of a burst
+        """
+        super().__init__()
+        if rate <= 0 or size < 1:
+            raise ValueError('rate and size must be positive')
+        self.rate = rate
+        self.size = size
+        self.spacing = spacing
+
+    def draw(self, n: int, offset: int, random: np.random.RandomState) -> np.ndarray:
+        gaps = np.full(n, float(self.spacing))
+        first = (np.arange(offset, offset + n) % self.size) == 0
+        gaps[first] = random.exponential(1 / self.rate, size=int(first.sum()))
+        return gaps
+
+
+class Chunk(NamedTuple):
+    """
+    A chunk of pre-drawn transfers. Sources and destinations are indices into the workload's node lists.
+    """
+    times: np.ndarray
+    sizes: np.ndarray
+    sources: np.ndarray
+    destinations: np.ndarray
+
+    def __len__(self):
+        return len(self.times)
+
+
+class Workload:
+    """
+    A workload of transfers between random source and destination nodes of a topology.
+
+    Randomness is drawn from a ``numpy.random.RandomState`` created from ``seed``, or from numpy's global random state
+    if no seed is given. Sizes are drawn from the given sampler (which, for srds distributions, uses the global random
+    state seeded with ``srds.seed``).
+    """
+
+    def __init__(self, topology: Topology, sources: Optional[Iterable[Node]], destinations: Optional[Iterable[Node]],
+                 arrivals: ArrivalProcess, sizes: Union[RandomSampler, int], chunk_size: int = 4096,
+                 seed: int = None, use_mode: bool = True) -> None:
+        """
+        :param topology: the topology to resolve routes in
+        :param sources: the nodes that send data, all nodes of the topology if None
+        :param destinations: the nodes that receive data, all nodes of the topology if None
+        :param arrivals: the arrival process of transfers
+        :param sizes: the distribution of transfer sizes in bytes, or a constant size
+        :param chunk_size: the number of transfers drawn at once
+        :param seed: the seed for arrival times and node pairs
+        :param use_mode: whether routes use the mode of the latency distributions, or an rtt sampled once per pair
+        """
+        super().__init__()
+        self.topology = topology
+        self.sources: List[Node] = list(sources) if sources is not None else topology.get_nodes()
+        self.destinations: List[Node] = list(destinations) if destinations is not None else topology.get_nodes()
+        self.arrivals = arrivals
+        self.sizes = sizes
+        self.chunk_size = chunk_size
+        self.use_mode = use_mode
+        self.random = np.random.RandomState(seed) if seed is not None else np.random
+
+        if not self.sources or not self.destinations:
+            raise ValueError('need at least one source and destination')
+        if len(self.destinations) == 1 and self.destinations[0] in self.sources:
+            raise ValueError('need a destination other than the source')
+
+        self._routes: Dict[Tuple[int, int], Route] = dict()
+        # the destination index of each source node (or -1), to avoid transfers from a node to itself
+        index = {node: i for i, node in enumerate(self.destinations)}
+        self._source_as_destination = np.array([index.get(node, -1) for node in self.sources], dtype=np.int64)
+
+        # statistics
+        self.started = 0
+
+    def route(self, source: int, destination: int) -> Route:
+        """
+        Returns the route between the source and destination with the given indices, resolving it on first use.
+        """
+        k = (source, destination)
+        route = self._routes.get(k)
+        if route is None:
+            route = self.topology.route(self.sources[source], self.destinations[destination], use_mode=self.use_mode)
+            self._routes[k] = route
+        return route
+
+    def chunks(self, limit: int = None, until: float = None, start: float = 0.) -> Iterator[Chunk]:
+        """
+        Draws transfers in chunks until ``limit`` transfers were drawn or the arrival time reaches ``until``. At least
+        one of them should be given, otherwise the iterator is infinite.
+
+        :param limit: the maximum number of transfers
+        :param until: the time before which transfers arrive
+        :param start: the time from which the first inter-arrival time is counted
+        :return: an iterator over chunks of transfers
+        """
+        drawn = 0
+        now = start
+
+        while limit is None or drawn < limit:
+            n = self.chunk_size if limit is None else min(self.chunk_size, limit - drawn)
+            times = now + np.cumsum(self.arrivals.draw(n, drawn, self.random))
+
+            done = False
+            if until is not None and times[-1] >= until:
+                n = int(np.searchsorted(times, until, side='left'))
+                times = times[:n]
+                done = True
+
+            if n:
+                yield Chunk(times, self._draw_sizes(n), *self._draw_pairs(n))
+                drawn += n
+                now = times[-1]
+
+            if done:
+                return
+
+    def run(self, env: simpy.Environment, start: StartTransfer = None, limit: int = None,
+            until: float = None) -> simpy.Process:
+        """
+        Starts a driver process that starts all transfers of the workload at their arrival time, relative to the
+        current simulation time.
+
+        :param env: the simulation environment
+        :param start: starts a transfer, defaults to starting a `Flow` process
+        :param limit: the maximum number of transfers
+        :param until: the time (relative to now) before which transfers arrive
+        :return: the driver process
+        """
+        if limit is None and until is None:
+            raise ValueError('need a limit or an end time')
+
+        if start is None:
+            def start(size, route):
+                return Flow(env, size, route).start()
+
+        if until is not None:
+            until += env.now
+
+        return env.process(self._drive(env, start, limit, until))
+
+    def _drive(self, env: simpy.Environment, start: StartTransfer, limit: Optional[int], until: Optional[float]):
+        route = self.route
+
+        for chunk in self.chunks(limit, until, env.now):
+            for t, size, source, destination in zip(chunk.times.tolist(), chunk.sizes.tolist(),
+                                                    chunk.sources.tolist(), chunk.destinations.tolist()):
+                if t > env.now:
+                    yield env.timeout(t - env.now)
+                start(size, route(source, destination))
+            self.started += len(chunk)
+
+    def _draw_sizes(self, n: int) -> np.ndarray:
+        if isinstance(self.sizes, RandomSampler):
+            sizes = np.asarray(self.sizes.sample(size=n))
+            return np.maximum(sizes, 1).astype(np.int64)
+        return np.full(n, int(self.sizes), dtype=np.int64)
+
+    def _draw_pairs(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        random = self.random
+        sources = random.randint(0, len(self.sources), size=n)
+        destinations = random.randint(0, len(self.destinations), size=n)
+
+        # redraw destinations that are the same node as their source
+        same_node = self._source_as_destination[sources] == destinations
+        while same_node.any():
+            destinations[same_node] = random.randint(0, len(self.destinations), size=int(same_node.sum()))
+            same_node = self._source_as_destination[sources] == destinations
+
+        return sources, destinations
@@ -50,8 +50,10 @@ def distances(topology: Topology, node_filter: Callable[[Node], bool] = lambda _
     :param node_filter: if set, filters the set of nodes
     :return: a tuple of (true_distances, vivaldi_distances)
     """
-    pairs = list(combinations(filter(node_filter, topology.get_nodes()), 2))
-    true_distances = [topology.route(node1, node2, use_mode=True).rtt for node1, node2 in pairs]
+    nodes = list(filter(node_filter, topology.get_nodes()))
+    pairs = list(combinations(nodes, 2))
+    matrix = topology.latency_matrix(nodes)
+    true_distances = [matrix.get(node1, node2) for node1, node2 in pairs]
     vivaldi_distances = [node1.distance_to(node2) for node1, node2 in pairs]
     return true_distances, vivaldi_distances
 
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import numpy as np
+import srds
+
+from ether.core import Node, Connection
+from ether.qos import latency, sampling
+from ether.qos.sampling import LatencySampler
+from ether.replication import seed_all
+from ether.topology import Topology
+
+
+class TestLatencySampler(TestCase):
+
+    def test_samples_follow_distribution(self):
+        sampler = LatencySampler(batch_size=1000, seed=0)
+        values = [sampler.sample(latency.mobile_isp) for _ in range(5000)]
+
+        self.assertAlmostEqual(latency.mobile_isp.mean(), np.mean(values), delta=0.5)
+        self.assertEqual(5000, len(set(values)))  # buffers are refilled with new samples
+
+    def test_seed_is_reproducible(self):
+        a = LatencySampler(batch_size=10, seed=1)
+        b = LatencySampler(batch_size=10, seed=1)
+
+        self.assertEqual([a.sample(latency.lan) for _ in range(25)], [b.sample(latency.lan) for _ in range(25)])
+
+        a.reset(2)
+        b.reset(3)
+        self.assertNotEqual(a.sample(latency.lan), b.sample(latency.lan))
+
+    def test_global_random_state(self):
+        sampler = LatencySampler(batch_size=10)
+
+        srds.seed(0)
+        first = [sampler.sample(latency.wlan) for _ in range(15)]
+        after = np.random.random()
+        srds.seed(0)
+        self.assertEqual(first, [sampler.sample(latency.wlan) for _ in range(15)])
+        self.assertEqual(after, np.random.random())  # draws no more samples than it hands out
+
+    def test_samples_continue_buffer(self):
+        a = LatencySampler(batch_size=10, seed=1)
+        b = LatencySampler(batch_size=10, seed=1)
+
+        a.sample(latency.lan)
+        b.sample(latency.lan)
+        self.assertEqual([a.sample(latency.lan) for _ in range(5)], list(b.samples(latency.lan, 5)))
+        self.assertEqual(12, len(b.samples(latency.lan, 12)))
+
+    def test_connection_uses_default_sampler(self):
+        connection = Connection('a', 'b', latency_dist=latency.business_isp)
+
+        sampling.seed(42)
+        first = [connection.get_latency() for _ in range(3)]
+        sampling.seed(42)
+        self.assertEqual(first, [connection.get_latency() for _ in range(3)])
+        sampling.seed()
+
+    def test_seed_all_enables_pooling(self):
+        connection = Connection('a', 'b', latency_dist=latency.business_isp)
+
+        seed_all(7)
+        self.assertIsNotNone(sampling.default_sampler.random)
+        first = [connection.get_latency() for _ in range(3)]
+        np.random.random()  # pooled samples do not depend on the global random state
+        seed_all(7)
+        np.random.random()
+        self.assertEqual(first, [connection.get_latency() for _ in range(3)])
+        sampling.seed()
+
+    def test_srds_seed_makes_routes_reproducible(self):
+        topology = Topology()
+        a, b = Node('a'), Node('b')
+        topology.add_connection(Connection(a, 'internet', latency_dist=latency.mobile_isp))
+        topology.add_connection(Connection('internet', b, latency_dist=latency.business_isp))
+
+        srds.seed(0)
+        rtt = topology.route(a, b).rtt
+        connection_latency = topology.get_edge_data(a, 'internet')['connection'].get_latency()
+        srds.seed(0)
+        self.assertEqual(rtt, topology.route(a, b).rtt)
+        self.assertEqual(connection_latency, topology.get_edge_data(a, 'internet')['connection'].get_latency())
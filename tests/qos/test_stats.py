@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+import numpy as np
+
+from ether.core import Connection
+from ether.qos import latency, stats
+
+
+class TestLatencyStats(TestCase):
+
+    def test_mode_matches_formula(self):
+        dist = latency.mobile_isp
+        expected = np.exp(np.log(dist.scale) - dist.args[0] ** 2) + dist.loc
+        self.assertAlmostEqual(expected, stats.mode(dist))
+        self.assertAlmostEqual(expected, Connection('a', 'b', latency_dist=dist).get_mode_latency())
+
+    def test_mean_and_quantiles(self):
+        dist = latency.wlan
+        self.assertAlmostEqual(dist.mean(), stats.mean(dist))
+
+        samples = dist.sample(size=100000)
+        self.assertAlmostEqual(np.quantile(samples, 0.95), stats.statistic(dist, 'p95'), delta=0.2)
+        self.assertEqual(stats.statistic(dist, 'p50'), stats.quantile(dist, 0.5))
+        self.assertLess(stats.statistic(dist, 'p99'), stats.statistic(dist, 'p99.9'))
+
+    def test_values_are_cached(self):
+        dist = latency.lan
+        value = stats.statistic(dist, 'p99')
+        self.assertIs(value, stats.statistic(dist, 'p99'))
+
+    def test_unknown_statistic(self):
+        self.assertRaises(ValueError, stats.statistic, latency.lan, 'median')
+        self.assertRaises(ValueError, stats.statistic, latency.lan, 'p100')
+        self.assertRaises(ValueError, stats.statistic, latency.lan, 'pxx')
+
+    def test_constant_latency(self):
+        connection = Connection('a', 'b', latency=3)
+        self.assertEqual(3, connection.get_latency_statistic('p95'))
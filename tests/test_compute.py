@@ -0,0 +1,127 @@
+import gc
+import weakref
+from unittest import TestCase
+
+import simpy
+
+from ether.blocks.nodes import create_rpi3_node
+from ether.compute import Task, Processor
+from ether.core import Node, Capacity
+
+
+class TestProcessor(TestCase):
+
+    def run_tasks(self, node, tasks):
+        env = simpy.Environment()
+        finished = dict()
+
+        def run(i, delay, task_args):
+            yield env.timeout(delay)
+            yield Task(env, node=node, **task_args).start()
+            finished[i] = env.now
+
+        for i, (delay, task_args) in enumerate(tasks):
+            env.process(run(i, delay, task_args))
+
+        env.run()
+        return env, finished
+
+    def test_single_task_uses_one_core(self):
+        node = Node('n', Capacity(cpu_millis=4000))
+        _, finished = self.run_tasks(node, [(0, dict(work=2))])
+        self.assertAlmostEqual(2, finished[0])
+
+    def test_processor_sharing(self):
+        node = Node('n', Capacity(cpu_millis=1000))
+
+        # two tasks share one core, the second one arrives after 1s
+        _, finished = self.run_tasks(node, [(0, dict(work=2)), (1, dict(work=1))])
+
+        # in [1, 3] both tasks get half a core, so the first finishes at 3 and the second at 3
+        self.assertAlmostEqual(3, finished[0])
+        self.assertAlmostEqual(3, finished[1])
+
+        _, finished = self.run_tasks(node, [(0, dict(work=3)), (0, dict(work=1)), (0, dict(work=2))])
+        self.assertAlmostEqual(3, finished[1])  # 1/3 core each until t=3
+        self.assertAlmostEqual(5, finished[2])  # 1/2 core each until t=5
+        self.assertAlmostEqual(6, finished[0])
+
+    def test_cores_are_shared_when_overloaded(self):
+        node = create_rpi3_node()  # 4 cores
+        _, finished = self.run_tasks(node, [(0, dict(work=1))] * 8)
+        for t in finished.values():
+            self.assertAlmostEqual(2, t)
+
+    def test_memory_reservation(self):
+        node = Node('n', Capacity(cpu_millis=4000, memory=1000))
+        env, finished = self.run_tasks(node, [(0, dict(work=1, memory=600)), (0, dict(work=1, memory=600)),
+                                              (0, dict(work=1, memory=300))])
+
+        self.assertAlmostEqual(1, finished[0])
+        self.assertAlmostEqual(2, finished[1])  # waits for the memory of the first task
+        self.assertAlmostEqual(2, finished[2])  # FIFO admission, waits behind the second task
+
+        processor = Processor.of(env, node)
+        self.assertEqual(0, processor.memory_used)
+        self.assertEqual(3, processor.completed)
+
+        self.assertRaises(ValueError, processor.submit, Task(env, 1, node, memory=2000))
+
+    def test_interrupt_cancels_task(self):
+        env = simpy.Environment()
+        node = Node('n', Capacity(cpu_millis=1000))
+        processor = Processor.of(env, node)
+
+        long = Task(env, 10, node).start()
+        short = Task(env, 1, node)
+        short.start()
+        env.run(1)
+        self.assertAlmostEqual(0.5, processor.remaining(short))
+        long.interrupt()
+        env.run(1.1)
+
+        self.assertEqual(1, processor.running)
+        self.assertAlmostEqual(0.4, processor.remaining(short))
+        env.run(short.process)
+        self.assertAlmostEqual(1.5, env.now)
+
+    def test_cancel_waiting_task_admits_queued_tasks(self):
+        env = simpy.Environment()
+        node = Node('n', Capacity(cpu_millis=2000, memory=1000))
+        finished = dict()
+
+        def run(name, task):
+            yield task.start()
+            finished[name] = env.now
+
+        waiting = Task(env, 1, node, memory=600)
+        env.process(run('a', Task(env, 10, node, memory=600)))
+        env.process(run('b', waiting))
+        env.process(run('c', Task(env, 1, node, memory=300)))  # waits behind b
+
+        env.run(1)
+        self.assertEqual(2, Processor.of(env, node).waiting)
+        waiting.process.interrupt()
+        env.run()
+
+        self.assertEqual({'a': 10, 'b': 1, 'c': 2}, finished)  # b ends when it is cancelled
+
+    def test_environment_is_released(self):
+        node = Node('n', Capacity(cpu_millis=1000))
+        env, _ = self.run_tasks(node, [(0, dict(work=1)), (0.5, dict(work=1))])
+        processor = Processor.of(env, node)
+        ref = weakref.ref(env)
+        del env
+
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertIsNone(processor.env)
+
+    def test_one_processor_per_node(self):
+        env = simpy.Environment()
+        node = Node('n', Capacity(cpu_millis=1000))
+
+        processor = Processor(env, node, task_millis=500)
+        self.assertIs(processor, Processor.of(env, node))
+        self.assertRaises(ValueError, Processor, env, node)
+        self.assertIsNot(processor, Processor.of(simpy.Environment(), node))
@@ -0,0 +1,535 @@
+import gc
+import random
+import threading
+import weakref
+from unittest import TestCase
+
+import simpy
+
+from ether.core import Node, Link, LinkAllocation, LinkTable, LinkState, Route, Flow, FlowControl, NetworkState, fill, \
+    add_and_rebalance, remove_and_rebalance, allocate
+
+
+def create_route(*hops: Link) -> Route:
+    return Route(Node('a'), Node('b'), list(hops))
+
+
+class TestFill(TestCase):
+
+    def test_single_link_is_shared_equally(self):
+        link = Link(100)
+        f1 = Flow(None, 1, create_route(link))
+        f2 = Flow(None, 1, create_route(link))
+
+        shares = fill({f1, f2})
+
+        self.assertEqual({f1: 50, f2: 50}, shares)
+
+    def test_bottleneck_flow_leaves_remaining_bandwidth(self):
+        shared = Link(100)
+        narrow = Link(20)
+        f1 = Flow(None, 1, create_route(narrow, shared))
+        f2 = Flow(None, 1, create_route(shared))
+        f3 = Flow(None, 1, create_route(shared))
+
+        shares = fill({f1, f2, f3})
+
+        self.assertAlmostEqual(20, shares[f1])
+        self.assertAlmostEqual(40, shares[f2])
+        self.assertAlmostEqual(40, shares[f3])
+
+    def test_parking_lot(self):
+        l1 = Link(100)
+        l2 = Link(60)
+        long = Flow(None, 1, create_route(l1, l2))
+        short1 = Flow(None, 1, create_route(l1))
+        short2 = Flow(None, 1, create_route(l2))
+
+        shares = fill({long, short1, short2})
+
+        self.assertAlmostEqual(30, shares[long])
+        self.assertAlmostEqual(70, shares[short1])
+        self.assertAlmostEqual(30, shares[short2])
+
+    def test_foreign_allocation_is_reserved(self):
+        link = Link(100)
+        other = Flow(None, 1, create_route(link))
+        link.allocation[other] = 70
+        link.num_flows = 1
+
+        flow = Flow(None, 1, create_route(link))
+
+        self.assertAlmostEqual(30, fill({flow})[flow])
+
+
+class TerminatedProcess:
+    is_alive = False
+
+
+class TestPropagation(TestCase):
+
+    def setUp(self) -> None:
+        self.env = simpy.Environment()
+
+    def create_flow(self, *hops: Link) -> Flow:
+        flow = Flow(self.env, 1, create_route(*hops))
+        flow.process = TerminatedProcess()
+        return flow
+
+    def test_independent_links_are_not_touched(self):
+        shared = Link(100)
+        other = Link(100)
+
+        f1 = self.create_flow(shared)
+        f2 = self.create_flow(other)
+        add_and_rebalance(f1)
+        add_and_rebalance(f2)
+
+        propagation = add_and_rebalance(self.create_flow(shared))
+
+        self.assertEqual(1, propagation.links)
+        self.assertEqual(2, propagation.flows)
+        self.assertEqual(1, propagation.rounds)
+        self.assertEqual(2, propagation.changed)
+        self.assertEqual(100, other.allocation[f2])
+
+    def test_change_propagates_over_changed_flows(self):
+        l1 = Link(100)
+        l2 = Link(60)
+
+        long = self.create_flow(l1, l2)
+        short2 = self.create_flow(l2)
+        add_and_rebalance(long)
+        add_and_rebalance(short2)
+        self.assertEqual(30, l1.allocation[long])
+
+        propagation = remove_and_rebalance(short2)
+
+        self.assertEqual(60, l1.allocation[long])
+        self.assertEqual(1, propagation.changed)
+
+    def test_contended_allocations(self):
+        wifi = Link(30)
+        uplink = Link(40)
+        backhaul = Link(100)
+
+        f1 = self.create_flow(wifi, backhaul)
+        f2 = self.create_flow(wifi, backhaul)
+        f3 = self.create_flow(uplink, backhaul)
+        f4 = self.create_flow(backhaul)
+        f5 = self.create_flow(uplink)
+        for flow in (f1, f2, f3, f4, f5):
+            add_and_rebalance(flow)
+
+        def assertAllocations(expected):
+            for flow, bw in expected.items():
+                for link in flow.route.hops:
+                    self.assertAlmostEqual(bw, link.allocation[flow])
+
+        assertAllocations({f1: 15, f2: 15, f3: 20, f4: 50, f5: 20})
+
+        remove_and_rebalance(f5)
+        assertAllocations({f1: 15, f2: 15, f3: 35, f4: 35})
+
+        remove_and_rebalance(f1)
+        assertAllocations({f2: 30, f3: 35, f4: 35})
+        self.assertAlmostEqual(100, backhaul.allocation.total)
+
+    def test_departures_reallocate_all_bandwidth(self):
+        # the greedy filling used before over-allocated the link (10 + 13.33 MBit/s)
+        link = Link(20)
+        flows = [self.create_flow(link) for _ in range(3)]
+        for flow in flows:
+            add_and_rebalance(flow)
+        remove_and_rebalance(flows[0])
+
+        self.assertAlmostEqual(10, link.allocation[flows[1]])
+        self.assertAlmostEqual(10, link.allocation[flows[2]])
+
+        # ... and left capacity unallocated (15 + 10 MBit/s on the 30 MBit/s link)
+        l1, l2 = Link(30), Link(10)
+        flows = [self.create_flow(l1), self.create_flow(l1), self.create_flow(l1, l2)]
+        for flow in flows:
+            add_and_rebalance(flow)
+        remove_and_rebalance(flows[0])
+
+        self.assertAlmostEqual(20, l1.allocation[flows[1]])
+        self.assertAlmostEqual(10, l1.allocation[flows[2]])
+
+    def test_allocate_updates_all_hops_of_changed_flows(self):
+        l1, l2 = Link(100), Link(100)
+        unchanged = self.create_flow(l1, l2)
+        changed = self.create_flow(l2, l1)
+        new = self.create_flow(l1, l2)
+        for link in (l1, l2):
+            link.allocation[unchanged] = 30
+            link.allocation[changed] = 30
+
+        # allocations are compared on the first hop only, a flow has the same allocation on all of its links
+        allocation = allocate({unchanged: 30 + 1e-12, changed: 40, new: 30})
+
+        self.assertEqual({changed: 40, new: 30}, allocation)
+        for link in (l1, l2):
+            self.assertEqual(30, link.allocation[unchanged])
+            self.assertEqual(40, link.allocation[changed])
+            self.assertEqual(30, link.allocation[new])
+
+    def test_matches_full_rebalance(self):
+        rnd = random.Random(42)
+
+        links = [Link(rnd.choice([10, 50, 100, 300])) for _ in range(8)]
+        active = list()
+
+        for _ in range(200):
+            if active and rnd.random() < 0.4:
+                remove_and_rebalance(active.pop(rnd.randrange(len(active))))
+            else:
+                flow = self.create_flow(*rnd.sample(links, rnd.randint(1, 3)))
+                add_and_rebalance(flow)
+                active.append(flow)
+
+            expected = fill(set(active))
+            for flow in active:
+                for link in flow.route.hops:
+                    self.assertAlmostEqual(expected[flow], link.allocation[flow])
+
+
+class TestFlow(TestCase):
+
+    def test_uncontended_flow_takes_fast_path(self):
+        env = simpy.Environment()
+        host = Link(1000)
+        uplink = Link(20)
+
+        flow = Flow(env, 10 ** 6, create_route(host, uplink))
+        flow.start()
+        env.run(0.1)
+
+        control = FlowControl.of(env)
+        self.assertEqual(1, control.fast_paths)
+        self.assertEqual(0, control.rebalances)
+        self.assertEqual(20, host.allocation[flow])
+        self.assertEqual(20, uplink.allocation[flow])
+        self.assertEqual(1000, host.max_allocatable)
+
+        # a competing flow is rebalanced against it
+        other = Flow(env, 10 ** 6, create_route(uplink))
+        other.start()
+        env.run(0.2)
+        self.assertEqual(1, control.rebalances)
+        self.assertEqual(10, host.allocation[flow])
+
+        env.run()
+        self.assertEqual(0, len(host.allocation))
+        self.assertEqual(0, uplink.num_flows)
+
+    def test_concurrent_flows_share_bandwidth(self):
+        env = simpy.Environment()
+        link = Link(8)  # 8 MBit/s = 1 MB/s raw
+        goodput = 1000000 * 0.97
+
+        f1 = Flow(env, 1000000, create_route(link))
+        f2 = Flow(env, 3000000, create_route(link))
+
+        p1 = f1.start()
+        p2 = f2.start()
+
+        env.run(p1)
+        self.assertAlmostEqual(2000000 / goodput, env.now)  # both send at half rate
+
+        env.run(p2)
+        self.assertAlmostEqual(4000000 / goodput, env.now)  # the rest is sent at full rate
+
+        self.assertEqual(0, link.num_flows)
+        self.assertEqual(0, len(link.allocation))
+        self.assertEqual(8, link.max_allocatable)
+
+    def test_flow_rebalances_across_links(self):
+        env = simpy.Environment()
+        l1 = Link(100)
+        l2 = Link(60)
+
+        long = Flow(env, 10 ** 7, create_route(l1, l2))
+        short1 = Flow(env, 10 ** 9, create_route(l1))
+        short2 = Flow(env, 10 ** 9, create_route(l2))
+
+        long.start()
+        short1.start()
+        short2.start()
+        env.run(0.5)
+
+        self.assertAlmostEqual(30, l1.allocation[long])
+        self.assertAlmostEqual(70, l1.allocation[short1])
+        self.assertAlmostEqual(30, l2.allocation[short2])
+
+        env.run(5)
+
+        self.assertNotIn(long, l1.allocation)
+        self.assertAlmostEqual(100, l1.allocation[short1])
+        self.assertAlmostEqual(60, l2.allocation[short2])
+
+
+class TestLinkAllocation(TestCase):
+
+    def test_below(self):
+        allocation = LinkAllocation()
+        flows = [Flow(None, 1, None) for _ in range(4)]
+
+        for flow, value in zip(flows, [30, 10, 20, 40]):
+            allocation[flow] = value
+
+        self.assertEqual((0, 0), allocation.below(10))
+        self.assertEqual((2, 30), allocation.below(25))
+        self.assertEqual((4, 100), allocation.below(50))
+        self.assertEqual(100, allocation.total)
+
+        allocation[flows[1]] = 35
+        self.assertEqual((1, 20), allocation.below(25))
+        self.assertEqual(125, allocation.total)
+
+        del allocation[flows[0]]
+        self.assertEqual((2, 55), allocation.below(40))
+        self.assertEqual(95, allocation.total)
+        self.assertEqual(3, len(allocation))
+        self.assertNotIn(flows[0], allocation)
+
+    def test_recalculate_max_allocatable(self):
+        link = Link(100)
+        f1, f2, f3 = [Flow(None, 1, None) for _ in range(3)]
+
+        link.num_flows = 3
+        link.allocation[f1] = 10
+        link.allocation[f2] = 45
+        link.allocation[f3] = 45
+        link.recalculate_max_allocatable()
+
+        self.assertEqual(45, link.max_allocatable)
+
+
+class TestFlowControl(TestCase):
+
+    def run_flows(self, batching: bool):
+        env = simpy.Environment()
+        control = FlowControl(env, batching=batching)
+        link = Link(8)
+
+        finished = dict()
+
+        def run(flow: Flow):
+            yield flow.start()
+            finished[flow.size] = env.now
+
+        for i in range(1, 11):
+            env.process(run(Flow(env, 1000000 * i, create_route(link))))
+
+        env.run()
+        return control, finished
+
+    def test_of(self):
+        env = simpy.Environment()
+        control = FlowControl.of(env)
+        self.assertIs(control, FlowControl.of(env))
+        self.assertFalse(control.batching)
+
+        control = FlowControl(env, batching=True)
+        self.assertIs(control, FlowControl.of(env))
+
+    def test_environment_is_released(self):
+        refs = list()
+        for batching in (False, True):
+            env = simpy.Environment()
+            FlowControl(env, batching=batching)
+            link = Link(8)
+            for _ in range(3):
+                Flow(env, 10 ** 6, create_route(link)).start()
+            env.run()
+            refs.append(weakref.ref(env))
+            del env
+
+        gc.collect()
+        self.assertEqual([None, None], [ref() for ref in refs])
+
+    def test_batching_has_same_completion_times(self):
+        control, expected = self.run_flows(batching=False)
+        self.assertEqual(18, control.rebalances)
+        self.assertEqual(2, control.fast_paths)  # the first arrival and the last departure
+
+        control, actual = self.run_flows(batching=True)
+        self.assertEqual(10, control.rebalances)  # one for the remaining arrivals, one per departure
+        self.assertEqual(2, control.fast_paths)
+
+        for size, t in expected.items():
+            self.assertAlmostEqual(t, actual[size])
+
+    def test_interrupt_while_waiting_for_epoch(self):
+        env = simpy.Environment()
+        FlowControl(env, batching=True)
+        link = Link(8)
+
+        other = Flow(env, 10 ** 6, create_route(link))
+        other.start()
+
+        def cancel():
+            yield env.timeout(1)
+            flow = Flow(env, 10 ** 6, create_route(link))
+            process = flow.start()
+            yield env.timeout(0)  # the flow now waits for the epoch
+            process.interrupt()
+            try:
+                yield process
+            except simpy.Interrupt:
+                pass
+
+            self.assertEqual(1, link.num_flows)
+            self.assertNotIn(flow, link.allocation)
+
+        env.process(cancel())
+        env.run(1.01)
+        self.assertAlmostEqual(8, link.allocation[other])
+
+        env.run()
+        self.assertEqual(0, link.num_flows)
+        self.assertEqual(0, len(link.allocation))
+
+    def test_tolerance_avoids_interrupts(self):
+        def run(**kwargs):
+            env = simpy.Environment()
+            control = FlowControl(env, **kwargs)
+            shared = Link(100)
+
+            # a long flow, and a number of small flows that each take a small share for a short time
+            long = Flow(env, 10 ** 8, create_route(shared))
+            p = long.start()
+            for i in range(1, 10):
+                narrow = Link(1)
+                Flow(env, 10 ** 4, create_route(narrow, shared)).start()
+
+            env.run(p)
+            return control, env.now
+
+        exact, t_exact = run()
+        self.assertEqual(0, exact.interrupts_avoided)
+
+        tolerant, t_tolerant = run(rtol=0.1)
+        self.assertLess(tolerant.interrupts, exact.interrupts)
+        self.assertEqual(exact.interrupts, tolerant.interrupts + tolerant.interrupts_avoided)
+        self.assertAlmostEqual(t_exact, t_tolerant, delta=t_exact * 0.1)
+
+        tolerant, t_tolerant = run(eta_tolerance=1)
+        self.assertGreater(tolerant.interrupts_avoided, 0)
+        self.assertAlmostEqual(t_exact, t_tolerant, delta=1)
+
+
+class TestLinkTable(TestCase):
+
+    def test_attributes_are_backed_by_table(self):
+        table = LinkTable(capacity=1)
+        l1 = Link(100)
+        l2 = Link(50)
+        l2.num_flows = 2
+
+        self.assertEqual(0, table.add(l1))
+        self.assertEqual(1, table.add(l2))  # grows the table
+        self.assertEqual(2, len(table))
+
+        self.assertEqual(50, l2.bandwidth)
+        self.assertEqual(2, l2.num_flows)
+
+        l1.num_flows += 1
+        self.assertEqual(1, table.num_flows[0])
+        self.assertEqual([100, 25], list(table.fair_share()))
+
+        self.assertRaises(ValueError, LinkTable().add, l1)
+
+    def test_flows_with_table(self):
+        env = simpy.Environment()
+        table = LinkTable()
+        link = Link(8)
+        table.add(link)
+
+        Flow(env, 1000000, create_route(link)).start()
+        Flow(env, 1000000, create_route(link)).start()
+        env.run(0.1)
+
+        self.assertEqual(2, table.num_flows[0])
+        self.assertEqual(4, table.max_allocatable[0])
+        env.run()
+        self.assertEqual(0, table.num_flows[0])
+
+
+class TestNetworkState(TestCase):
+
+    def run_flows(self, links, state: bool):
+        env = simpy.Environment()
+        if state:
+            NetworkState(env)
+
+        finished = dict()
+
+        def run(i, flow: Flow):
+            yield flow.start()
+            finished[i] = env.now
+
+        rnd = random.Random(1)
+        for i in range(20):
+            hops = rnd.sample(links, rnd.randint(1, 3))
+            env.process(run(i, Flow(env, rnd.randint(10 ** 5, 10 ** 7), create_route(*hops))))
+
+        env.run()
+        return env, finished
+
+    def test_flows_use_link_state(self):
+        env = simpy.Environment()
+        state = NetworkState(env)
+        link = Link(8)
+        route = create_route(link)
+
+        flow = Flow(env, 10 ** 6, route)
+        flow.start()
+        env.run(0.1)
+
+        self.assertIs(state, NetworkState.of(env))
+        self.assertIsInstance(flow.route.hops[0], LinkState)
+        self.assertIs(state[link], flow.route.hops[0])
+        self.assertEqual(8, state[link].allocation[flow])
+        self.assertEqual(0, len(link.allocation))
+        self.assertEqual(0, link.num_flows)
+
+        self.assertIs(flow.route.path, Flow(env, 1, route).route.path)  # bound routes are reused
+        self.assertIs(flow.route.path, state.bind(flow.route).path)
+        self.assertRaises(ValueError, NetworkState(simpy.Environment()).__getitem__, state[link])
+
+    def test_environment_is_released(self):
+        links = [Link(bw) for bw in (10, 50, 100)]
+        env, _ = self.run_flows(links, state=True)
+        state = NetworkState.of(env)
+        ref = weakref.ref(env)
+        del env
+
+        gc.collect()
+        self.assertIsNone(ref())
+        self.assertIsNone(state.env)
+
+    def test_concurrent_simulations_share_links(self):
+        links = [Link(bw) for bw in (10, 50, 100, 100, 300)]
+        _, expected = self.run_flows(links, state=False)
+
+        results = dict()
+
+        def run(i):
+            results[i] = self.run_flows(links, state=True)[1]
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for finished in results.values():
+            self.assertEqual(expected.keys(), finished.keys())
+            for i, t in expected.items():
+                self.assertAlmostEqual(t, finished[i])
+
+        for link in links:
+            self.assertEqual(0, link.num_flows)
+            self.assertEqual(0, len(link.allocation))
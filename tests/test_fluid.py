@@ -0,0 +1,126 @@
+import random
+from unittest import TestCase
+
+import numpy as np
+import simpy
+
+from ether import fluid
+from ether.core import Node, Link, Connection, Flow, goodput_magic_number
+from ether.topology import Topology
+
+
+def simulate_water_fill(incidence, sizes, starts):
+    """
+    Reference fluid model that re-calculates the rates of all active transfers at every event.
+    """
+    n = len(sizes)
+    finished = np.full(n, np.nan)
+    remaining = sizes.copy()
+    active = np.zeros(n, dtype=bool)
+    arrivals = list(np.argsort(starts, kind='stable'))
+    now = 0.
+
+    while arrivals or active.any():
+        if not active.any():
+            now = max(now, starts[arrivals[0]])
+        while arrivals and starts[arrivals[0]] <= now:
+            active[arrivals.pop(0)] = True
+
+        rate = fluid.water_fill(incidence, active) * 125000 * goodput_magic_number
+        time_left = np.full(n, np.inf)
+        time_left[active] = remaining[active] / rate[active]
+        dt = time_left.min()
+        if arrivals:
+            dt = min(dt, starts[arrivals[0]] - now)
+
+        remaining[active] -= rate[active] * dt
+        now += dt
+        done = active & (time_left <= dt * (1 + 1e-9))
+        finished[done] = now
+        active[done] = False
+
+    return finished
+
+
+class TestFluid(TestCase):
+
+    def setUp(self) -> None:
+        # three hosts behind a shared link, and one host behind a slow uplink
+        self.topology = Topology()
+        self.nodes = [Node('n%d' % i) for i in range(4)]
+        self.shared = Link(100)
+        self.uplink = Link(20)
+
+        links = [Link(1000) for _ in self.nodes]
+        for node, link in zip(self.nodes, links):
+            self.topology.add_connection(Connection(node, link))
+
+        for link in links[:3]:
+            self.topology.add_connection(Connection(link, self.shared))
+        self.topology.add_connection(Connection(links[3], self.uplink))
+        self.topology.add_connection(Connection(self.uplink, self.shared))
+
+    def simulate(self, transfers):
+        env = simpy.Environment()
+        finished = dict()
+
+        def run(i, source, destination, size, start):
+            yield env.timeout(start)
+            yield Flow(env, size, self.topology.route(source, destination)).start()
+            finished[i] = env.now
+
+        for i, transfer in enumerate(transfers):
+            env.process(run(i, *transfer))
+
+        env.run()
+        return [finished[i] for i in range(len(transfers))]
+
+    def test_single_transfer(self):
+        times = fluid.completion_times(self.topology, [(self.nodes[0], self.nodes[3], 10 ** 6)])
+        self.assertAlmostEqual(10 ** 6 / (20 * 125000 * 0.97), times[0])
+
+    def test_matches_flow_simulation(self):
+        rnd = random.Random(1)
+
+        transfers = list()
+        for _ in range(30):
+            source, destination = rnd.sample(self.nodes, 2)
+            transfers.append((source, destination, rnd.randint(10 ** 5, 10 ** 7), rnd.random() * 2))
+
+        expected = self.simulate(transfers)
+        actual = fluid.completion_times(self.topology, transfers)
+
+        for e, a in zip(expected, actual):
+            self.assertAlmostEqual(e, a, places=6)
+
+    def test_matches_water_fill(self):
+        # hosts behind switches that are connected by links of different bandwidths, so transfers change bottlenecks
+        rnd = random.Random(2)
+        topology = Topology()
+        nodes = [Node('h%d' % i) for i in range(10)]
+        switches = ['s%d' % i for i in range(4)]
+        for node in nodes:
+            link = Link(rnd.choice([10, 50, 1000]))
+            topology.add_connection(Connection(node, link))
+            topology.add_connection(Connection(link, rnd.choice(switches)))
+        for i, j in [(0, 1), (1, 2), (2, 3), (0, 3), (1, 3)]:
+            link = Link(rnd.choice([20, 40, 80]))
+            topology.add_connection(Connection(switches[i], link))
+            topology.add_connection(Connection(link, switches[j]))
+
+        for ties in [False, True]:
+            transfers = list()
+            for _ in range(150):
+                source, destination = rnd.sample(nodes, 2)
+                if ties:
+                    transfers.append((source, destination, rnd.choice([10 ** 6, 2 * 10 ** 6]), rnd.choice([0, 1, 2])))
+                else:
+                    transfers.append((source, destination, rnd.randint(10 ** 5, 10 ** 7), rnd.random() * 5))
+
+            incidence = fluid.Incidence([topology.route(s, d, use_mode=True) for s, d, _, _ in transfers])
+            sizes = np.array([transfer[2] for transfer in transfers], dtype=float)
+            starts = np.array([transfer[3] for transfer in transfers], dtype=float)
+
+            expected = simulate_water_fill(incidence, sizes, starts)
+            actual = fluid.simulate(incidence, sizes, starts)
+            np.testing.assert_allclose(expected, actual, rtol=1e-9)
@@ -61,3 +61,34 @@ class TestNetworkx(TestCase):
         plt.show()  # display
 
         print('num nodes:', len(topology.nodes))
+
+    def test_link_table(self):
+        topology = Topology(link_table=True)
+
+        n0 = create_nuc_node()
+        l0 = Link(100)
+        l1 = Link(50)
+        topology.add_connection(Connection(n0, l0))
+        topology.add_connection(Connection(l0, l1))
+
+        self.assertEqual(2, len(topology.link_table))
+        self.assertEqual(0, topology.link_table.index(l0))
+        self.assertEqual(1, topology.link_table.index(l1))
+        self.assertEqual(50, l1.bandwidth)
+        self.assertIs(int, type(l1.bandwidth))
+        self.assertIs(int, type(l1.num_flows))
+        self.assertIs(float, type(l1.max_allocatable))
+
+    def test_link_table_without_add_edge(self):
+        l0, l1, l2, l3 = Link(10), Link(20), Link(30), Link(40)
+
+        topology = Topology(link_table=True)
+        topology.add_node(l0)
+        topology.add_nodes_from([(l1, {'tag': 'a'})])
+        topology.add_edges_from(iter([(l1, l2, {'latency': 1})]))
+        self.assertEqual([l0, l1, l2], topology.link_table.links)
+
+        l4, l5 = Link(50), Link(60)
+        topology = Topology(nx.DiGraph([(l4, l5)]), link_table=True)
+        self.assertEqual([l4, l5], topology.link_table.links)
+        self.assertNotIn(l3, topology.link_table)
@@ -0,0 +1,84 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import simpy
+
+from ether.blocks.cells import MobileConnection
+from ether.cell import SharedLinkCell, Host
+from ether.core import Node
+from ether.replay import TraceReplay, TraceChunk, read_trace
+from ether.topology import Topology
+
+
+class TestTraceReplay(TestCase):
+
+    def setUp(self) -> None:
+        self.topology = Topology()
+        self.cell = SharedLinkCell(nodes=[Node('a'), Node('b')], backhaul=MobileConnection('internet'))
+        self.topology.add(self.cell)
+        self.server = Node('server')
+        self.topology.add(Host(self.server, backhaul='internet'))
+
+        self.records = [
+            (100.0, 'a', 'server', 10 ** 6),
+            (100.5, 'b', 'server', 10 ** 6),
+            (101.0, 'a', 'server', 10 ** 6),
+            (102.0, 'x', 'server', 10 ** 6),  # unknown node
+            (103.0, 'b', 'b', 10 ** 6),  # same node
+            (104.0, 'server', 'a', 10 ** 6),
+        ]
+
+    def replay(self, trace, **kwargs):
+        env = simpy.Environment()
+        started = list()
+
+        def start(size, route):
+            started.append((env.now, route))
+            return env.event()
+
+        replay = TraceReplay(self.topology, trace, **kwargs)
+        replay.run(env, start)
+        env.run()
+        return replay, started
+
+    def test_csv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.csv')
+            with open(path, 'w') as fd:
+                fd.write('timestamp,src,dst,bytes\n')
+                for record in self.records:
+                    fd.write('%s,%s,%s,%d\n' % record)
+
+            self.assertEqual([2, 2, 2], [len(chunk) for chunk in read_trace(path, chunk_size=2)])
+            replay, started = self.replay(path, chunk_size=2)
+
+        self.assertEqual(4, replay.started)
+        self.assertEqual(2, replay.skipped)
+        self.assertEqual([0, 0.5, 1, 4], [t for t, _ in started])
+        self.assertIs(started[0][1], started[2][1])  # routes are reused per pair
+        self.assertEqual(3, len(replay._routes))
+
+    def test_numpy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.npy')
+            dtype = [('timestamp', float), ('src', 'S8'), ('dst', 'S8'), ('bytes', np.int64)]
+            np.save(path, np.array(self.records, dtype=dtype))
+
+            replay, started = self.replay(path, chunk_size=4, time_scale=2)
+
+        self.assertEqual(4, replay.started)
+        self.assertEqual([0, 1, 2, 8], [t for t, _ in started])
+
+    def test_chunks_and_flows(self):
+        chunk = TraceChunk(np.array([0., 1.]), np.array(['a', 'b']), np.array(['server', 'server']),
+                           np.array([10 ** 6, 10 ** 6]))
+
+        env = simpy.Environment()
+        replay = TraceReplay(self.topology, [chunk, chunk])
+        replay.run(env)
+        env.run()
+
+        self.assertEqual(4, replay.started)
+        self.assertEqual(0, self.cell.uplink.num_flows)
@@ -0,0 +1,86 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from ether.cell import LANCell
+from ether.core import Node
+from ether.replication import replicate, summarize, run_replica
+from ether.topology import Topology
+
+
+def scenario():
+    return LANCell([Node('a'), Node('b')], backhaul='internet')
+
+
+def experiment(topology: Topology, seed: int):
+    a, b = topology.get_nodes()
+    return {'rtt': topology.route(a, b).rtt, 'random': random.random(), 'numpy': np.random.random()}
+
+
+def flaky_experiment(topology: Topology, seed: int):
+    # fails on the first attempt of odd seeds, remembered across processes in a marker file
+    marker = os.path.join(os.environ['ETHER_TEST_DIR'], str(seed))
+    if seed % 2 and not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise ValueError('flaky')
+    return {'seed': seed}
+
+
+def failing_experiment(topology: Topology, seed: int):
+    raise ValueError('always fails')
+
+
+def crashing_experiment(topology: Topology, seed: int):
+    # kills the worker process, which breaks the pool for all replicas pending in it
+    if seed in (3, 5):
+        os._exit(1)
+    return {'seed': seed}
+
+
+class TestReplication(TestCase):
+
+    def test_replicas_are_seeded(self):
+        m1 = run_replica(scenario, experiment, 1)
+        m2 = run_replica(scenario, experiment, 1)
+        m3 = run_replica(scenario, experiment, 2)
+
+        self.assertEqual(m1, m2)
+        self.assertNotEqual(m1, m3)
+        self.assertNotEqual(m1['random'], m1['numpy'])
+
+    def test_pool_matches_serial(self):
+        serial = replicate(scenario, experiment, range(6), processes=0)
+        parallel = replicate(scenario, experiment, range(6), processes=2)
+
+        self.assertEqual(list(range(6)), list(parallel.metrics.index))
+        self.assertTrue(serial.metrics.equals(parallel.metrics))
+        self.assertEqual({}, parallel.errors)
+
+        summary = summarize(parallel.metrics)
+        self.assertEqual(['rtt', 'random', 'numpy'], list(summary.index))
+        self.assertEqual(6, summary.loc['rtt', 'count'])
+        self.assertGreater(summary.loc['rtt', 'ci'], 0)
+
+    def test_retries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['ETHER_TEST_DIR'] = tmp
+            try:
+                results = replicate(scenario, flaky_experiment, range(4), processes=2)
+            finally:
+                del os.environ['ETHER_TEST_DIR']
+
+        self.assertEqual([0, 1, 2, 3], list(results.metrics['seed']))
+
+        results = replicate(scenario, failing_experiment, [1, 2], processes=0, retries=2)
+        self.assertEqual(0, len(results.metrics))
+        self.assertEqual({1, 2}, set(results.errors.keys()))
+
+    def test_crashed_pool_charges_only_the_crashing_seed(self):
+        results = replicate(scenario, crashing_experiment, range(12), processes=2, retries=0)
+
+        self.assertEqual([0, 1, 2, 4, 6, 7, 8, 9, 10, 11], list(results.metrics['seed']))
+        self.assertEqual({3, 5}, set(results.errors.keys()))
+        self.assertIn('BrokenProcessPool', results.errors[3])
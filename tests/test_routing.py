@@ -0,0 +1,117 @@
+import random
+from unittest import TestCase
+
+import networkx as nx
+
+from ether.core import Node, Connection
+from ether.routing import HierarchicalRouter
+from ether.scenarios.industrialiot import IndustrialIoTScenario
+from ether.scenarios.urbansensing import UrbanSensingScenario
+from ether.topology import Topology
+
+
+def create_topology(**kwargs) -> Topology:
+    """
+    An urban sensing city and factories with up/down link backhauls, connected by an internet backbone with a cycle.
+    """
+    random.seed(1)
+    topology = Topology(**kwargs)
+    UrbanSensingScenario(num_cells=3, internet='internet_a').materialize(topology)
+    IndustrialIoTScenario(num_premises=2, internet='internet_b').materialize(topology)
+
+    for u, v, latency in [('internet_a', 'internet_b', 40), ('internet_a', 'internet_c', 10),
+                          ('internet_c', 'internet_b', 10)]:
+        topology.add_edge(u, v, latency=latency)
+        topology.add_edge(v, u, latency=latency)
+
+    return topology
+
+
+class TestHierarchicalRouter(TestCase):
+
+    def assertValidPath(self, graph, source, destination, path):
+        self.assertEqual(source, path[0])
+        self.assertEqual(destination, path[-1])
+        for u, v in zip(path, path[1:]):
+            self.assertTrue(graph.has_edge(u, v), 'no edge %s -> %s' % (u, v))
+
+    def test_shortest_paths(self):
+        topology = create_topology()
+        router = HierarchicalRouter(topology)
+        nodes = topology.get_nodes()
+
+        for source in nodes[::3]:
+            for destination in nodes[::4]:
+                path = router.path(source, destination)
+                self.assertValidPath(topology, source, destination, path)
+                self.assertEqual(nx.shortest_path_length(topology, source, destination), len(path) - 1)
+
+    def test_shortest_paths_by_latency(self):
+        topology = create_topology(routing='mode')
+        router = HierarchicalRouter(topology, weight=topology.edge_latency)
+        nodes = topology.get_nodes()
+
+        for source in nodes[::3]:
+            for destination in nodes[::4]:
+                path = router.path(source, destination)
+                self.assertValidPath(topology, source, destination, path)
+                self.assertAlmostEqual(
+                    nx.dijkstra_path_length(topology, source, destination, weight=topology.edge_latency),
+                    sum(topology.edge_latency(u, v, topology[u][v]) for u, v in zip(path, path[1:])))
+
+    def test_backbone_detour(self):
+        topology = create_topology(routing='mode')
+        router = HierarchicalRouter(topology, weight=topology.edge_latency)
+
+        self.assertEqual(['internet_a', 'internet_c', 'internet_b'], router.path('internet_a', 'internet_b'))
+        self.assertEqual(['internet_a', 'internet_b'], HierarchicalRouter(topology).path('internet_a', 'internet_b'))
+
+    def test_up_down_links(self):
+        topology = create_topology()
+        router = HierarchicalRouter(topology)
+        device = [node for node in topology.get_nodes() if node.name.startswith('rpi3')][-1]
+
+        up = router.path(device, 'internet_b')
+        down = router.path('internet_b', device)
+        self.assertTrue(any(getattr(hop, 'tags', {}).get('type') == 'uplink' for hop in up))
+        self.assertTrue(any(getattr(hop, 'tags', {}).get('type') == 'downlink' for hop in down))
+
+    def test_trivial_and_missing_paths(self):
+        topology = Topology()
+        a, b, c = Node('a'), Node('b'), Node('c')
+        topology.add_connection(Connection(a, 'x'))
+        topology.add_connection(Connection('x', b))
+        topology.add_connection(Connection(c, 'y'))
+        topology.add_connection(Connection('z', 'y'), directed=True)
+        router = HierarchicalRouter(topology)
+
+        self.assertEqual([a], router.path(a, a))
+        self.assertEqual([a, 'x', b], router.path(a, b))
+        self.assertEqual(['z', 'y', c], router.path('z', c))
+        self.assertRaises(nx.NetworkXNoPath, router.path, c, 'z')
+        self.assertRaises(nx.NetworkXNoPath, router.path, a, c)
+        self.assertRaises(nx.NodeNotFound, router.path, a, 'unknown')
+
+    def test_topology(self):
+        topology = create_topology(hierarchical=True)
+        flat = Topology(topology)
+        nodes = topology.get_nodes()
+
+        for source, destination in zip(nodes[::2], nodes[::-3]):
+            self.assertAlmostEqual(flat.route(source, destination, use_mode=True).rtt,
+                                   topology.route(source, destination, use_mode=True).rtt)
+
+        self.assertIsNotNone(topology._router)
+        topology.clear_routes()
+        self.assertIsNone(topology._router)
+
+    def test_router_is_rebuilt_after_adding_edges(self):
+        topology = Topology(hierarchical=True)
+        a, b = Node('a'), Node('b')
+        topology.add_connection(Connection(a, 'x'))
+        topology.add_connection(Connection(b, 'y'))
+        self.assertRaises(nx.NetworkXNoPath, topology.path, a, b)
+
+        topology.add_connection(Connection('x', 'y'))
+        self.assertIsNone(topology._router)
+        self.assertEqual([a, 'x', 'y', b], topology.path(a, b))
@@ -0,0 +1,103 @@
+import random
+from unittest import TestCase
+
+import simpy
+
+from ether.core import Node, Link, Route, Flow, UninterruptingFlow
+from ether.scheduler import FlowScheduler
+
+
+def create_route(*hops: Link) -> Route:
+    return Route(Node('a'), Node('b'), list(hops))
+
+
+class TestFlowScheduler(TestCase):
+
+    def run_workload(self, start):
+        rnd = random.Random(7)
+        env = simpy.Environment()
+        links = [Link(rnd.choice([10, 50, 100])) for _ in range(6)]
+
+        finished = dict()
+
+        def client(i, delay, size, hops):
+            yield env.timeout(delay)
+            yield start(env, size, create_route(*hops))
+            finished[i] = env.now
+
+        for i in range(40):
+            env.process(client(i, rnd.random() * 5, rnd.randint(10 ** 5, 10 ** 7), rnd.sample(links, rnd.randint(1, 3))))
+
+        env.run()
+        return finished, links
+
+    def test_fair_policy_matches_flow(self):
+        expected, _ = self.run_workload(lambda env, size, route: Flow(env, size, route).start())
+
+        schedulers = dict()
+
+        def start(env, size, route):
+            if env not in schedulers:
+                schedulers[env] = FlowScheduler(env)
+            return schedulers[env].transfer(size, route)
+
+        actual, links = self.run_workload(start)
+
+        self.assertEqual(len(expected), len(actual))
+        for i, t in expected.items():
+            self.assertAlmostEqual(t, actual[i], places=6)
+
+        for link in links:
+            self.assertEqual(0, link.num_flows)
+            self.assertEqual(0, len(link.allocation))
+
+    def test_uninterrupting_policy_matches_uninterrupting_flow(self):
+        expected, _ = self.run_workload(lambda env, size, route: UninterruptingFlow(env, size, route).start())
+
+        schedulers = dict()
+
+        def start(env, size, route):
+            if env not in schedulers:
+                schedulers[env] = FlowScheduler(env, policy='uninterrupting')
+            return schedulers[env].transfer(size, route)
+
+        actual, _ = self.run_workload(start)
+
+        for i, t in expected.items():
+            self.assertAlmostEqual(t, actual[i], places=6)
+
+    def test_mixed_with_flow_processes(self):
+        env = simpy.Environment()
+        scheduler = FlowScheduler(env)
+        link = Link(8)
+        goodput = 1000000 * 0.97
+
+        done = scheduler.transfer(3000000, create_route(link))
+        flow = Flow(env, 1000000, create_route(link))
+        p = flow.start()
+
+        env.run(p)
+        self.assertAlmostEqual(2000000 / goodput, env.now)
+        env.run(done)
+        self.assertAlmostEqual(4000000 / goodput, env.now)
+        self.assertEqual(0, len(scheduler))
+
+    def test_uninterrupting_policy_follows_outside_rebalances(self):
+        # the flow process rebalances the link it shares with the scheduled transfer, which must follow its allocation
+        env = simpy.Environment()
+        scheduler = FlowScheduler(env, policy='uninterrupting')
+        link = Link(8)
+        goodput = 1000000 * 0.97
+
+        done = scheduler.transfer(3000000, create_route(link))
+        env.run(0.5)
+        p = Flow(env, 1000000, create_route(link)).start()
+
+        env.run(p)
+        self.assertAlmostEqual(0.5 + 2000000 / goodput, env.now)
+        env.run(done)
+        self.assertAlmostEqual(4000000 / goodput, env.now)
+        self.assertEqual(0, link.num_flows)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, FlowScheduler, simpy.Environment(), 'foo')
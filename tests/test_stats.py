@@ -0,0 +1,132 @@
+import pickle
+from unittest import TestCase
+
+import numpy as np
+import simpy
+
+from ether.blocks.cells import MobileConnection
+from ether.cell import SharedLinkCell, Host
+from ether.core import Node, Link, Route, Flow, UninterruptingFlow
+from ether.scenarios.urbansensing import UrbanSensingScenario
+from ether.scheduler import FlowScheduler
+from ether.stats import Moments, QuantileSketch, FlowStats, route_class
+from ether.topology import Topology
+
+
+class TestMoments(TestCase):
+
+    def test_merge(self):
+        values = np.random.RandomState(0).lognormal(size=1000)
+        a, b, c = Moments(), Moments(), Moments()
+        for x in values[:300]:
+            a.add(x)
+        for x in values[300:]:
+            b.add(x)
+        for x in values:
+            c.add(x)
+
+        a.merge(b)
+        self.assertEqual(1000, a.count)
+        self.assertAlmostEqual(values.mean(), a.mean)
+        self.assertAlmostEqual(values.var(ddof=1), a.variance)
+        self.assertAlmostEqual(c.variance, a.variance)
+        self.assertEqual(values.max(), a.max)
+
+
+class TestQuantileSketch(TestCase):
+
+    def test_relative_error(self):
+        values = np.random.RandomState(0).lognormal(size=10000)
+        sketch = QuantileSketch(alpha=0.01)
+        for x in values:
+            sketch.add(x)
+
+        for q in (0.1, 0.5, 0.9, 0.99):
+            expected = np.quantile(values, q, method='lower')
+            self.assertAlmostEqual(expected, sketch.quantile(q), delta=expected * 0.02)
+
+    def test_merge(self):
+        a, b = QuantileSketch(), QuantileSketch()
+        for x in range(1, 51):
+            a.add(x)
+        for x in range(51, 101):
+            b.add(x)
+        a.merge(b)
+
+        self.assertEqual(100, a.count)
+        self.assertAlmostEqual(50, a.quantile(0.5), delta=1)
+        self.assertRaises(ValueError, a.merge, QuantileSketch(alpha=0.05))
+
+    def test_collapse(self):
+        sketch = QuantileSketch(max_buckets=10)
+        for x in np.geomspace(1, 10 ** 6, 1000):
+            sketch.add(x)
+
+        self.assertEqual(10, len(sketch.buckets))
+        self.assertAlmostEqual(10 ** 6, sketch.quantile(1), delta=10 ** 6 * 0.01)
+
+
+class TestFlowStats(TestCase):
+
+    def test_single_flow(self):
+        env = simpy.Environment()
+        stats = FlowStats().attach(env)
+        link = Link(8)
+
+        Flow(env, 10 ** 6, Route(Node('a'), Node('b'), [link])).start()
+        env.run()
+
+        summary = stats.summaries['intra-cell']
+        self.assertEqual(1, summary['completion_time'].count)
+        self.assertAlmostEqual(1 / 0.97, summary['completion_time'].moments.mean)
+        self.assertAlmostEqual(1, summary['slowdown'].moments.mean)
+
+    def test_route_classes_and_merge(self):
+        topology = Topology()
+        cell = SharedLinkCell(nodes=[Node('a'), Node('b')], backhaul=MobileConnection('internet'))
+        topology.add(cell)
+        server = Node('server')
+        topology.add(Host(server, backhaul='internet'))
+        a, b = cell.nodes
+
+        self.assertEqual('intra-cell', route_class(topology.route(a, b)))
+        self.assertEqual('internet', route_class(topology.route(a, server)))
+
+        def run(start):
+            env = simpy.Environment()
+            stats = FlowStats().attach(env)
+            for _ in range(3):
+                start(env, 10 ** 6, topology.route(a, b, use_mode=True))
+                start(env, 10 ** 6, topology.route(a, server, use_mode=True))
+            env.run()
+            return stats
+
+        flows = run(lambda env, size, route: Flow(env, size, route).start())
+        uninterrupting = run(lambda env, size, route: UninterruptingFlow(env, size, route).start())
+        schedulers = dict()
+        scheduled = run(lambda env, size, route: schedulers.setdefault(env, FlowScheduler(env)).transfer(size, route))
+
+        self.assertEqual(3, flows.summaries['internet']['goodput'].count)
+        self.assertEqual(3, uninterrupting.summaries['intra-cell']['goodput'].count)
+        self.assertAlmostEqual(flows.summaries['internet']['completion_time'].moments.mean,
+                               scheduled.summaries['internet']['completion_time'].moments.mean)
+
+        merged = pickle.loads(pickle.dumps(flows))
+        merged.merge(scheduled)
+        self.assertEqual(6, merged.summaries['internet']['slowdown'].count)
+
+        df = merged.to_frame()
+        self.assertEqual(6, len(df))
+        self.assertIn('p99', df.columns)
+
+    def test_route_classes_of_urban_sensing(self):
+        topology = Topology()
+        UrbanSensingScenario(num_cells=2).materialize(topology)
+        nodes = topology.get_nodes()
+        rpi3 = [node for node in nodes if node.name.startswith('rpi3')]
+        tx2 = [node for node in nodes if node.name.startswith('tx2')]
+        server = [node for node in nodes if node.name.startswith('server')]
+
+        self.assertEqual('intra-cell', route_class(topology.route(rpi3[0], rpi3[1])))
+        self.assertEqual('cloudlet', route_class(topology.route(rpi3[0], server[0])))
+        self.assertEqual('cloudlet', route_class(topology.route(server[0], tx2[-1])))
@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+import simpy
+
+from ether.blocks.cells import MobileConnection
+from ether.cell import SharedLinkCell, Host
+from ether.core import Node, Link, Route, Flow, FlowControl
+from ether.telemetry import LinkTelemetry, RingBuffer
+from ether.topology import Topology
+
+
+class TestRingBuffer(TestCase):
+
+    def test_overwrites_oldest(self):
+        buffer = RingBuffer(3)
+        for i in range(5):
+            buffer.append(i, i * 10, 1)
+
+        self.assertEqual([2, 3, 4], list(buffer.to_array()[:, 0]))
+        self.assertEqual(3, buffer.size)
+
+
+class TestLinkTelemetry(TestCase):
+
+    def test_records_utilization(self):
+        env = simpy.Environment()
+        telemetry = LinkTelemetry(env)
+        link = Link(8)
+
+        def route():
+            return Route(Node('a'), Node('b'), [link])
+
+        Flow(env, 1000000, route()).start()
+        Flow(env, 3000000, route()).start()
+        env.run()
+
+        t, allocated, flows = telemetry.series(link)
+        self.assertEqual(3, len(t))
+        self.assertEqual([8, 8, 0], list(allocated))
+        self.assertEqual([2, 1, 0], list(flows))
+        self.assertAlmostEqual(1.0, telemetry.mean_utilization(link, until=t[-1]))
+
+    def test_resolution_and_filter(self):
+        env = simpy.Environment()
+        FlowControl(env, batching=True)
+        uplinks = lambda link: link.tags.get('type') == 'uplink'
+        telemetry = LinkTelemetry(env, resolution=10, link_filter=uplinks)
+
+        topology = Topology()
+        cell = SharedLinkCell(nodes=[Node('a'), Node('b')], backhaul=MobileConnection('internet'))
+        topology.add(cell)
+        server = Node('server')
+        topology.add(Host(server, backhaul='internet'))
+
+        def upload(source):
+            for _ in range(5):
+                yield Flow(env, 25 * 125000, topology.route(source, server)).start()
+
+        for node in cell.nodes:
+            env.process(upload(node))
+        env.run()
+
+        self.assertEqual([cell.uplink], list(telemetry.links))
+        t, utilization = telemetry.utilization(cell.uplink)
+        self.assertLessEqual(len(t), env.now // 10 + 1)
+        self.assertEqual(0, utilization[-1])
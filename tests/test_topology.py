@@ -0,0 +1,346 @@
+import random
+from unittest import TestCase, mock
+
+import networkx as nx
+import numpy as np
+import simpy
+from srds import ParameterizedDistribution
+
+from ether.cell import LANCell
+from ether.core import Node, Link, Connection, Flow, EcmpRoute, NetworkState
+from ether.qos import latency, sampling
+from ether.scenarios.urbansensing import UrbanSensingScenario
+from ether.scheduler import FlowScheduler
+from ether.topology import Topology
+
+
+def create_redundant_topology():
+    """
+    Two nodes connected through two redundant uplinks with 10 MBit/s each.
+    """
+    topology = Topology()
+    a, b = Node('a'), Node('b')
+    uplinks = [Link(10, tags={'name': 'up_1'}), Link(10, tags={'name': 'up_2'})]
+
+    topology.add_connection(Connection(a, Link(1000)))
+    topology.add_connection(Connection(list(topology.successors(a))[0], 'switch_a'))
+    for uplink in uplinks:
+        topology.add_connection(Connection('switch_a', uplink))
+        topology.add_connection(Connection(uplink, 'switch_b'))
+    topology.add_connection(Connection('switch_b', Link(1000)))
+    topology.add_connection(Connection([n for n in topology.successors('switch_b') if n not in uplinks][0], b))
+
+    return topology, a, b, uplinks
+
+
+class TestEcmp(TestCase):
+
+    def test_paths(self):
+        topology, a, b, uplinks = create_redundant_topology()
+
+        self.assertEqual(2, len(topology.paths(a, b)))
+        self.assertEqual(1, len(topology.paths(a, b, max_paths=1)))
+
+        route = topology.route(a, b, ecmp='hash')
+        self.assertIsInstance(route, EcmpRoute)
+        self.assertEqual(2, len(route.routes))
+        self.assertEqual({uplinks[0], uplinks[1]}, {r.hops[1] for r in route.routes})
+        self.assertIs(route.routes[0].path, topology.route(a, b, use_mode=True, ecmp='hash').routes[0].path)
+
+        self.assertRaises(ValueError, topology.route, a, b, ecmp='unknown')
+
+    def run_flows(self, policy):
+        topology, a, b, uplinks = create_redundant_topology()
+        env = simpy.Environment()
+        processes = [Flow(env, 10 ** 6, topology.route(a, b, ecmp=policy)).start() for _ in range(8)]
+        env.run(0.5)
+        loads = [uplink.num_flows for uplink in uplinks]
+        env.run(env.all_of(processes))
+        return loads, env.now
+
+    def test_least_loaded_spreads_flows(self):
+        loads, t = self.run_flows('least-loaded')
+        self.assertEqual([4, 4], loads)
+
+        _, t_single = self.run_flows(None)
+        self.assertAlmostEqual(t_single / 2, t, delta=0.1)
+
+    def test_hash(self):
+        loads, _ = self.run_flows('hash')
+        self.assertEqual(8, sum(loads))
+        self.assertTrue(all(loads))
+
+    def test_hash_maps_flow_to_same_route(self):
+        topology, a, b, uplinks = create_redundant_topology()
+        route = topology.route(a, b, ecmp='hash')
+
+        for flow_id in range(16):
+            selected = route.select(flow_id=flow_id)
+            self.assertIs(selected, route.select(flow_id=flow_id))
+            self.assertIs(selected.path, topology.route(a, b, ecmp='hash').select(flow_id=flow_id).path)
+
+        self.assertEqual(2, len({route.select(flow_id=flow_id).hops[1] for flow_id in range(16)}))
+
+        # flows of an environment are numbered in the order they select their routes
+        env = simpy.Environment()
+        self.assertIs(route.select(flow_id=0), route.select(env))
+        self.assertIs(route.select(flow_id=1), route.select(env))
+
+    def test_least_loaded_uses_network_state(self):
+        topology, a, b, uplinks = create_redundant_topology()
+        env = simpy.Environment()
+        state = NetworkState(env)
+
+        f1 = Flow(env, 10 ** 6, topology.route(a, b, ecmp='least-loaded'))
+        f1.start()
+        env.run(0.1)
+        f2 = Flow(env, 10 ** 6, topology.route(a, b, ecmp='least-loaded'))
+        self.assertIsInstance(f2.route, EcmpRoute)  # selected when the flow starts sending
+        f2.start()
+        env.run(0.2)
+
+        self.assertNotEqual(f1.route.hops[1].link, f2.route.hops[1].link)
+        self.assertEqual([1, 1], [state[uplink].num_flows for uplink in uplinks])
+        self.assertEqual([0, 0], [uplink.num_flows for uplink in uplinks])
+
+    def test_scheduler_selects_route(self):
+        topology, a, b, uplinks = create_redundant_topology()
+        env = simpy.Environment()
+        scheduler = FlowScheduler(env)
+
+        for _ in range(4):
+            scheduler.transfer(10 ** 6, topology.route(a, b, ecmp='least-loaded'))
+        env.run(0.5)
+
+        self.assertEqual([2, 2], [uplink.num_flows for uplink in uplinks])
+
+
+class TestRouteStatistics(TestCase):
+
+    def setUp(self) -> None:
+        self.topology = Topology()
+        self.cell = LANCell([Node('a'), Node('b')], backhaul='internet')
+        self.topology.add(self.cell)
+        self.a, self.b = self.cell.nodes
+
+    def tearDown(self) -> None:
+        sampling.seed()
+
+    def test_stat_routes(self):
+        mode = self.topology.route(self.a, self.b, use_mode=True)
+        self.assertIs(mode, self.topology.route(self.a, self.b, stat='mode'))
+        self.assertAlmostEqual(4 * latency.lan.mean(), self.topology.route(self.a, self.b, stat='mean').rtt)
+
+        p95 = self.topology.route(self.a, self.b, stat='p95')
+        p99 = self.topology.route(self.a, self.b, stat='p99')
+        self.assertIs(p95, self.topology.route(self.a, self.b, stat='p95'))  # cached per pair and statistic
+        self.assertLess(mode.rtt, p95.rtt)
+        self.assertLess(p95.rtt, p99.rtt)
+        self.assertEqual(mode.hops, p95.hops)
+
+        self.assertRaises(ValueError, self.topology.route, self.a, self.b, stat='max')
+
+    def test_rtt_samples(self):
+        sampling.seed(0)
+        samples = self.topology.rtt_samples(self.a, self.b, 20000)
+
+        self.assertEqual((20000,), samples.shape)
+        self.assertAlmostEqual(4 * latency.lan.mean(), samples.mean(), delta=0.05)
+        self.assertAlmostEqual(np.mean([self.topology.route(self.a, self.b).rtt for _ in range(20000)]), samples.mean(),
+                               delta=0.05)
+
+    def test_rtt_samples_many(self):
+        server = Node('server')
+        self.topology.add_connection(Connection(server, 'internet', latency=10))
+
+        sampling.seed(0)
+        samples = self.topology.rtt_samples_many([(self.a, self.b), (self.a, server), (server, server)], 1000)
+
+        self.assertEqual((3, 1000), samples.shape)
+        self.assertAlmostEqual(4 * latency.lan.mean(), samples[0].mean(), delta=0.1)
+        self.assertAlmostEqual(2 * (2 * latency.lan.mean() + 10), samples[1].mean(), delta=0.1)
+        self.assertEqual([0] * 1000, list(samples[2]))
+
+        sampling.seed(0)
+        self.assertEqual(list(samples[0]), list(self.topology.rtt_samples_many([(self.a, self.b)], 1000)[0]))
+
+    def test_sampled_routes_share_path(self):
+        mode = self.topology.route(self.a, self.b, use_mode=True)
+
+        sampling.seed(0)
+        r1 = self.topology.route(self.a, self.b)
+        r2 = self.topology.route(self.a, self.b)
+
+        self.assertIsNot(r1, mode)
+        self.assertIs(mode.path, r1.path)
+        self.assertIs(mode.hops, r2.hops)
+        self.assertNotEqual(r1.rtt, r2.rtt)
+
+        sampling.seed(0)
+        self.assertEqual(r1.rtt, self.topology.route(self.a, self.b).rtt)
+
+
+class TestLatencyRouting(TestCase):
+
+    def create_topology(self, routing):
+        topology = Topology(routing=routing)
+        a, b = Node('a'), Node('b')
+        topology.add_connection(Connection(a, 'internet_eu', latency=1))
+        topology.add_connection(Connection(b, 'internet_us', latency=1))
+
+        for u, v, latency in [('internet_eu', 'internet_us', 100), ('internet_eu', 'internet_uk', 10),
+                              ('internet_uk', 'internet_us', 10)]:
+            topology.add_edge(u, v, latency=latency)
+            topology.add_edge(v, u, latency=latency)
+
+        return topology, a, b
+
+    def test_hop_count_routing(self):
+        topology, a, b = self.create_topology(None)
+        self.assertEqual([a, 'internet_eu', 'internet_us', b], topology.path(a, b))
+        self.assertEqual(204, topology.route(a, b).rtt)
+
+    def test_latency_routing(self):
+        topology, a, b = self.create_topology('mode')
+
+        self.assertEqual([a, 'internet_eu', 'internet_uk', 'internet_us', b], topology.path(a, b))
+        self.assertEqual(44, topology.route(a, b).rtt)
+        self.assertEqual(['internet_us', 'internet_uk', 'internet_eu', a], topology.path('internet_us', a))
+
+        # the tree of a source is calculated once
+        self.assertEqual([a, 'internet_eu', 'internet_uk'], topology.path(a, 'internet_uk'))
+        self.assertEqual(2, len(topology._trees))
+
+        topology.set_routing(None)
+        self.assertEqual(204, topology.route(a, b).rtt)
+
+        disconnected = Topology(routing='mode')
+        disconnected.add_connection(Connection(a, 'x', latency=1))
+        disconnected.add_connection(Connection(b, 'y', latency=1))
+        self.assertRaises(nx.NetworkXNoPath, disconnected.path, a, b)
+
+    def test_latency_routing_reuses_dijkstra_tree(self):
+        topology, a, b = self.create_topology('mode')
+
+        with mock.patch('networkx.dijkstra_predecessor_and_distance',
+                        wraps=nx.dijkstra_predecessor_and_distance) as dijkstra:
+            for destination in [b, 'internet_us', 'internet_uk', 'internet_eu']:
+                topology.route(a, destination, use_mode=True)
+                topology.path(a, destination)
+            self.assertEqual(1, dijkstra.call_count)
+
+            topology.route(b, a, use_mode=True)
+            self.assertEqual(2, dijkstra.call_count)
+
+    def test_latency_routing_with_distributions(self):
+        topology = Topology(routing='mean')
+        a, b = Node('a'), Node('b')
+        topology.add_connection(Connection(a, 'slow', latency_dist=latency.mobile_isp))
+        topology.add_connection(Connection('slow', b, latency_dist=latency.mobile_isp))
+        topology.add_connection(Connection(a, 'x', latency_dist=latency.lan))
+        topology.add_connection(Connection('x', 'y', latency_dist=latency.lan))
+        topology.add_connection(Connection('y', b, latency_dist=latency.lan))
+
+        self.assertEqual([a, 'x', 'y', b], topology.path(a, b))
+        self.assertEqual([a, 'slow', b], Topology(topology).path(a, b))
+
+
+class TestLatencyMatrix(TestCase):
+
+    def create_topology(self, routing=None):
+        random.seed(1)
+        topology = Topology(routing=routing)
+        UrbanSensingScenario(num_cells=3, cell_density=ParameterizedDistribution.lognorm((0.82, 2.02))).materialize(
+            topology)
+        return topology
+
+    def test_latency_matrix_matches_routes(self):
+        for routing in (None, 'mode'):
+            topology = self.create_topology(routing)
+            nodes = topology.get_nodes()
+            matrix = topology.latency_matrix()
+
+            self.assertEqual((len(nodes), len(nodes)), matrix.rtt.shape)
+            for source in nodes[::7]:
+                for target in nodes[::5]:
+                    self.assertAlmostEqual(topology.route(source, target, use_mode=True).rtt,
+                                           matrix.get(source, target), places=6)
+
+    def test_latency_matrix_subsets(self):
+        topology = self.create_topology()
+        nodes = topology.get_nodes()
+        sources, targets = nodes[:3], nodes[-4:]
+
+        matrix = topology.latency_matrix(sources, targets, stat='p95')
+        self.assertEqual((3, 4), matrix.rtt.shape)
+        self.assertEqual(2, matrix.sources[sources[2]])
+        self.assertEqual(3, matrix.targets[targets[3]])
+        self.assertAlmostEqual(topology.route(sources[1], targets[2], stat='p95').rtt,
+                               matrix.rtt[1, 2], places=6)
+        self.assertEqual(0, topology.latency_matrix(sources).rtt[0, 0])
+
+    def test_latency_matrix_unreachable(self):
+        topology = Topology()
+        a, b, c = Node('a'), Node('b'), Node('c')
+        topology.add_connection(Connection(a, 'x', latency=1))
+        topology.add_connection(Connection('x', b, latency=2))
+        topology.add_connection(Connection(c, 'y', latency=1))
+
+        matrix = topology.latency_matrix([a, c], [b, c])
+        np.testing.assert_array_equal([[6, np.inf], [np.inf, 0]], matrix.rtt)
+
+    def test_routes(self):
+        topology = self.create_topology()
+        nodes = topology.get_nodes()
+        pairs = [(nodes[0], node) for node in nodes[1:]]
+
+        routes = topology.routes(pairs)
+        self.assertEqual(len(pairs), len(routes))
+        for (source, destination), route in zip(pairs, routes):
+            self.assertIs(topology.route(source, destination, use_mode=True), route)
+            self.assertEqual(source, route.source)
+            self.assertEqual(destination, route.destination)
+
+        self.assertEqual(1, len(topology._trees))
+
+    def test_routes_resolve_one_tree_per_source(self):
+        topology = self.create_topology()
+        nodes = topology.get_nodes()
+        pairs = [(source, destination) for source in nodes[:3] for destination in nodes[::2] if source != destination]
+
+        with mock.patch('networkx.predecessor', wraps=nx.predecessor) as predecessor:
+            routes = topology.routes(reversed(pairs))
+            self.assertEqual(3, predecessor.call_count)
+            topology.routes(pairs)
+            self.assertEqual(3, predecessor.call_count)  # all routes are cached
+
+        for (source, destination), route in zip(reversed(pairs), routes):
+            self.assertEqual(nx.shortest_path_length(topology, source, destination), len(route.path) - 1)
+
+        # single lookups use the same trees
+        topology.clear_routes()
+        for source, destination in pairs:
+            self.assertEqual(topology.path(source, destination), topology.routes([(source, destination)])[0].path)
+
+    def test_tree_cache_is_bounded(self):
+        topology = Topology(self.create_topology(), tree_cache_size=2)
+        a, b, c = topology.get_nodes()[:3]
+
+        topology.path(a, c)
+        topology.path(b, c)
+        topology.path(a, b)  # a is used more recently than b
+        topology.path(c, a)
+
+        self.assertEqual([a, c], list(topology._trees))
+
+    def test_hierarchical_latency_matrix(self):
+        topology = self.create_topology()
+        hierarchical = Topology(topology, hierarchical=True)
+        nodes = topology.get_nodes()
+
+        with mock.patch.object(hierarchical, '_tree') as tree:
+            matrix = hierarchical.latency_matrix(nodes[::3], nodes[::2])
+            tree.assert_not_called()
+
+        self.assertIsNotNone(hierarchical._router)
+        np.testing.assert_allclose(topology.latency_matrix(nodes[::3], nodes[::2]).rtt, matrix.rtt)
@@ -0,0 +1,101 @@
+from unittest import TestCase
+
+import numpy as np
+import simpy
+import srds
+
+from ether.blocks.cells import MobileConnection
+from ether.cell import SharedLinkCell, Host
+from ether.core import Node
+from ether.scheduler import FlowScheduler
+from ether.topology import Topology
+from ether.workload import Workload, Poisson, Periodic, Bursty
+
+
+class TestArrivalProcess(TestCase):
+
+    def test_periodic(self):
+        gaps = Periodic(0.5).draw(4, 0, np.random.RandomState(0))
+        self.assertEqual([0.5] * 4, list(gaps))
+
+    def test_periodic_rejects_non_positive_interval(self):
+        self.assertRaises(ValueError, Periodic, 0)
+        self.assertRaises(ValueError, Periodic, -1)
+        self.assertRaises(ValueError, Periodic, 1, jitter=-1)
+
+    def test_bursty(self):
+        gaps = Bursty(rate=1, size=3, spacing=0.1).draw(5, 1, np.random.RandomState(0))
+
+        # the offset continues the burst that was started in a previous chunk
+        self.assertEqual([0.1, 0.1], list(gaps[:2]))
+        self.assertGreater(gaps[2], 0)
+        self.assertEqual([0.1, 0.1], list(gaps[3:]))
+
+    def test_poisson_rate(self):
+        gaps = Poisson(rate=50).draw(10000, 0, np.random.RandomState(0))
+        self.assertAlmostEqual(1 / 50, gaps.mean(), delta=0.001)
+
+
+class TestWorkload(TestCase):
+
+    def setUp(self) -> None:
+        self.topology = Topology()
+        self.cell = SharedLinkCell(nodes=[Node('a'), Node('b'), Node('c')], backhaul=MobileConnection('internet'))
+        self.topology.add(self.cell)
+        self.server = Node('server')
+        self.topology.add(Host(self.server, backhaul='internet'))
+
+    def test_chunks(self):
+        workload = Workload(self.topology, None, None, Periodic(1), sizes=100, chunk_size=4, seed=0)
+
+        chunks = list(workload.chunks(limit=10))
+        self.assertEqual([4, 4, 2], [len(chunk) for chunk in chunks])
+        self.assertEqual(list(range(1, 11)), list(np.concatenate([chunk.times for chunk in chunks])))
+
+        for chunk in chunks:
+            self.assertTrue(np.all(chunk.sources != chunk.destinations))  # sources and destinations are the same list
+            self.assertEqual([100] * len(chunk), list(chunk.sizes))
+
+        chunks = list(workload.chunks(until=6.5))
+        self.assertEqual(6, sum(len(chunk) for chunk in chunks))
+
+    def test_seed_is_reproducible(self):
+        def draw(seed):
+            workload = Workload(self.topology, self.cell.nodes, [self.server], Poisson(10), sizes=1, seed=seed)
+            return next(workload.chunks(limit=100))
+
+        self.assertEqual(list(draw(1).times), list(draw(1).times))
+        self.assertNotEqual(list(draw(1).times), list(draw(2).times))
+
+    def test_global_random_state_without_seed(self):
+        def draw():
+            np.random.seed(3)
+            workload = Workload(self.topology, self.cell.nodes, [self.server], Poisson(10), sizes=1)
+            return next(workload.chunks(limit=100))
+
+        self.assertEqual(list(draw().times), list(draw().times))
+
+    def test_run(self):
+        env = simpy.Environment()
+        srds.seed(0)
+        sizes = srds.ParameterizedDistribution.lognorm(((1,), None, 10 ** 6))
+        workload = Workload(self.topology, self.cell.nodes, [self.server], Bursty(rate=1, size=5), sizes, seed=0)
+
+        scheduler = FlowScheduler(env)
+        completed = list()
+
+        def start(size, route):
+            event = scheduler.transfer(size, route)
+            event.callbacks.append(lambda e: completed.append(e.value))
+            return event
+
+        workload.run(env, start, until=10)
+        env.run()
+
+        self.assertGreater(workload.started, 0)
+        self.assertEqual(workload.started, len(completed))
+        self.assertLessEqual(len(workload._routes), 3)  # one route per distinct pair
+        self.assertEqual(0, self.cell.uplink.num_flows)
+
+    def test_single_node_raises(self):
+        self.assertRaises(ValueError, Workload, self.topology, [self.server], [self.server], Periodic(1), 1)